@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    name = 'core'
+
+    def ready(self):
+        from . import jobs, metrics  # noqa: F401  jobs registers the job handlers
+        metrics.install()
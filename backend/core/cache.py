@@ -0,0 +1,68 @@
+import asyncio
+import weakref
+
+from django.core.cache import cache
+
+# event loop -> key -> future of the value being built for it in that loop, see aget_or_build.
+# A future can only be awaited from its own loop, and under WSGI async_to_sync
+# gives every request a loop of its own.
+_building = weakref.WeakKeyDictionary()
+
+
+async def aget_or_build(key, build, timeout, lock_timeout=30, poll_seconds=0.05):
+    """Return cache[key], building it with the coroutine function build() on a miss.
+
+    Concurrent misses for a key cause a single build. Requests in the same
+    event loop await the build already running there. Across loops and
+    processes that share the cache, the one holding the "<key>:building" lock
+    builds while the others poll for its result, until the lock expires after
+    lock_timeout.
+    """
+    value = await cache.aget(key)
+    if value is not None:
+        return value
+
+    loop = asyncio.get_running_loop()
+    building = _building.setdefault(loop, {})
+    pending = building.get(key)
+    if pending is not None:
+        # shield: one waiter disconnecting mustn't cancel the build for everybody
+        if await asyncio.shield(pending) is None:
+            # The build failed; start over, joining whichever waiter retries first
+            return await aget_or_build(key, build, timeout, lock_timeout, poll_seconds)
+        return pending.result()
+
+    future = loop.create_future()
+    building[key] = future
+    try:
+        value = await _build_once(key, build, timeout, lock_timeout, poll_seconds)
+        future.set_result(value)
+        return value
+    finally:
+        if not future.done():
+            future.set_result(None)
+        del building[key]
+
+
+async def _build_once(key, build, timeout, lock_timeout, poll_seconds):
+    lock = f'{key}:building'
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + lock_timeout
+    locked = await cache.aadd(lock, 1, lock_timeout)
+    while not locked:
+        await asyncio.sleep(poll_seconds)
+        value = await cache.aget(key)
+        if value is not None:
+            return value
+        if loop.time() > deadline:
+            # The builder died holding the lock, or is too slow to wait for: build without it
+            break
+        locked = await cache.aadd(lock, 1, lock_timeout)
+    try:
+        value = await build()
+        await cache.aset(key, value, timeout)
+        return value
+    finally:
+        # Only the holder releases the lock; deleting someone else's would let a third build start
+        if locked:
+            await cache.adelete(lock)
@@ -0,0 +1,39 @@
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+class AsyncConditionalGetMixin:
+    """ETag / Last-Modified support for read-only core.async_views views.
+
+    Views implement the coroutine get_validators() from cheap per-object
+    counters or timestamps. Matching If-None-Match / If-Modified-Since
+    requests are answered with 304 after authentication but before the
+    object is loaded or serialized.
+    """
+
+    async def get_validators(self, request):
+        """Return (etag, last_modified datetime); either may be None."""
+        return None, None
+
+    async def get(self, request, *args, **kwargs):
+        etag, last_modified = await self.get_validators(request)
+        etag, last_modified, not_modified = check_validators(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        return add_validators(await super().get(request, *args, **kwargs), etag, last_modified)
+
+
+def check_validators(request, etag, last_modified):
+    """Normalize the validators and return them with the 304 response to send, if any."""
+    etag = quote_etag(etag) if etag else None
+    last_modified = int(last_modified.timestamp()) if last_modified else None
+    return etag, last_modified, get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def add_validators(response, etag, last_modified):
+    if response.status_code == 200:
+        if etag:
+            response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+    return response
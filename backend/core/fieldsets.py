@@ -0,0 +1,111 @@
+"""Sparse fieldsets.
+
+Clients pick the fields of each returned object with ?fields=id,username, or
+drop some with ?omit=comments. Views mixing in SparseFieldsetMixin apply the
+selection to the objects they return (not to nested objects) and narrow their
+queryset with only() to the columns the remaining fields read.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import permissions, serializers
+
+
+class FieldsetSerializerMixin:
+    """Serializer side: keeps only the fields named in self.fieldset, if set.
+
+    Meta.field_columns maps fields whose model columns can't be told from
+    their source (source='*', method fields) to those columns; () for fields
+    loaded another way, e.g. by a prefetch.
+    """
+    fieldset = None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.fieldset is not None:
+            fields = {name: field for name, field in fields.items() if name in self.fieldset}
+        return fields
+
+
+def columns(serializer):
+    """Model columns serializer's fields read, for QuerySet.only(), or None if that can't be told."""
+    model = serializer.Meta.model
+    declared = getattr(serializer.Meta, 'field_columns', {})
+    found = {model._meta.pk.name}
+    for name, field in serializer.fields.items():
+        if name in declared:
+            found.update(declared[name])
+            continue
+        if field.source == '*' or isinstance(field, (serializers.SerializerMethodField, serializers.ListSerializer)):
+            return None
+        path = field.source.split('.')
+        try:
+            model_field = model._meta.get_field(path[0])
+        except FieldDoesNotExist:
+            return None
+        if isinstance(field, serializers.BaseSerializer):
+            nested = columns(field) if model_field.many_to_one or model_field.one_to_one else None
+            if nested is None:
+                return None
+            found.update(f'{path[0]}__{column}' for column in nested)
+        elif len(path) == 1 and model_field.concrete:
+            found.add(path[0])
+        else:
+            return None
+    return found
+
+
+class SparseFieldsetMixin:
+    """View side of ?fields= / ?omit= for GenericAPIView subclasses. Only safe methods honour them."""
+
+    def get_fieldset(self):
+        """The requested field names, or None for all of them."""
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = None
+            if self.request.method in permissions.SAFE_METHODS:
+                self._fieldset = self.parse_fieldset(self.request.query_params)
+        return self._fieldset
+
+    def parse_fieldset(self, params):
+        def names(param):
+            return {name.strip() for name in params.get(param, '').split(',') if name.strip()}
+
+        requested, omitted = names('fields'), names('omit')
+        if not requested and not omitted:
+            return None
+        available = set(self.get_serializer_class()().fields)
+        unknown = (requested | omitted) - available
+        if unknown:
+            raise serializers.ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown))}."})
+        return (requested or available) - omitted
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        target = serializer.child if isinstance(serializer, serializers.ListSerializer) else serializer
+        target.fieldset = self.get_fieldset()
+        return serializer
+
+    def wants(self, name):
+        fieldset = self.get_fieldset()
+        return fieldset is None or name in fieldset
+
+    def selected_columns(self):
+        """Model columns the selected fields read, or None if the serializer can't tell."""
+        serializer = self.get_serializer_class()()
+        serializer.fieldset = self.get_fieldset()
+        return columns(serializer)
+
+    def narrow(self, queryset, prefix='', also=()):
+        """Load only the selected columns (of the prefix relation, plus also) when they are known.
+
+        The columns the view's cursor pagination orders by are always kept:
+        it reads them off every row to build the next and previous links.
+        """
+        selected = self.selected_columns()
+        if selected is None:
+            return queryset
+        return queryset.only(*also, *self.ordering_columns(), *(prefix + column for column in selected))
+
+    def ordering_columns(self):
+        ordering = getattr(self.pagination_class, 'ordering', ())
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        return [name.lstrip('-') for name in ordering]
@@ -0,0 +1,156 @@
+"""Resized variants of uploaded images.
+
+Avatars and course thumbnails are served in a few fixed sizes, as WebP with a
+JPEG fallback, instead of the original upload. Variants are named after a hash
+of the source file, so their URLs never change meaning and are served with an
+immutable Cache-Control header.
+
+A model with an image field `<field>` stores its variants in a JSONField
+`<field>_variants` as {'source': <image name>, 'sizes': {size: {ext: name}}}.
+Variants whose source is not the current image are stale and ignored. They are
+built by the "image_variants" job queued from the model's save(), or by the
+backfill_image_variants command.
+"""
+import hashlib
+import io
+import logging
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.views.static import serve
+from PIL import Image, ImageOps, UnidentifiedImageError
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+SIZES = (64, 256, 1024)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+DIRECTORY = 'variants'
+# Part of every variant's hash: bump it when SIZES or FORMATS change so new names are generated
+PIPELINE_VERSION = b'1'
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def is_current(instance, field_name):
+    image = getattr(instance, field_name)
+    variants = getattr(instance, f'{field_name}_variants') or {}
+    return not image or variants.get('source') == image.name
+
+
+def queue_variants(instance, field_name):
+    """Queue a job building variants of a freshly saved image, if they are missing or stale."""
+    if is_current(instance, field_name):
+        return
+    from jobs.models import Job
+    Job.enqueue('image_variants', model=instance._meta.label_lower, pk=instance.pk, field=field_name)
+
+
+def render(data):
+    """Yield (size, ext, encoded bytes) for every variant of an image file's contents."""
+    with Image.open(io.BytesIO(data)) as original:
+        # Let the JPEG decoder downscale while decoding; multi-megapixel photos load far faster
+        original.draft(original.mode, (max(SIZES) * 2, max(SIZES) * 2))
+        image = ImageOps.exif_transpose(original)
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    # Largest first, each resized from the previous one, which is much cheaper
+    # than resizing the full upload every time
+    for size in sorted(SIZES, reverse=True):
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        flat = image
+        if has_alpha:
+            flat = Image.new('RGB', image.size, (255, 255, 255))
+            flat.paste(image, mask=image.getchannel('A'))
+        for ext, (format, options) in FORMATS.items():
+            buffer = io.BytesIO()
+            (image if format == 'WEBP' else flat).save(buffer, format, **options)
+            yield size, ext, buffer.getvalue()
+
+
+def build_variants(image):
+    """Write the variants of an image field file and return their {size: {ext: name}} map."""
+    with image.open('rb'):
+        data = image.read()
+    digest = hashlib.sha256(PIPELINE_VERSION + data).hexdigest()[:24]
+    storage = image.storage
+    names = {
+        str(size): {ext: f'{DIRECTORY}/{digest[:2]}/{digest}-{size}.{ext}' for ext in FORMATS}
+        for size in SIZES
+    }
+    if all(storage.exists(name) for exts in names.values() for name in exts.values()):
+        # Identical content uploaded before
+        return names
+    for size, ext, content in render(data):
+        name = names[str(size)][ext]
+        if not storage.exists(name):
+            storage.save(name, ContentFile(content))
+    return names
+
+
+def refresh(instances, field_name, force=False):
+    """Build missing or stale variants of field_name for instances. Returns the pks that changed."""
+    model, changed = None, []
+    for instance in instances:
+        image = getattr(instance, field_name)
+        if not image or (is_current(instance, field_name) and not force):
+            continue
+        try:
+            sizes = build_variants(image)
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as exc:
+            # Missing or unreadable files won't get better on a retry
+            logger.warning('No variants for %s %s %s: %r', instance._meta.label, instance.pk, image.name, exc)
+            continue
+        # Only if the image wasn't replaced while its variants were built
+        model = type(instance)
+        if model._default_manager.filter(pk=instance.pk, **{field_name: image.name}).update(
+            **{f'{field_name}_variants': {'source': image.name, 'sizes': sizes}}
+        ):
+            changed.append(instance.pk)
+    if changed and hasattr(model, 'image_variants_changed'):
+        model.image_variants_changed(changed)
+    return changed
+
+
+def variant_url(instance, field_name, size, ext):
+    """URL of one variant of an image, or of the original while variants are missing or stale."""
+    image = getattr(instance, field_name)
+    if not image:
+        return None
+    if not is_current(instance, field_name):
+        return image.url
+    return image.storage.url(getattr(instance, f'{field_name}_variants')['sizes'][str(size)][ext])
+
+
+class ImageVariantsField(serializers.Field):
+    """Read-only {size: {ext: url}} of an image's variants, or None until they are built."""
+
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        kwargs.setdefault('source', '*')
+        super().__init__(read_only=True, **kwargs)
+
+    def to_representation(self, instance):
+        image = getattr(instance, self.image_field)
+        if not image or not is_current(instance, self.image_field):
+            return None
+        request = self.context.get('request')
+        sizes = getattr(instance, f'{self.image_field}_variants')['sizes']
+        return {
+            size: {
+                ext: request.build_absolute_uri(image.storage.url(name)) if request else image.storage.url(name)
+                for ext, name in exts.items()
+            }
+            for size, exts in sizes.items()
+        }
+
+
+def serve_variant(request, path):
+    """Serve a variant file; its name changes with its content, so it can be cached forever."""
+    response = serve(request, path, document_root=Path(settings.MEDIA_ROOT) / DIRECTORY)
+    response['Cache-Control'] = CACHE_CONTROL
+    return response
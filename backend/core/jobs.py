@@ -0,0 +1,14 @@
+from django.apps import apps
+from jobs.models import register
+from . import images
+
+
+@register('image_variants')
+def build_image_variants(payloads):
+    """Build the variants of newly uploaded images (see core.images)."""
+    pks = {}
+    for payload in payloads:
+        pks.setdefault((payload['model'], payload['field']), set()).add(payload['pk'])
+    for (label, field), model_pks in pks.items():
+        model = apps.get_model(label)
+        images.refresh(model._default_manager.filter(pk__in=model_pks), field)
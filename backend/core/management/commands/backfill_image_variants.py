@@ -0,0 +1,60 @@
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from core import images
+from courses.models import Course
+from users.models import User
+
+# (model, image field) pairs that have variants
+IMAGE_FIELDS = [(User, 'avatar'), (Course, 'thumbnail')]
+
+
+class Command(BaseCommand):
+    help = (
+        'Build the resized variants of existing avatars and course thumbnails that are missing or '
+        'stale (see core.images), and optionally delete variant files nothing refers to any more.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild variants that look current too.')
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--prune', action='store_true', help='Delete unreferenced variant files afterwards.')
+
+    def handle(self, *args, **options):
+        for model, field in IMAGE_FIELDS:
+            started = time.perf_counter()
+            queryset = model._default_manager.exclude(Q(**{f'{field}__isnull': True}) | Q(**{field: ''})).order_by('pk')
+            total = queryset.count()
+            built, last_pk = 0, 0
+            while True:
+                # Keyset batches so the variants written meanwhile don't shift the pages
+                batch = list(queryset.filter(pk__gt=last_pk)[:options['batch_size']])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                built += len(images.refresh(batch, field, force=options['force']))
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: {built} of {total} {field}s got new variants '
+                f'in {time.perf_counter() - started:.1f}s'
+            )
+        if options['prune']:
+            self.prune()
+
+    def prune(self):
+        storage = default_storage
+        referenced = set()
+        for model, field in IMAGE_FIELDS:
+            for variants in model._default_manager.values_list(f'{field}_variants', flat=True):
+                for exts in (variants or {}).get('sizes', {}).values():
+                    referenced.update(exts.values())
+        removed = 0
+        directories = storage.listdir(images.DIRECTORY)[0] if storage.exists(images.DIRECTORY) else []
+        for directory in directories:
+            for name in storage.listdir(f'{images.DIRECTORY}/{directory}')[1]:
+                path = f'{images.DIRECTORY}/{directory}/{name}'
+                if path not in referenced:
+                    storage.delete(path)
+                    removed += 1
+        self.stdout.write(f'Deleted {removed} unreferenced variant files.')
@@ -0,0 +1,312 @@
+import datetime
+import json
+import math
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from courses.models import Course
+from exams.models import Choice, Exam, ExamDraw
+from jobs.models import Job
+from results.models import CertificateComment, ExamAttempt
+from users.models import User
+
+# Endpoints that hash a password are slow by design; cap them so a run stays short
+HASHING_REQUESTS = 20
+# Prefix queries of growing selectivity for course-search
+SEARCHES = ['que', 'database index', 'react', 'lat', 'django model view']
+# Questions drawn per attempt from the bank exam while exam-draw runs
+BANK_SAMPLE_SIZE = 10
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)]
+
+
+def api_url_names(patterns=None, prefix=''):
+    """Yield the name of every route under api/ in core/urls.py."""
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            yield from api_url_names(pattern.url_patterns, route)
+        elif isinstance(pattern, URLPattern) and route.startswith('api/') and pattern.name:
+            yield pattern.name
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive every API endpoint against a dataset from generate_data and report p50/p95/p99 latency, '
+        'queries per request and throughput. Results are written as JSON so runs can be compared '
+        'across commits. Write endpoints clean up after themselves, except exam submissions, which '
+        'are kept and add to user totals; regenerate the dataset for strictly comparable runs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='synth', help='Prefix the dataset was generated with.')
+        parser.add_argument('--password', default='synth-pass', help='Password the dataset was generated with.')
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per endpoint.')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per endpoint.')
+        parser.add_argument('--concurrency', type=int, default=1, help='Client threads per endpoint.')
+        parser.add_argument('--only', default='', help='Comma separated endpoint keys to run.')
+        parser.add_argument('--label', default='', help='Free-form label stored with the results.')
+        parser.add_argument('--output', help='JSON file to write (default bench-results/<commit>-<time>.json).')
+        parser.add_argument('--compare', help='Earlier results JSON to print a comparison against.')
+
+    def fixtures(self, prefix):
+        try:
+            user = User.objects.get(username=f'{prefix}-user-0')
+            admin = User.objects.get(username=f'{prefix}-admin')
+            target = User.objects.get(username=f'{prefix}-user-1')
+            course = Course.objects.select_related('exam').get(slug=f'{prefix}-course-0')
+        except (User.DoesNotExist, Course.DoesNotExist):
+            raise CommandError(f'No dataset with prefix "{prefix}", run generate_data first.')
+        # Sampled for the duration of the run, see handle(); exam-submit keeps answering every question of course 0
+        bank = Exam.objects.filter(course__slug=f'{prefix}-course-1').first()
+        if bank is None:
+            raise CommandError('The dataset has a single course, generate it with --courses > 1.')
+        commented = (
+            CertificateComment.objects.filter(attempt__user__username__startswith=f'{prefix}-')
+            .values_list('attempt_id', flat=True).order_by('attempt_id').first()
+        )
+        attempt = ExamAttempt.objects.filter(pk=commented).first() or ExamAttempt.objects.filter(user=user).first()
+        if attempt is None:
+            raise CommandError('The dataset has no attempts, generate it with --attempts > 0.')
+        passed = ExamAttempt.objects.filter(user=user, is_passed=True).first()
+        if passed is None:
+            raise CommandError(f'{user.username} has no passed attempts, regenerate the dataset.')
+        sheet = {}
+        for question_id, choice_id in Choice.objects.filter(question__exam=course.exam).values_list('question_id', 'id'):
+            sheet.setdefault(question_id, []).append(choice_id)
+        lessons = list(course.lessons.values_list('id', flat=True))
+        return {
+            'user': user,
+            'admin': admin,
+            'target': target,
+            'course': course,
+            'exam': course.exam,
+            'bank': bank,
+            'lesson_id': lessons[len(lessons) // 2],
+            'attempt': attempt,
+            'passed_attempt': passed,
+            'sheet': sheet,
+            'user_token': str(RefreshToken.for_user(user).access_token),
+            'admin_token': str(RefreshToken.for_user(admin).access_token),
+            'refresh_token': str(RefreshToken.for_user(user)),
+        }
+
+    def endpoints(self, fx, prefix, password, run_tag):
+        """(key, url name, url kwargs, method, token, body(i), expected status, request cap)"""
+        user, course = fx['user'], fx['course']
+
+        def submission(i):
+            return {
+                'answers': {str(qid): choices[i % len(choices)] for qid, choices in fx['sheet'].items()},
+                'time_taken': 300 + i,
+            }
+
+        return [
+            ('register', 'register', {}, 'post', None,
+             lambda i: {'username': f'{prefix}-bench-{run_tag}-{i}', 'password': password}, 201, HASHING_REQUESTS),
+            ('login', 'token_obtain_pair', {}, 'post', None,
+             lambda i: {'username': user.username, 'password': password}, 200, HASHING_REQUESTS),
+            ('token-refresh', 'token_refresh', {}, 'post', None,
+             lambda i: {'refresh': fx['refresh_token']}, 200, None),
+            ('profile', 'profile', {}, 'get', 'user', None, 200, None),
+            ('leaderboard', 'leaderboard', {}, 'get', 'user', None, 200, None),
+            ('leaderboard-weekly', 'leaderboard', {}, 'get', 'user', lambda i: {'period': 'weekly'}, 200, None),
+            ('dashboard-stats', 'dashboard-stats', {}, 'get', 'user', None, 200, None),
+            ('public-profile', 'public-profile', {'pk': user.pk}, 'get', 'user', None, 200, None),
+            ('admin-user-list', 'admin-user-list', {}, 'get', 'admin', None, 200, None),
+            ('admin-user-toggle-staff', 'admin-user-toggle-staff', {'pk': fx['target'].pk}, 'post', 'admin',
+             None, 200, None),
+            ('course-list', 'course-list', {}, 'get', None, None, 200, None),
+            ('course-search', 'course-search', {}, 'get', None,
+             lambda i: {'q': SEARCHES[i % len(SEARCHES)]}, 200, None),
+            ('course-detail', 'course-detail', {'slug': course.slug}, 'get', None, None, 200, None),
+            ('course-completers', 'course-completers', {'slug': course.slug}, 'get', None, None, 200, None),
+            ('lesson-detail', 'lesson-detail', {'pk': fx['lesson_id']}, 'get', 'user', None, 200, None),
+            ('admin-course-list', 'admin-course-list', {}, 'get', 'admin', None, 200, None),
+            ('admin-course-detail', 'admin-course-detail', {'pk': course.pk}, 'get', 'admin', None, 200, None),
+            ('admin-lesson-list', 'admin-lesson-list', {'course_pk': course.pk}, 'get', 'admin', None, 200, None),
+            ('admin-lesson-detail', 'admin-lesson-detail', {'pk': fx['lesson_id']}, 'get', 'admin', None, 200, None),
+            ('exam-detail', 'exam-detail', {'pk': fx['exam'].pk}, 'get', 'user', None, 200, None),
+            ('exam-draw', 'exam-draw', {'pk': fx['bank'].pk}, 'post', 'user', None, 200, None),
+            ('exam-submit', 'exam-submit', {'pk': fx['exam'].pk}, 'post', 'user', submission, 201, None),
+            ('admin-exam-list', 'admin-exam-list', {}, 'get', 'admin', None, 200, None),
+            ('admin-exam-detail', 'admin-exam-detail', {'pk': fx['exam'].pk}, 'get', 'admin', None, 200, None),
+            ('exam-history', 'exam-history', {}, 'get', 'user', None, 200, None),
+            ('attempt-detail', 'attempt-detail', {'pk': fx['attempt'].pk}, 'get', 'user', None, 200, None),
+            ('attempt-certificate', 'attempt-certificate', {'pk': fx['passed_attempt'].pk, 'ext': 'png'}, 'get', None,
+             None, 302, None),
+            ('attempt-comments', 'attempt-comments', {'pk': fx['attempt'].pk}, 'get', 'user', None, 200, None),
+            ('attempt-comment-create', 'attempt-comments', {'pk': fx['attempt'].pk}, 'post', 'user',
+             lambda i: {'text': f'{run_tag} comment {i}'}, 201, None),
+            ('attempt-like', 'attempt-like', {'pk': fx['attempt'].pk}, 'post', 'user', None, 200, None),
+            ('metrics', 'metrics', {}, 'get', 'admin', None, 200, None),
+        ]
+
+    def measure(self, endpoint, tokens, count, warmup, concurrency):
+        key, url_name, url_kwargs, method, token, body, expected, cap = endpoint
+        url = reverse(url_name, kwargs=url_kwargs)
+        timings, queries, statuses = [], [], {}
+        lock = threading.Lock()
+        counter = iter(range(warmup + count))
+
+        def client_thread():
+            client = APIClient()
+            if token:
+                client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens[token]}')
+            try:
+                while True:
+                    with lock:
+                        i = next(counter, None)
+                    if i is None:
+                        return
+                    data = body(i) if body else None
+                    # Keep the capped query log from filling up over a long run
+                    connection.queries_log.clear()
+                    with CaptureQueriesContext(connection) as captured:
+                        started = time.perf_counter()
+                        if method == 'get':
+                            response = client.get(url, data)
+                        else:
+                            response = client.post(url, data, format='json')
+                        elapsed = (time.perf_counter() - started) * 1000
+                    if i < warmup:
+                        continue
+                    with lock:
+                        timings.append(elapsed)
+                        queries.append(len(captured))
+                        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=client_thread) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        timings.sort()
+        return {
+            'url_name': url_name,
+            'method': method.upper(),
+            'requests': len(timings),
+            'errors': sum(n for status, n in statuses.items() if status != expected),
+            'status_codes': {str(status): n for status, n in sorted(statuses.items())},
+            'p50_ms': percentile(timings, 50),
+            'p95_ms': percentile(timings, 95),
+            'p99_ms': percentile(timings, 99),
+            'mean_ms': sum(timings) / len(timings) if timings else None,
+            'max_ms': timings[-1] if timings else None,
+            'queries_per_request': sum(queries) / len(queries) if queries else None,
+            'max_queries': max(queries, default=None),
+            # Warmup requests are part of the wall time, so count them too
+            'throughput_rps': (warmup + len(timings)) / wall if wall else None,
+        }
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        run_tag = f'{int(time.time())}'
+        fx = self.fixtures(prefix)
+        tokens = {'user': fx['user_token'], 'admin': fx['admin_token']}
+        target_was_staff = fx['target'].is_staff
+        Exam.objects.filter(pk=fx['bank'].pk).update(sample_size=BANK_SAMPLE_SIZE, updated_at=timezone.now())
+        endpoints = self.endpoints(fx, prefix, options['password'], run_tag)
+        only = {key for key in options['only'].split(',') if key}
+        if only:
+            endpoints = [endpoint for endpoint in endpoints if endpoint[0] in only]
+
+        covered = {endpoint[1] for endpoint in self.endpoints(fx, prefix, options['password'], run_tag)}
+        uncovered = sorted(set(api_url_names()) - covered)
+        for name in uncovered:
+            self.stderr.write(self.style.WARNING(f'No benchmark defined for the "{name}" route.'))
+
+        results = {}
+        self.stdout.write(
+            f"{'endpoint':<26} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'req/s':>8} {'errors':>7}"
+        )
+        try:
+            for endpoint in endpoints:
+                cap = endpoint[7]
+                count = min(options['requests'], cap) if cap else options['requests']
+                warmup = min(options['warmup'], cap) if cap else options['warmup']
+                result = results[endpoint[0]] = self.measure(endpoint, tokens, count, warmup, options['concurrency'])
+                self.stdout.write(
+                    f"{endpoint[0]:<26} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+                    f"{result['queries_per_request']:>8.1f} {result['throughput_rps']:>8.0f} {result['errors']:>7}"
+                )
+        finally:
+            self.cleanup(prefix, run_tag, fx, target_was_staff)
+
+        report = {
+            'label': options['label'],
+            'commit': git_commit(),
+            'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'dataset': {
+                'users': User.objects.filter(username__startswith=f'{prefix}-').count(),
+                'courses': Course.objects.filter(slug__startswith=f'{prefix}-').count(),
+                'attempts': ExamAttempt.objects.filter(user__username__startswith=f'{prefix}-').count(),
+            },
+            'uncovered': uncovered,
+            'endpoints': results,
+        }
+        output = Path(options['output'] or (
+            f"bench-results/{report['commit'] or 'local'}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+        ))
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS(f'Results written to {output}'))
+
+        if options['compare']:
+            self.compare(json.loads(Path(options['compare']).read_text()), report)
+
+    def cleanup(self, prefix, run_tag, fx, target_was_staff):
+        User.objects.filter(username__startswith=f'{prefix}-bench-{run_tag}-').delete()
+        CertificateComment.objects.filter(text__startswith=f'{run_tag} comment ').delete()
+        # Neither delete above goes through the views that keep the attempt's counters
+        ExamAttempt.objects.filter(pk=fx['attempt'].pk).reconcile_counters()
+        ExamDraw.objects.filter(exam=fx['bank']).delete()
+        Exam.objects.filter(pk=fx['bank'].pk).update(sample_size=fx['bank'].sample_size, updated_at=timezone.now())
+        User.objects.filter(pk=fx['target'].pk).update(is_staff=target_was_staff)
+        # Apply the queued submissions so totals and ranks are consistent again
+        while Job.run_batch():
+            pass
+        User.update_ranks()
+
+    def compare(self, before, after):
+        self.stdout.write(f"\nCompared with {before.get('commit') or 'unknown'} {before.get('label', '')}".rstrip())
+        self.stdout.write(f"{'endpoint':<26} {'p95 ms before':>14} {'after':>9} {'change':>8} {'queries':>12}")
+        for key, result in after['endpoints'].items():
+            old = before.get('endpoints', {}).get(key)
+            if not old or not old.get('p95_ms') or result['p95_ms'] is None:
+                continue
+            change = (result['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100
+            self.stdout.write(
+                f"{key:<26} {old['p95_ms']:>14.2f} {result['p95_ms']:>9.2f} {change:>+7.0f}% "
+                f"{old['queries_per_request']:>5.1f} -> {result['queries_per_request']:<5.1f}"
+            )
@@ -0,0 +1,306 @@
+import asyncio
+import datetime
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from users.models import User
+from .bench_api import Command as ApiBenchmark, git_commit, percentile
+
+MODES = {
+    # The deployment before the async views: gunicorn's default sync workers
+    'sync': ['--worker-class', 'sync', 'core.wsgi:application'],
+    'asgi': ['--worker-class', 'uvicorn_worker.UvicornWorker', 'core.asgi:application'],
+}
+REQUEST_TIMEOUT = 30
+
+
+def process_tree_usage(pid):
+    """Return (resident bytes, CPU seconds) of pid and all its descendants (Linux only)."""
+    children, stats = {}, {}
+    for entry in Path('/proc').iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            # The command name in parentheses may contain spaces; the fields after it are fixed
+            fields = (entry / 'stat').read_text().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        children.setdefault(int(fields[1]), []).append(int(entry.name))
+        stats[int(entry.name)] = fields
+    rss = cpu = 0
+    page_size, ticks = os.sysconf('SC_PAGE_SIZE'), os.sysconf('SC_CLK_TCK')
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pending += children.get(current, [])
+        if current in stats:
+            fields = stats[current]
+            cpu += (int(fields[11]) + int(fields[12])) / ticks  # utime + stime
+            rss += int(fields[21]) * page_size
+    return rss, cpu
+
+
+async def read_response(reader):
+    """Read one HTTP/1.1 response; return (status, whether the server keeps the connection open)."""
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip().lower()
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get('connection') != 'close'
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the sync (gunicorn WSGI) and async (gunicorn + uvicorn ASGI) deployments under many '
+        'concurrent keep-alive clients hitting the read endpoints. Starts each server itself on a '
+        'local port and reports throughput, latency, failed requests and server memory per '
+        'connection. Needs a dataset from generate_data; Linux only (reads /proc).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='synth', help='Prefix the dataset was generated with.')
+        parser.add_argument('--clients', type=int, default=1000, help='Concurrent client connections.')
+        parser.add_argument('--duration', type=float, default=20, help='Seconds of load after the ramp-up.')
+        parser.add_argument('--ramp', type=float, default=5, help='Seconds over which clients connect.')
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes.')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--modes', default='sync,asgi', help='Comma separated: ' + ', '.join(MODES))
+        parser.add_argument('--label', default='', help='Free-form label stored with the results.')
+        parser.add_argument('--output', help='JSON file to write (default bench-results/serving-<commit>-<time>.json).')
+
+    def targets(self, prefix):
+        fx = ApiBenchmark().fixtures(prefix)
+        course = fx['course']
+        # A typical profile: the fixture user is the dataset's most active one
+        users = User.objects.filter(username__startswith=f'{prefix}-user-').order_by('-total_score', 'id')
+        user = users[users.count() // 2]
+        auth = f"Bearer {fx['user_token']}"
+        return [
+            (reverse('course-list'), None),
+            (reverse('course-detail', kwargs={'slug': course.slug}), auth),
+            (reverse('exam-detail', kwargs={'pk': fx['exam'].pk}), auth),
+            (reverse('leaderboard'), None),
+            (reverse('public-profile', kwargs={'pk': user.pk}), auth),
+            (reverse('attempt-detail', kwargs={'pk': fx['attempt'].pk}), auth),
+        ]
+
+    def handle(self, *args, **options):
+        if not Path('/proc/self/status').exists():
+            raise CommandError('bench_serving reads server memory from /proc and only runs on Linux.')
+        modes = [mode for mode in options['modes'].split(',') if mode]
+        unknown = set(modes) - MODES.keys()
+        if unknown:
+            raise CommandError(f"Unknown mode(s): {', '.join(sorted(unknown))}")
+
+        # Every client needs a socket, and so does the server on the same host
+        _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        if hard < options['clients'] * 2 + 100:
+            self.stderr.write(self.style.WARNING(f'Open file limit {hard} is low for {options["clients"]} clients.'))
+
+        targets = self.targets(options['prefix'])
+        results = {}
+        for mode in modes:
+            self.stdout.write(f"Starting {mode} server with {options['workers']} workers...")
+            results[mode] = self.run_mode(mode, targets, options)
+            self.report(mode, results[mode])
+
+        report = {
+            'label': options['label'],
+            'commit': git_commit(),
+            'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'clients': options['clients'],
+            'duration': options['duration'],
+            'workers': options['workers'],
+            'endpoints': [url for url, _ in targets],
+            'modes': results,
+        }
+        output = Path(options['output'] or (
+            f"bench-results/serving-{report['commit'] or 'local'}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+        ))
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS(f'Results written to {output}'))
+
+    def run_mode(self, mode, targets, options):
+        port = options['port']
+        command = [
+            sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(options['workers']),
+            '--backlog', str(max(2048, options['clients'] * 2)), '--timeout', str(REQUEST_TIMEOUT),
+            '--log-level', 'warning', *MODES[mode],
+        ]
+        environment = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'core.settings')}
+        environment.pop('METRICS_DIR', None)
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=environment)
+        try:
+            self.wait_until_ready(server, port, targets)
+            idle_rss, cpu_before = process_tree_usage(server.pid)
+            samples, stop = [], threading.Event()
+
+            def sample_memory():
+                while not stop.wait(0.25):
+                    samples.append(process_tree_usage(server.pid)[0])
+
+            sampler = threading.Thread(target=sample_memory, daemon=True)
+            sampler.start()
+            try:
+                result = asyncio.run(self.load(port, targets, options))
+            finally:
+                stop.set()
+                sampler.join()
+            cpu = process_tree_usage(server.pid)[1] - cpu_before
+        finally:
+            server.terminate()
+            try:
+                server.wait(15)
+            except subprocess.TimeoutExpired:
+                server.kill()
+                server.wait()
+
+        peak_rss = max(samples, default=idle_rss)
+        result.update({
+            'idle_rss_mb': idle_rss / 2**20,
+            'peak_rss_mb': peak_rss / 2**20,
+            'rss_per_connection_kb': (peak_rss - idle_rss) / 1024 / max(result['peak_connections'], 1),
+            # Independent of how much CPU the client took from the server on the same host
+            'server_cpu_ms_per_request': cpu * 1000 / max(result.pop('completed'), 1),
+        })
+        return result
+
+    def wait_until_ready(self, server, port, targets):
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'The server exited with status {server.returncode}; is gunicorn installed?')
+            try:
+                statuses = asyncio.run(self.warm_up(port, targets))
+            except OSError:
+                time.sleep(0.5)
+                continue
+            failed = [url for (url, _), status in zip(targets, statuses) if status != 200]
+            if failed:
+                raise CommandError(f'Warm-up requests failed: {", ".join(failed)}')
+            return
+        raise CommandError('The server did not start within 60 seconds.')
+
+    async def warm_up(self, port, targets):
+        statuses = []
+        # Once per worker and endpoint, roughly, so imports and caches are loaded before measuring
+        for _ in range(4):
+            for url, auth in targets:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                writer.write(self.request_bytes(url, auth, keep_alive=False))
+                statuses.append((await read_response(reader))[0])
+                writer.close()
+        return statuses[-len(targets):]
+
+    @staticmethod
+    def request_bytes(url, auth, keep_alive=True):
+        lines = [f'GET {url} HTTP/1.1', 'Host: 127.0.0.1', f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if auth:
+            lines.append(f'Authorization: {auth}')
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode()
+
+    async def load(self, port, targets, options):
+        clients, ramp, duration = options['clients'], options['ramp'], options['duration']
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        measure_from, deadline = started + ramp, started + ramp + duration
+        timings, statuses, errors = [], {}, {}
+        state = {'connections': 0, 'peak_connections': 0, 'completed': 0}
+        served = set()
+
+        def note_error(kind):
+            errors[kind] = errors.get(kind, 0) + 1
+
+        async def client(index):
+            await asyncio.sleep(ramp * index / clients)
+            reader = writer = None
+            request = 0
+            while loop.time() < deadline:
+                url, auth = targets[(index + request) % len(targets)]
+                request += 1
+                try:
+                    if writer is None:
+                        reader, writer = await asyncio.wait_for(
+                            asyncio.open_connection('127.0.0.1', port), REQUEST_TIMEOUT
+                        )
+                        state['connections'] += 1
+                        state['peak_connections'] = max(state['peak_connections'], state['connections'])
+                    sent = loop.time()
+                    writer.write(self.request_bytes(url, auth))
+                    status, keep_alive = await asyncio.wait_for(read_response(reader), REQUEST_TIMEOUT)
+                    if sent >= measure_from and loop.time() <= deadline:
+                        timings.append((loop.time() - sent) * 1000)
+                        statuses[status] = statuses.get(status, 0) + 1
+                    served.add(index)
+                    state['completed'] += 1
+                except asyncio.TimeoutError:
+                    note_error('timeout')
+                    keep_alive = False
+                except (OSError, asyncio.IncompleteReadError, ValueError) as exc:
+                    note_error(type(exc).__name__)
+                    keep_alive = False
+                    await asyncio.sleep(0.1)
+                if not keep_alive and writer is not None:
+                    writer.close()
+                    writer = None
+                    state['connections'] -= 1
+            if writer is not None:
+                writer.close()
+                state['connections'] -= 1
+
+        await asyncio.gather(*(client(index) for index in range(clients)))
+        timings.sort()
+        return {
+            'requests': len(timings),
+            'throughput_rps': len(timings) / duration,
+            'p50_ms': percentile(timings, 50),
+            'p95_ms': percentile(timings, 95),
+            'p99_ms': percentile(timings, 99),
+            'max_ms': timings[-1] if timings else None,
+            'status_codes': {str(status): n for status, n in sorted(statuses.items())},
+            'errors': errors,
+            'clients_served': len(served),
+            'peak_connections': state['peak_connections'],
+            'completed': state['completed'],
+        }
+
+    def report(self, mode, result):
+        def ms(value):
+            return f'{value:.0f} ms' if value is not None else '-'
+
+        self.stdout.write(
+            f"{mode}: {result['throughput_rps']:.0f} req/s, p50 {ms(result['p50_ms'])}, p95 {ms(result['p95_ms'])}, "
+            f"p99 {ms(result['p99_ms'])}; {result['clients_served']} clients served, "
+            f"{result['peak_connections']} connections open at peak, errors {result['errors'] or 'none'}"
+        )
+        self.stdout.write(
+            f"{mode}: RSS {result['idle_rss_mb']:.0f} MB idle, {result['peak_rss_mb']:.0f} MB under load, "
+            f"{result['rss_per_connection_kb']:.1f} KB per open connection, "
+            f"{result['server_cpu_ms_per_request']:.1f} ms server CPU per request"
+        )
@@ -0,0 +1,256 @@
+import datetime
+import random
+import time
+from contextlib import contextmanager
+from itertools import product
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from courses.models import CatalogVersion, Course, Lesson
+from exams.models import Choice, Exam, Question
+from results.models import CertificateComment, CertificateLike, DailyScore, ExamAttempt, LeaderboardEntry
+from users.models import User
+
+BATCH_SIZE = 1000
+# Attempts per reconcile_counters call; each one binds its pks, and SQLite caps bound parameters
+RECONCILE_BATCH_SIZE = 500
+CATEGORIES = ['Web Development', 'Data Science', 'DevOps', 'Mobile', 'Security', 'Technology']
+WORDS = (
+    'django react query index cache python request model view serializer token worker '
+    'queue database latency shard replica cursor join filter schema migration deploy'
+).split()
+# 27,000 pseudo-words so full-text queries have realistic selectivity
+SYLLABLES = 'ba be bi bo da de di do ka ke ki ko la le li lo ma me mi mo na ne ni no ra re ri ro sa se'.split()
+VOCABULARY = [''.join(parts) for parts in product(SYLLABLES, repeat=3)]
+
+
+@contextmanager
+def preserve_auto_now_add(*models):
+    """Let bulk_create keep explicit auto_now_add values so history can be spread over time."""
+    fields = [field for model in models for field in model._meta.fields if getattr(field, 'auto_now_add', False)]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a synthetic dataset with bulk inserts for load tests and benchmarks. '
+        'Everything it creates is namespaced by --prefix and can be removed with --flush.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--courses', type=int, default=20)
+        parser.add_argument('--lessons', type=int, default=10, help='Lessons per course.')
+        parser.add_argument('--questions', type=int, default=20, help='Questions per exam.')
+        parser.add_argument('--choices', type=int, default=4, help='Choices per question.')
+        parser.add_argument('--attempts', type=int, default=20000)
+        parser.add_argument('--likes', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=5000)
+        parser.add_argument('--days', type=int, default=90, help='Spread attempts over this many past days.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--prefix', default='synth')
+        parser.add_argument('--password', default='synth-pass', help='Password shared by every generated user.')
+        parser.add_argument('--flush', action='store_true', help='Delete a previous dataset with the same prefix first.')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        self.rng = random.Random(options['seed'])
+        started = time.perf_counter()
+
+        existing = User.objects.filter(username__startswith=f'{prefix}-').exists()
+        if existing and not options['flush']:
+            raise CommandError(f'A dataset with prefix "{prefix}" already exists, pass --flush to replace it.')
+        if options['flush']:
+            self.flush(prefix)
+
+        with transaction.atomic():
+            exams = self.create_catalog(prefix, options)
+            plan = self.plan_attempts(exams, options)
+            users = self.create_users(prefix, plan, options)
+            attempts = self.create_attempts(users, plan)
+            self.create_social(users, attempts, options)
+            self.create_rollups(users, plan)
+
+        User.update_ranks()
+        for period in LeaderboardEntry.PERIOD_DAYS:
+            LeaderboardEntry.rebuild(period)
+        CatalogVersion.bump()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(users)} users, {options['courses']} courses, {len(attempts)} attempts "
+            f'in {time.perf_counter() - started:.1f}s (prefix "{prefix}").'
+        ))
+
+    def flush(self, prefix):
+        # Attempts, likes, comments and rollups cascade from users and courses
+        User.objects.filter(username__startswith=f'{prefix}-').delete()
+        Course.objects.filter(slug__startswith=f'{prefix}-').delete()
+        User.update_ranks()
+        for period in LeaderboardEntry.PERIOD_DAYS:
+            LeaderboardEntry.rebuild(period)
+        CatalogVersion.bump()
+
+    def text(self, words):
+        rng = self.rng
+        return ' '.join(rng.choice(WORDS) if rng.random() < 0.3 else rng.choice(VOCABULARY) for _ in range(words))
+
+    def create_catalog(self, prefix, options):
+        rng = self.rng
+        courses = Course.objects.bulk_create(
+            (Course(
+                title=f'{prefix} course {i}: {self.text(3)}',
+                slug=f'{prefix}-course-{i}',
+                description=self.text(60),
+                category=rng.choice(CATEGORIES),
+                difficulty=rng.choice(Course.DIFFICULTY_CHOICES)[0],
+            ) for i in range(options['courses'])),
+            batch_size=BATCH_SIZE,
+        )
+        Lesson.objects.bulk_create(
+            (Lesson(
+                course=course,
+                title=f'Lesson {order}: {self.text(4)}',
+                content=self.text(400),
+                code_snippet=self.text(40),
+                order=order,
+            ) for course in courses for order in range(1, options['lessons'] + 1)),
+            batch_size=BATCH_SIZE,
+        )
+        exams = Exam.objects.bulk_create(
+            (Exam(course=course, title=f'{course.title} exam', passing_score=rng.choice([50, 60, 70]))
+             for course in courses),
+            batch_size=BATCH_SIZE,
+        )
+        questions = Question.objects.bulk_create(
+            (Question(exam=exam, text=f'{self.text(12)}?', points=rng.choice([10, 20, 50]))
+             for exam in exams for _ in range(options['questions'])),
+            batch_size=BATCH_SIZE,
+        )
+        choices = []
+        for question in questions:
+            correct = rng.randrange(options['choices'])
+            choices.extend(
+                Choice(question=question, text=self.text(3), is_correct=index == correct)
+                for index in range(options['choices'])
+            )
+        Choice.objects.bulk_create(choices, batch_size=BATCH_SIZE)
+
+        total_points = {}
+        for question in questions:
+            total_points[question.exam_id] = total_points.get(question.exam_id, 0) + question.points
+        return [(exam, total_points.get(exam.pk, 0)) for exam in exams]
+
+    def plan_attempts(self, exams, options):
+        """Draw every attempt up front so user totals are known before the users are inserted."""
+        rng = self.rng
+        now = timezone.now()
+        # A few power users do most of the attempts, like real traffic
+        weights = [1 / (i + 1) for i in range(options['users'])]
+        user_indexes = rng.choices(range(options['users']), weights=weights, k=options['attempts']) if exams else []
+        plan = []
+        for user_index in user_indexes:
+            exam, total_points = rng.choice(exams)
+            score = rng.randint(0, 100)
+            is_passed = score >= exam.passing_score
+            plan.append({
+                'user_index': user_index,
+                'exam': exam,
+                'score': score,
+                'earned_points': total_points * score // 100 if is_passed else 0,
+                'time_taken': rng.randint(60, exam.duration_minutes * 60),
+                'is_passed': is_passed,
+                'completed_at': now - datetime.timedelta(seconds=rng.randint(0, options['days'] * 86400)),
+            })
+        return plan
+
+    def create_users(self, prefix, plan, options):
+        totals = [[0, 0] for _ in range(options['users'])]
+        for attempt in plan:
+            totals[attempt['user_index']][0] += attempt['earned_points']
+            totals[attempt['user_index']][1] += attempt['time_taken'] // 60
+        # Hash once; every generated user shares the password
+        password = make_password(options['password'])
+        users = User.objects.bulk_create(
+            (User(
+                username=f'{prefix}-user-{i}',
+                email=f'{prefix}-user-{i}@example.com',
+                password=password,
+                first_name=self.rng.choice(WORDS).title(),
+                total_score=points,
+                study_time=minutes,
+                level=points // 1000 + 1,
+            ) for i, (points, minutes) in enumerate(totals)),
+            batch_size=BATCH_SIZE,
+        )
+        User.objects.create(
+            username=f'{prefix}-admin', email=f'{prefix}-admin@example.com', password=password,
+            is_staff=True, is_superuser=True, role='admin',
+        )
+        return users
+
+    def create_attempts(self, users, plan):
+        with preserve_auto_now_add(ExamAttempt):
+            return ExamAttempt.objects.bulk_create(
+                (ExamAttempt(
+                    user=users[attempt['user_index']],
+                    exam=attempt['exam'],
+                    score=attempt['score'],
+                    earned_points=attempt['earned_points'],
+                    time_taken=attempt['time_taken'],
+                    is_passed=attempt['is_passed'],
+                    completed_at=attempt['completed_at'],
+                ) for attempt in plan),
+                batch_size=BATCH_SIZE,
+            )
+
+    def create_social(self, users, attempts, options):
+        rng = self.rng
+        passed = [attempt for attempt in attempts if attempt.is_passed]
+        if not passed or not users:
+            return
+        pairs = set()
+        # Bounded so a small dataset can't spin looking for free pairs
+        for _ in range(options['likes'] * 2):
+            if len(pairs) >= min(options['likes'], len(passed) * len(users)):
+                break
+            pairs.add((rng.randrange(len(passed)), rng.randrange(len(users))))
+        now = timezone.now()
+        with preserve_auto_now_add(CertificateLike, CertificateComment):
+            CertificateLike.objects.bulk_create(
+                (CertificateLike(attempt=passed[a], user=users[u], created_at=passed[a].completed_at)
+                 for a, u in pairs),
+                batch_size=BATCH_SIZE,
+            )
+            comments = []
+            for _ in range(options['comments']):
+                attempt = rng.choice(passed)
+                created_at = attempt.completed_at + (now - attempt.completed_at) * rng.random()
+                comments.append(CertificateComment(
+                    attempt=attempt, user=rng.choice(users), text=self.text(12), created_at=created_at,
+                ))
+            CertificateComment.objects.bulk_create(comments, batch_size=BATCH_SIZE)
+        pks = [attempt.pk for attempt in passed]
+        for start in range(0, len(pks), RECONCILE_BATCH_SIZE):
+            ExamAttempt.objects.filter(pk__in=pks[start:start + RECONCILE_BATCH_SIZE]).reconcile_counters()
+
+    def create_rollups(self, users, plan):
+        daily = {}
+        for attempt in plan:
+            key = (users[attempt['user_index']].pk, timezone.localdate(attempt['completed_at']))
+            totals = daily.setdefault(key, [0, 0, 0])
+            totals[0] += attempt['earned_points']
+            totals[1] += 1
+            totals[2] += attempt['time_taken'] // 60
+        DailyScore.objects.bulk_create(
+            (DailyScore(user_id=user_id, day=day, earned_points=points, attempts=count, study_minutes=minutes)
+             for (user_id, day), (points, count, minutes) in daily.items()),
+            batch_size=BATCH_SIZE,
+        )
@@ -0,0 +1,286 @@
+"""Per-request SQL and timing instrumentation.
+
+RequestMetricsMiddleware measures, per resolved URL name, the number of SQL
+queries, time spent in the database, time spent building serializer output and
+total time. Each response gets a Server-Timing header, and the numbers are
+folded into in-process histograms served in Prometheus text format by
+MetricsView.
+
+The middleware runs natively under both WSGI and ASGI. Queries are counted by
+a wrapper installed once on every database connection, which charges them to
+the request in the current context, so queries the async ORM runs in its worker
+thread are counted too.
+
+Each gunicorn worker keeps its own histograms. When METRICS_DIR is set, every
+worker also writes a snapshot of them there (at most every
+METRICS_FLUSH_SECONDS) and the metrics endpoint sums all snapshots, so a scrape
+sees the whole server no matter which worker answers it. Like Prometheus'
+multiprocess mode, the directory must be emptied when the server starts.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from rest_framework import permissions, views
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+HISTOGRAMS = {
+    'api_request_duration_seconds': ('Total time spent handling the request.', DURATION_BUCKETS),
+    'api_request_db_seconds': ('Time spent executing SQL queries.', DURATION_BUCKETS),
+    'api_request_serializer_seconds': ('Time spent building serializer output, lazy queries included.', DURATION_BUCKETS),
+    'api_request_queries': ('Number of SQL queries executed.', QUERY_BUCKETS),
+}
+COUNTERS = {
+    'api_requests_total': 'Requests handled, by view and status code.',
+}
+
+# Metrics of the request being handled in this thread or task, None outside a request
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestTimer:
+    __slots__ = ('queries', 'db_time', 'serializer_time', 'serializing')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+
+class Registry:
+    """Histograms and counters of one worker process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        # Also runs in a freshly forked worker so it never reports its parent's numbers
+        self.histograms = {name: {} for name in HISTOGRAMS}
+        self.counters = {name: {} for name in COUNTERS}
+        self.token = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self.flushed_at = time.monotonic()
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        with self.lock:
+            series = self.histograms[name].setdefault(labels, [0] * (len(buckets) + 1) + [0.0])
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            else:
+                series[len(buckets)] += 1
+            series[-1] += value
+
+    def inc(self, name, labels):
+        with self.lock:
+            self.counters[name][labels] = self.counters[name].get(labels, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'histograms': {name: [[list(labels), list(series)] for labels, series in values.items()]
+                               for name, values in self.histograms.items()},
+                'counters': {name: [[list(labels), value] for labels, value in values.items()]
+                             for name, values in self.counters.items()},
+            }
+
+    def maybe_flush(self):
+        directory = getattr(settings, 'METRICS_DIR', None)
+        if not directory or time.monotonic() - self.flushed_at < getattr(settings, 'METRICS_FLUSH_SECONDS', 5):
+            return
+        self.flush(directory)
+
+    def flush(self, directory):
+        self.flushed_at = time.monotonic()
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        target = path / f'worker-{self.token}.json'
+        temporary = path / f'.worker-{self.token}.tmp'
+        temporary.write_text(json.dumps(self.snapshot()))
+        os.replace(temporary, target)  # Readers never see a half-written file
+
+    def collect(self):
+        """Return the merged snapshot of every worker (or just this one without METRICS_DIR)."""
+        directory = getattr(settings, 'METRICS_DIR', None)
+        if not directory:
+            return merge([self.snapshot()])
+        self.flush(directory)
+        snapshots = []
+        for path in Path(directory).glob('worker-*.json'):
+            try:
+                snapshots.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue
+        return merge(snapshots)
+
+
+def merge(snapshots):
+    histograms = {name: {} for name in HISTOGRAMS}
+    counters = {name: {} for name in COUNTERS}
+    for snapshot in snapshots:
+        for name, values in snapshot.get('histograms', {}).items():
+            for labels, series in values:
+                merged = histograms.setdefault(name, {}).setdefault(tuple(map(tuple, labels)), [0] * len(series))
+                for index, value in enumerate(series):
+                    merged[index] += value
+        for name, values in snapshot.get('counters', {}).items():
+            for labels, value in values:
+                key = tuple(map(tuple, labels))
+                counters.setdefault(name, {})[key] = counters[name].get(key, 0) + value
+    return histograms, counters
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in pairs) + '}' if pairs else ''
+
+
+def render(histograms, counters):
+    """Render merged metrics in the Prometheus text exposition format."""
+    lines = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for labels, series in sorted(histograms.get(name, {}).items()):
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), series):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {series[-1]}')
+            lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+    for name, help_text in COUNTERS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for labels, value in sorted(counters.get(name, {}).items()):
+            lines.append(f'{name}{format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=registry.reset)
+
+
+def time_serializer_data(data_property):
+    """Wrap BaseSerializer.data so the outermost call is charged to the current request."""
+    fget = data_property.fget
+
+    def data(self):
+        timer = _current.get()
+        if timer is None or timer.serializing:
+            return fget(self)
+        timer.serializing = True
+        started = time.perf_counter()
+        try:
+            return fget(self)
+        finally:
+            timer.serializer_time += time.perf_counter() - started
+            timer.serializing = False
+
+    data.__wrapped__ = fget
+    return property(data)
+
+
+def record_query(execute, sql, params, many, context):
+    timer = _current.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+def add_query_wrapper(connection, **kwargs):
+    # connection_created fires again on every reconnect of the same wrapper
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def install():
+    from rest_framework.serializers import BaseSerializer
+
+    if not hasattr(BaseSerializer.data.fget, '__wrapped__'):
+        BaseSerializer.data = time_serializer_data(BaseSerializer.data)
+    connection_created.connect(add_query_wrapper, dispatch_uid='core.metrics.add_query_wrapper')
+    for connection in connections.all(initialized_only=True):
+        add_query_wrapper(connection)
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timer = RequestTimer()
+        token = _current.set(timer)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timer, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        timer = RequestTimer()
+        token = _current.set(timer)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timer, time.perf_counter() - started)
+
+    def finish(self, request, response, timer, total):
+        match = request.resolver_match
+        labels = (('view', match.view_name if match else '<unresolved>'),)
+        registry.observe('api_request_duration_seconds', labels, total)
+        registry.observe('api_request_db_seconds', labels, timer.db_time)
+        registry.observe('api_request_serializer_seconds', labels, timer.serializer_time)
+        registry.observe('api_request_queries', labels, timer.queries)
+        registry.inc('api_requests_total', (*labels, ('status', response.status_code)))
+        registry.maybe_flush()
+
+        response['Server-Timing'] = (
+            f'db;desc="{timer.queries} queries";dur={timer.db_time * 1000:.2f}, '
+            f'serializer;dur={timer.serializer_time * 1000:.2f}, '
+            f'total;dur={total * 1000:.2f}'
+        )
+        return response
+
+
+class MetricsView(views.APIView):
+    """Prometheus scrape target; authenticate with a staff user's token."""
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        return HttpResponse(render(*registry.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
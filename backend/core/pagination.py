@@ -0,0 +1,104 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class OptInCursorPagination(CursorPagination):
+    """Keyset pagination that clients opt into with ?page_size= (or by following a cursor).
+
+    Requests without either parameter still get the full unpaginated list,
+    so existing clients keep working while they migrate.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def opted_in(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.opted_in(request):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class KeysetCursorPagination(OptInCursorPagination):
+    """Cursor pagination keyed on every ordering field, for orderings with large ties.
+
+    DRF's CursorPagination only keys on the first ordering field and walks
+    ties with an offset, which stops at offset_cutoff and gets slower with
+    every page inside the tie. Here the cursor holds the values of all the
+    ordering fields, the last of which must be unique. A page is read with
+    one index range per field at most: the rows sharing every value but the
+    last one come first, then those sharing one value less, and so on.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.opted_in(request):
+            return None
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+        cursor = self.decode_cursor(request)
+        self.reverse = cursor is not None and cursor.reverse
+
+        fields = [(name.lstrip('-'), name.startswith('-') != self.reverse) for name in self.ordering]
+        queryset = queryset.order_by(*(f'-{name}' if descending else name for name, descending in fields))
+        if cursor is None or cursor.position is None:
+            rows = list(queryset[:self.page_size + 1])
+        else:
+            try:
+                position = json.loads(cursor.position)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+            if not isinstance(position, list) or len(position) != len(fields):
+                raise NotFound(self.invalid_cursor_message)
+            rows = []
+            for level in reversed(range(len(fields))):
+                name, descending = fields[level]
+                after = Q(**{name + ('__lt' if descending else '__gt'): position[level]})
+                same = Q(**{field: value for (field, _), value in zip(fields[:level], position)})
+                rows += queryset.filter(same & after)[:self.page_size + 1 - len(rows)]
+                if len(rows) > self.page_size:
+                    break
+
+        more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if self.reverse:
+            self.page.reverse()
+        # Reading backwards means there is a next page (the one we came from)
+        self.has_next = more if not self.reverse else True
+        self.has_previous = cursor is not None if not self.reverse else more
+        return self.page
+
+    def position(self, instance):
+        values = [getattr(instance, name.lstrip('-')) for name in self.ordering]
+        return json.dumps(values, cls=DjangoJSONEncoder)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self.position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self.position(self.page[0])))
+
+
+class AttemptCursorPagination(OptInCursorPagination):
+    ordering = ('-completed_at', '-id')
+
+
+class CommentCursorPagination(OptInCursorPagination):
+    ordering = ('-created_at', '-id')
+
+
+class UserCursorPagination(KeysetCursorPagination):
+    # Every new user starts at total_score 0, so the score tie can hold most of the table
+    ordering = ('-total_score', 'id')
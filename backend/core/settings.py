@@ -47,15 +47,18 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt',
 
     # Local apps
+    'core',
     'users',
     'courses',
     'exams',
     'results',
+    'jobs',
 ]
 
 MIDDLEWARE = [
+    'core.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.AsyncWhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -99,6 +102,14 @@ DATABASES = {
     }
 }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # The web process and the job worker write concurrently: wait for the
+    # write lock instead of failing with "database is locked".
+    DATABASES['default']['OPTIONS'] = {
+        'timeout': 20,
+        'transaction_mode': 'IMMEDIATE',
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -141,9 +152,9 @@ STATICFILES_DIRS = [
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 # Authentication Backends
+# A single backend: a second one would hash the password again on every failed login
 AUTHENTICATION_BACKENDS = [
     'users.backends.EmailOrUsernameModelBackend',
-    'django.contrib.auth.backends.ModelBackend',
 ]
 
 # Custom User Model
@@ -152,7 +163,7 @@ AUTH_USER_MODEL = 'users.User'
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -194,6 +205,34 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Cache shared by every web worker and the job worker, e.g. redis://redis:6379/0.
+# Without it each process caches in its own memory.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+
+# How long CachedJWTAuthentication may reuse a user's permission columns.
+# Every write to those columns drops the entry, but only a shared cache lets
+# that reach the other workers, so without REDIS_URL the default is 0 (off):
+# a demotion or deactivation must apply at once everywhere.
+AUTH_USER_CACHE_SECONDS = int(os.getenv('AUTH_USER_CACHE_SECONDS', '30' if REDIS_URL else '0'))
+
+# Background jobs (see jobs.models.Job). Run `manage.py run_worker` in
+# production; JOBS_EAGER runs each job right after its transaction commits.
+# On by default with DEBUG, so a runserver without a worker still applies
+# scores, ranks and leaderboards.
+JOBS_EAGER = os.getenv('JOBS_EAGER', str(DEBUG)) == 'True'
+
+# Request metrics (see core.metrics). With several gunicorn workers, point
+# METRICS_DIR at a directory they share so /api/metrics/ covers all of them.
+METRICS_DIR = os.getenv('METRICS_DIR') or None
+METRICS_FLUSH_SECONDS = int(os.getenv('METRICS_FLUSH_SECONDS', '5'))
+
 # Media files
 import os
 MEDIA_URL = '/media/'
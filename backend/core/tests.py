@@ -0,0 +1,482 @@
+import asyncio
+import io
+import json
+import re
+import tempfile
+import threading
+from io import StringIO
+from unittest import skipUnless
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from PIL import Image
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils.module_loading import import_string
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from courses.models import CatalogVersion, Course
+from exams.models import Choice, Exam, Question
+from courses.views import CourseCompletersView
+from results.models import CertificateLike, DailyScore, ExamAttempt, LeaderboardEntry
+from results.views import CertificateCommentListCreateView, ExamAttemptDetailView, UserExamAttemptListView
+from users.models import User
+from users.views import AdminUserListView, LeaderboardView
+from . import images, metrics
+from .cache import aget_or_build
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        metrics.registry.reset()
+        self.client = APIClient()
+        Course.objects.create(title='Metrics', description='-')
+
+    def test_server_timing_header(self):
+        response = self.client.get('/api/courses/')
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'^db;desc="\d+ queries";dur=[\d.]+, serializer;dur=[\d.]+, total;dur=[\d.]+$')
+
+    def test_metrics_endpoint_is_staff_only(self):
+        self.client.force_authenticate(User.objects.create_user('student', password='pass'))
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+    def test_metrics_merge_worker_snapshots(self):
+        self.client.get('/api/courses/')
+        self.client.force_authenticate(User.objects.create_user('admin', password='pass', is_staff=True))
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            # Another worker's snapshot with one request of its own
+            other = metrics.Registry()
+            other.observe('api_request_queries', (('view', 'course-list'),), 1)
+            other.inc('api_requests_total', (('view', 'course-list'), ('status', 200)))
+            other.flush(directory)
+            body = self.client.get('/api/metrics/').content.decode()
+        self.assertIn('api_requests_total{view="course-list",status="200"} 2', body)
+        self.assertIn('api_request_queries_count{view="course-list"} 2', body)
+        self.assertIn('api_request_serializer_seconds_bucket{view="course-list",le="+Inf"} 1', body)
+
+
+class AsyncServingTests(TestCase):
+    READ_URLS = ['/api/courses/', '/api/courses/async/', '/api/exams/{exam}/', '/api/auth/leaderboard/',
+                 '/api/auth/profile/{user}/', '/api/results/attempts/{attempt}/']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', password='pass')
+        course = Course.objects.create(title='Async', slug='async', description='-')
+        cls.exam = Exam.objects.create(course=course, title='Async exam')
+        question = Question.objects.create(exam=cls.exam, text='?', points=10)
+        Choice.objects.create(question=question, text='yes', is_correct=True)
+        cls.attempt = ExamAttempt.objects.create(user=cls.user, exam=cls.exam, score=100, time_taken=60, is_passed=True)
+
+    def auth(self, **headers):
+        return {'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}', **headers}
+
+    def urls(self):
+        return [url.format(exam=self.exam.pk, user=self.user.pk, attempt=self.attempt.pk) for url in self.READ_URLS]
+
+    def test_read_views_are_async(self):
+        for url in self.urls():
+            with self.subTest(url=url):
+                self.assertTrue(iscoroutinefunction(resolve(url).func))
+
+    def test_middleware_runs_without_sync_adaptation(self):
+        # A single sync-only middleware would push every ASGI request through one thread
+        for path in settings.MIDDLEWARE:
+            with self.subTest(middleware=path):
+                self.assertTrue(getattr(import_string(path), 'async_capable', False))
+
+    async def test_read_views_under_asgi(self):
+        client = AsyncClient()
+        for url in self.urls():
+            with self.subTest(url=url):
+                response = await client.get(url, headers=self.auth())
+                self.assertEqual(response.status_code, 200)
+                # Queries the async ORM runs in its worker thread are still counted
+                self.assertRegex(response['Server-Timing'], r'^db;desc="[1-9]\d* queries"')
+                again = await client.get(url, headers=self.auth(**{'If-None-Match': response.get('ETag', '-')}))
+                self.assertEqual(again.status_code, 304 if response.has_header('ETag') else 200)
+
+    async def test_authentication_errors_under_asgi(self):
+        client = AsyncClient()
+        self.assertEqual((await client.get(f'/api/exams/{self.exam.pk}/')).status_code, 401)
+        response = await client.get(f'/api/exams/{self.exam.pk}/', headers={'Authorization': 'Bearer nonsense'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual((await client.get('/api/exams/0/', headers=self.auth())).status_code, 404)
+
+
+def image_upload(name='photo.png', size=(1600, 1200), mode='RGB'):
+    buffer = io.BytesIO()
+    Image.new(mode, size, 'red').save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.viewer = User.objects.create_user('viewer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_course_detail(self):
+        course = Course.objects.create(title='Algebra', slug='algebra', description='-')
+        exam = Exam.objects.create(course=course, title='Final')
+        url = '/api/courses/algebra/'
+        etag = self.client.get(url)['ETag']
+        # Answered from the catalog version, exam version and passed attempt alone
+        with self.assertNumQueries(3):
+            self.assertEqual(self.revalidate(url, etag).status_code, 304)
+
+        ExamAttempt.objects.create(user=self.viewer, exam=exam, score=90, earned_points=10, time_taken=60, is_passed=True)
+        response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['user_status']['is_passed'])
+        etag = response['ETag']
+        self.assertEqual(self.revalidate(url, etag).status_code, 304)
+        CatalogVersion.bump()
+        self.assertEqual(self.revalidate(url, etag).status_code, 200)
+
+    def test_public_profile_follows_the_rank(self):
+        owner = User.objects.create_user('owner', total_score=100)
+        rival = User.objects.create_user('rival', total_score=50)
+        url = f'/api/auth/profile/{owner.pk}/'
+        response = self.client.get(url)
+        self.assertEqual(response.data['rank'], 1)
+        etag = response['ETag']
+        self.assertEqual(self.revalidate(url, etag).status_code, 304)
+
+        # Overtaken: the owner's row doesn't change, but the rank does
+        new_score = User.add_progress(rival.pk, 100)
+        User(pk=rival.pk, total_score=new_score).shift_rank(new_score - 100)
+        response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['rank'], 2)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.revalidate(url, response['ETag']).status_code, 304)
+
+        # The ETag is per viewer, since is_liked depends on who asks
+        other = APIClient()
+        other.force_authenticate(rival)
+        self.assertEqual(other.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name, JOBS_EAGER=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user('artist', password='pass')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def upload_avatar(self, upload):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch('/api/auth/me/', {'avatar': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        return self.client.get('/api/auth/me/').data
+
+    def test_upload_builds_variants(self):
+        variants = self.upload_avatar(image_upload())['avatar_variants']
+        self.assertEqual(set(variants), {'64', '256', '1024'})
+        for size, urls in variants.items():
+            self.assertEqual(set(urls), {'webp', 'jpg'})
+            for ext, url in urls.items():
+                with default_storage.open(url.split('/media/', 1)[1]) as file, Image.open(file) as image:
+                    self.assertEqual(image.format, 'WEBP' if ext == 'webp' else 'JPEG')
+                    self.assertEqual(image.size, (int(size), int(size) * 3 // 4))
+
+        response = self.client.get(variants['64']['webp'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], images.CACHE_CONTROL)
+        # Compact author projections link a single variant
+        self.assertEqual(self.client.get('/api/auth/leaderboard/').data[0]['avatar'], variants['256']['webp'])
+
+    def test_new_upload_replaces_variants(self):
+        first = self.upload_avatar(image_upload())['avatar_variants']
+        second = self.upload_avatar(image_upload(mode='RGBA', size=(300, 300)))['avatar_variants']
+        self.assertNotEqual(first['64']['webp'], second['64']['webp'])
+        # Never upscaled
+        with default_storage.open(second['1024']['jpg'].split('/media/', 1)[1]) as file, Image.open(file) as image:
+            self.assertEqual(image.size, (300, 300))
+
+    def test_stale_variants_are_hidden_and_backfilled(self):
+        self.upload_avatar(image_upload())
+        User.objects.filter(pk=self.user.pk).update(avatar=default_storage.save('avatars/old.png', image_upload()))
+        self.assertIsNone(self.client.get('/api/auth/me/').data['avatar_variants'])
+
+        call_command('backfill_image_variants', '--prune', stdout=StringIO())
+        variants = self.client.get('/api/auth/me/').data['avatar_variants']
+        self.assertIsNotNone(variants)
+        # The first upload's variants are gone, the current ones remain
+        referenced = {url.split('/media/', 1)[1] for urls in variants.values() for url in urls.values()}
+        stored = {
+            f'{images.DIRECTORY}/{directory}/{name}'
+            for directory in default_storage.listdir(images.DIRECTORY)[0]
+            for name in default_storage.listdir(f'{images.DIRECTORY}/{directory}')[1]
+        }
+        self.assertEqual(stored, referenced)
+
+
+class BuildOnceCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.builds = 0
+
+    async def build(self):
+        self.builds += 1
+        await asyncio.sleep(0.05)
+        if self.builds == 1 and self.fail_first:
+            raise RuntimeError('database went away')
+        return b'payload'
+
+    async def test_concurrent_misses_build_once(self):
+        self.fail_first = False
+        values = await asyncio.gather(*(aget_or_build('stampede', self.build, 60) for _ in range(50)))
+        self.assertEqual(set(values), {b'payload'})
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(await aget_or_build('stampede', self.build, 60), b'payload')
+        self.assertEqual(self.builds, 1)
+
+    async def test_failed_build_is_retried_by_waiters(self):
+        self.fail_first = True
+        results = await asyncio.gather(
+            *(aget_or_build('flaky', self.build, 60) for _ in range(5)), return_exceptions=True
+        )
+        self.assertIsInstance(results[0], RuntimeError)
+        self.assertEqual(results[1:], [b'payload'] * 4)
+        self.assertEqual(self.builds, 2)
+        self.assertIsNone(await cache.aget('flaky:building'))
+
+    async def test_lock_of_another_builder_is_left_alone(self):
+        self.fail_first = False
+        # Another process is still building and holds the lock
+        await cache.aadd('slow:building', 1, 60)
+        self.assertEqual(await aget_or_build('slow', self.build, 60, lock_timeout=0.05, poll_seconds=0.01), b'payload')
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(await cache.aget('slow:building'), 1)
+
+    def test_requests_in_other_event_loops(self):
+        # Under WSGI every request runs in a loop of its own; they share the build through the cache lock
+        started = threading.Event()
+
+        async def slow_build():
+            self.builds += 1
+            started.set()
+            await asyncio.sleep(0.2)
+            return b'payload'
+
+        results = {}
+
+        def request(name):
+            results[name] = async_to_sync(aget_or_build)('loops', slow_build, 60, poll_seconds=0.01)
+
+        first = threading.Thread(target=request, args=('first',))
+        first.start()
+        started.wait(5)
+        second = threading.Thread(target=request, args=('second',))
+        second.start()
+        first.join()
+        second.join()
+        self.assertEqual(results, {'first': b'payload', 'second': b'payload'})
+        self.assertEqual(self.builds, 1)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        # More users tied at 0 than DRF's offset_cutoff (1000), plus a few ahead of them
+        User.objects.bulk_create(
+            User(username=f'player{i}', password='!', total_score=0 if i % 20 else i * 10) for i in range(1300)
+        )
+        User.update_ranks()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('root', 'root@example.com', 'secret'))
+
+    def walk(self, url, link):
+        pages, results = 0, []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                data = self.client.get(url).data
+            # One index range per page, two where the page crosses from one score to the next
+            self.assertLessEqual(len(queries), 2)
+            pages += 1
+            results += data['results']
+            url = data[link]
+        return pages, results
+
+    def test_walks_past_a_large_tie(self):
+        pages, results = self.walk('/api/auth/admin/users/?page_size=100&fields=id,username', 'next')
+        expected = list(User.objects.order_by('-total_score', 'id').values_list('id', flat=True))
+        self.assertEqual(pages, 14)
+        self.assertEqual([row['id'] for row in results], expected)
+
+        # And back from the last page
+        last = self.client.get('/api/auth/admin/users/?page_size=100')
+        url = last.data['next']
+        while True:
+            data = self.client.get(url).data
+            if not data['next']:
+                break
+            url = data['next']
+        pages, results = self.walk(data['previous'], 'previous')
+        self.assertEqual(pages, 13)
+        self.assertEqual(sorted(row['id'] for row in results), sorted(expected[:1300]))
+
+    def test_sparse_page_loads_the_ordering_columns(self):
+        # The cursor reads total_score off the last row; deferring it would cost a query per link
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/auth/admin/users/?fields=id,username&page_size=20')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'username'})
+        self.assertIsNotNone(response.data['next'])
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ada', 'ada@example.com', 'pass', phone_number='+998901234567')
+        course = Course.objects.create(title='Algebra', description='-')
+        self.attempt = ExamAttempt.objects.create(
+            user=self.user, exam=Exam.objects.create(course=course, title='Final'),
+            score=90, earned_points=100, time_taken=60, is_passed=True,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.client.post(f'/api/results/attempts/{self.attempt.pk}/comments/', {'text': 'Done!'})
+
+    def test_nested_and_listed_users_are_compact(self):
+        self.assertEqual(set(self.client.get('/api/auth/leaderboard/').data[0]),
+                         {'id', 'username', 'avatar', 'level', 'total_score', 'rank'})
+        comment = self.client.get(f'/api/results/attempts/{self.attempt.pk}/comments/').data[0]
+        self.assertEqual(set(comment['user']), {'id', 'username', 'avatar', 'level'})
+
+    def test_fields_narrow_the_query(self):
+        with self.assertNumQueries(1) as captured:
+            data = self.client.get('/api/auth/leaderboard/', {'fields': 'id,username'}).data
+        self.assertEqual(data, [{'id': self.user.pk, 'username': 'ada'}])
+        self.assertNotIn('"level"', captured.captured_queries[0]['sql'])
+
+        self.client.force_authenticate(User.objects.create_user('root', password='pass', is_staff=True))
+        data = self.client.get('/api/auth/admin/users/', {'omit': 'email,phone_number,birth_date'}).data
+        self.assertNotIn('email', data[0])
+        self.assertIn('first_name', data[0])
+
+    def test_omitted_relations_are_not_loaded(self):
+        url = f'/api/results/attempts/{self.attempt.pk}/'
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self.client.get(url).data['comments']), 1)
+        with self.assertNumQueries(1):
+            data = self.client.get(url, {'omit': 'comments,is_liked'}).data
+        self.assertNotIn('comments', data)
+        self.assertEqual(data['comments_count'], 1)
+
+    def test_unknown_fields_and_writes(self):
+        response = self.client.get('/api/auth/leaderboard/', {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        # Writes validate and return the whole object whatever the query string says
+        response = self.client.patch('/api/auth/me/?fields=id', {'bio': 'Hi'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['bio'], 'Hi')
+        self.assertIn('email', response.data)
+
+
+def plan_regressions(queryset, index_walk=False):
+    """EXPLAIN a queryset and return (problems, plan), where problems lists its full scans and sorts.
+
+    Reading a whole index in order is only accepted with index_walk, for top-N
+    queries that stop after their LIMIT.
+    """
+    problems = []
+    if connection.vendor == 'sqlite':
+        plan = queryset.explain()
+        for table, using in re.findall(r'\bSCAN (\w+)(?!\w)( USING (?:COVERING )?INDEX)?', plan):
+            if not (using and index_walk):
+                problems.append(f'full scan of {table}')
+        problems += ['temp b-tree sort'] * plan.count('USE TEMP B-TREE')
+        return problems, plan
+
+    plan = queryset.explain(format='json')
+    nodes = [json.loads(plan)[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        nodes += node.get('Plans', [])
+        kind, table = node['Node Type'], node.get('Relation Name')
+        if kind == 'Seq Scan':
+            problems.append(f'seq scan of {table}')
+        elif kind in ('Sort', 'Incremental Sort'):
+            problems.append('sort')
+        elif kind in ('Index Scan', 'Index Only Scan') and 'Index Cond' not in node and not index_walk:
+            problems.append(f'full index scan of {table}')
+    return problems, plan
+
+
+@skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'Plans are only checked on SQLite and PostgreSQL')
+class QueryPlanTests(TestCase):
+    """Hot queries must be served from indexes, without full table scans or sorts."""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'generate_data', users=200, courses=5, lessons=5, questions=5,
+            attempts=3000, likes=2000, comments=1000, stdout=StringIO(),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.user = User.objects.get(username='synth-user-0')
+        cls.attempt = ExamAttempt.objects.filter(user=cls.user).first()
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Tiny tables make a seq scan the cheapest plan; with these off the
+            # planner only scans or sorts when no index can serve the query.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('SET LOCAL enable_sort = off')
+
+    def view_queryset(self, view_class, user=None, **kwargs):
+        request = Request(RequestFactory().get('/'))
+        request.user = user or self.user
+        view = view_class()
+        view.setup(request, **kwargs)
+        return view.get_queryset()
+
+    def hot_queries(self):
+        """(name, queryset, whether reading an index from the start is expected)"""
+        admin = User.objects.get(username='synth-admin')
+        return [
+            ('leaderboard', self.view_queryset(LeaderboardView), True),
+            ('weekly leaderboard', LeaderboardEntry.top('weekly'), False),
+            ('course completers', self.view_queryset(CourseCompletersView, slug='synth-course-0'), False),
+            ('history', self.view_queryset(UserExamAttemptListView), False),
+            ('attempt detail', self.view_queryset(ExamAttemptDetailView).filter(pk=self.attempt.pk), False),
+            ('attempt comments', self.view_queryset(CertificateCommentListCreateView, pk=self.attempt.pk), False),
+            ('likes by attempt', CertificateLike.objects.filter(attempt=self.attempt), False),
+            ('dashboard stats', DailyScore.objects.filter(user=self.user, day__gte='2026-01-01').order_by('day'), False),
+            ('admin users', self.view_queryset(AdminUserListView, user=admin)[:20], True),
+            ('login by username', User.login_lookup('SYNTH-USER-3'), False),
+            ('login by email', User.login_lookup('synth-user-3@example.com'), False),
+        ]
+
+    def test_generated_counters_are_exact(self):
+        # Reconciled in batches, more than one here
+        self.assertGreater(ExamAttempt.objects.filter(is_passed=True).count(), 500)
+        self.assertEqual(ExamAttempt.objects.reconcile_counters(), 0)
+
+    def test_hot_queries_use_indexes(self):
+        for name, queryset, index_walk in self.hot_queries():
+            with self.subTest(name):
+                problems, plan = plan_regressions(queryset, index_walk)
+                self.assertFalse(problems, f'{name} plan regressed ({", ".join(problems)}):\n{plan}')
+
+    def test_regressions_are_detected(self):
+        problems, _ = plan_regressions(ExamAttempt.objects.filter(time_taken=60).order_by('time_taken', 'id'))
+        self.assertTrue(problems)
@@ -2,6 +2,9 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from core.images import serve_variant
+from core.metrics import MetricsView
+from results.views import serve_certificate
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -9,6 +12,10 @@ urlpatterns = [
     path('api/courses/', include('courses.urls')),
     path('api/exams/', include('exams.urls')),
     path('api/results/', include('results.urls')),
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
+    # Served in production too, ahead of the DEBUG-only media route below
+    path(f"{settings.MEDIA_URL.strip('/')}/variants/<path:path>", serve_variant, name='image-variant'),
+    path(f"{settings.MEDIA_URL.strip('/')}/certificates/<str:name>", serve_certificate, name='certificate-file'),
 ]
 
 if settings.DEBUG:
@@ -1,19 +1,39 @@
 from django.contrib import admin
-from .models import Course, Lesson
+from . import search
+from .models import CatalogVersion, Course, Lesson
+
+class CatalogVersionAdminMixin:
+    """Invalidate the cached course catalog on every admin write."""
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        CatalogVersion.bump()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        CatalogVersion.bump()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        CatalogVersion.bump()
 
 class LessonInline(admin.TabularInline):
     model = Lesson
     extra = 1
 
 @admin.register(Course)
-class CourseAdmin(admin.ModelAdmin):
+class CourseAdmin(CatalogVersionAdminMixin, admin.ModelAdmin):
     list_display = ('title', 'slug', 'created_at')
     search_fields = ('title',)
     prepopulated_fields = {'slug': ('title',)}
     inlines = [LessonInline]
 
 @admin.register(Lesson)
-class LessonAdmin(admin.ModelAdmin):
+class LessonAdmin(CatalogVersionAdminMixin, admin.ModelAdmin):
     list_display = ('title', 'course', 'order')
     list_filter = ('course',)
     search_fields = ('title', 'content')
+
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of icontains scans over every lesson body
+        return search.filter_lessons(queryset, search_term), False
@@ -1,5 +1,15 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate
+
+
+def ensure_search_index(sender, using, **kwargs):
+    from . import search
+    search.ensure_installed(connections[using])
 
 
 class CoursesConfig(AppConfig):
     name = 'courses'
+
+    def ready(self):
+        post_migrate.connect(ensure_search_index, sender=self)
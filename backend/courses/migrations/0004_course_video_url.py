@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_course_estimated_duration_course_instructor_bio_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='video_url',
+            field=models.URLField(blank=True, help_text='Demo video URL for the course (e.g., YouTube)', null=True),
+        ),
+    ]
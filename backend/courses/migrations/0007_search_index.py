@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def install(apps, schema_editor):
+    from courses import search
+    search.install(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    from courses import search
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_catalogversion_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -1,5 +1,31 @@
 from django.db import models
+from django.db.models import F
+from django.utils import timezone
 from django.utils.text import slugify
+from core import images
+
+class CatalogVersion(models.Model):
+    """Single-row counter bumped on every course/lesson write.
+
+    Cached catalog payloads are keyed by it, so a bump invalidates them in
+    every worker at once.
+    """
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    @classmethod
+    def current(cls):
+        """Return (version, updated_at) in one query."""
+        return cls.objects.filter(pk=1).values_list('version', 'updated_at').first() or (0, None)
+
+    @classmethod
+    async def acurrent(cls):
+        return await cls.objects.filter(pk=1).values_list('version', 'updated_at').afirst() or (0, None)
+
+    @classmethod
+    def bump(cls):
+        if not cls.objects.filter(pk=1).update(version=F('version') + 1, updated_at=timezone.now()):
+            cls.objects.get_or_create(pk=1)
 
 class Course(models.Model):
     DIFFICULTY_CHOICES = (
@@ -11,6 +37,8 @@ class Course(models.Model):
     slug = models.SlugField(unique=True, blank=True)
     description = models.TextField()
     thumbnail = models.ImageField(upload_to='courses/', null=True, blank=True)
+    # Resized copies of thumbnail, see core.images
+    thumbnail_variants = models.JSONField(default=dict, blank=True, editable=False)
     category = models.CharField(max_length=100, default='Technology')
     difficulty = models.CharField(max_length=20, choices=DIFFICULTY_CHOICES, default='beginner')
     instructor_name = models.CharField(max_length=100, default='Expert Instructor')
@@ -23,6 +51,12 @@ class Course(models.Model):
         if not self.slug:
             self.slug = slugify(self.title)
         super().save(*args, **kwargs)
+        images.queue_variants(self, 'thumbnail')
+
+    @classmethod
+    def image_variants_changed(cls, pks):
+        # Cached catalog payloads embed the variant URLs
+        CatalogVersion.bump()
 
     def __str__(self):
         return self.title
@@ -0,0 +1,236 @@
+"""Full-text search over courses and lessons.
+
+PostgreSQL keeps a weighted tsvector in a generated column with a GIN index.
+SQLite keeps FTS5 tables that mirror the course and lesson tables through
+triggers. Either way the index is maintained by the database itself, so it
+stays in sync on save(), bulk_create(), update() and admin edits alike.
+Other databases fall back to icontains filtering.
+"""
+import html
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from .models import Course, Lesson
+
+MAX_TERMS = 8
+SNIPPET_WORDS = 24
+
+# Weights: title over category over body text
+POSTGRES_COLUMNS = {
+    'courses_course': "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+                      "setweight(to_tsvector('simple', coalesce(category, '')), 'B') || "
+                      "setweight(to_tsvector('simple', coalesce(description, '')), 'C')",
+    'courses_lesson': "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+                      "setweight(to_tsvector('simple', coalesce(content, '')), 'C')",
+}
+SQLITE_COLUMNS = {
+    'courses_course': ('title', 'category', 'description'),
+    'courses_lesson': ('title', 'content'),
+}
+SQLITE_WEIGHTS = {
+    'courses_course': '10.0, 4.0, 1.0',
+    'courses_lesson': '10.0, 1.0',
+}
+
+
+def terms(text):
+    return re.findall(r'\w+', text.lower())[:MAX_TERMS]
+
+
+def install(conn=connection):
+    """Create the search index for the tables that exist. Safe to run repeatedly."""
+    with conn.cursor() as cursor:
+        if conn.vendor == 'postgresql':
+            for table, vector in POSTGRES_COLUMNS.items():
+                cursor.execute(
+                    f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector '
+                    f'GENERATED ALWAYS AS ({vector}) STORED'
+                )
+                cursor.execute(f'CREATE INDEX IF NOT EXISTS {table}_search_idx ON {table} USING gin (search_vector)')
+        elif conn.vendor == 'sqlite':
+            for table, columns in SQLITE_COLUMNS.items():
+                fts, names = f'{table}_fts', ', '.join(columns)
+                old_values = ', '.join(f'old.{column}' for column in columns)
+                new_values = ', '.join(f'new.{column}' for column in columns)
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content='{table}', "
+                    f"content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+                )
+                cursor.execute(
+                    f'CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN '
+                    f'INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values}); END'
+                )
+                cursor.execute(
+                    f'CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN '
+                    f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values}); END"
+                )
+                cursor.execute(
+                    f'CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE ON {table} BEGIN '
+                    f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values}); "
+                    f'INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values}); END'
+                )
+                cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def uninstall(conn=connection):
+    with conn.cursor() as cursor:
+        if conn.vendor == 'postgresql':
+            for table in POSTGRES_COLUMNS:
+                cursor.execute(f'ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector')
+        elif conn.vendor == 'sqlite':
+            for table in SQLITE_COLUMNS:
+                for trigger in ('insert', 'delete', 'update'):
+                    cursor.execute(f'DROP TRIGGER IF EXISTS {table}_fts_{trigger}')
+                cursor.execute(f'DROP TABLE IF EXISTS {table}_fts')
+
+
+def ensure_installed(conn=connection):
+    """Reinstall the SQLite triggers if a migration rebuilt a table and dropped them."""
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'courses\\_%\\_fts\\_%' ESCAPE '\\'"
+        )
+        if cursor.fetchone()[0] < 3 * len(SQLITE_COLUMNS):
+            install(conn)
+
+
+def make_snippet(text, words, size=SNIPPET_WORDS):
+    """Return an HTML-escaped window of text around the first match, matches wrapped in <mark>.
+
+    Built here rather than with snippet()/ts_headline(), which re-read the
+    index or re-parse the document for every row and cost more than the search.
+    """
+    tokens = list(re.finditer(r'\w+', text))
+    if not tokens:
+        return ''
+
+    def matches(token):
+        return token.group().lower().startswith(tuple(words))
+
+    first = next((i for i, token in enumerate(tokens) if matches(token)), 0)
+    start = max(0, min(first - size // 3, len(tokens) - size))
+    window = tokens[start:start + size]
+    parts = ['…' if start else '']
+    position = window[0].start() if start else 0
+    for token in window:
+        parts.append(html.escape(text[position:token.start()]))
+        word = html.escape(token.group())
+        parts.append(f'<mark>{word}</mark>' if matches(token) else word)
+        position = token.end()
+    parts.append('…' if start + size < len(tokens) else html.escape(text[position:]))
+    return ''.join(parts)
+
+
+def _postgres(words, limit):
+    query = ' & '.join(f'{word}:*' for word in words)
+    courses = '''
+        WITH q AS (SELECT to_tsquery('simple', %s) AS query)
+        SELECT c.id, c.slug, c.title, c.category, c.description, ts_rank_cd(c.search_vector, q.query) AS rank
+        FROM courses_course c, q WHERE c.search_vector @@ q.query ORDER BY rank DESC, c.id LIMIT %s
+    '''
+    # Rank first, then join only the top rows
+    lessons = '''
+        WITH q AS (SELECT to_tsquery('simple', %s) AS query),
+        top AS (
+            SELECT l.id, ts_rank_cd(l.search_vector, q.query) AS rank FROM courses_lesson l, q
+            WHERE l.search_vector @@ q.query ORDER BY rank DESC, l.id LIMIT %s
+        )
+        SELECT l.id, l.title, c.slug, c.title, l.content, top.rank
+        FROM top JOIN courses_lesson l ON l.id = top.id JOIN courses_course c ON c.id = l.course_id
+        ORDER BY top.rank DESC, l.id
+    '''
+    return (courses, [query, limit]), (lessons, [query, limit])
+
+
+def _sqlite(words, limit):
+    query = ' '.join(f'"{word}"*' for word in words)
+    # Rank on the FTS table alone, then join only the top rows. bm25() is lower for
+    # better matches; it is negated so a higher rank is better on every backend
+    # ("rank" itself is a hidden FTS5 column, hence the score alias).
+    courses = f'''
+        SELECT c.id, c.slug, c.title, c.category, c.description, top.score FROM (
+            SELECT rowid AS id, -bm25(courses_course_fts, {SQLITE_WEIGHTS['courses_course']}) AS score
+            FROM courses_course_fts WHERE courses_course_fts MATCH %s ORDER BY score DESC, rowid LIMIT %s
+        ) top JOIN courses_course c ON c.id = top.id ORDER BY top.score DESC, c.id
+    '''
+    lessons = f'''
+        SELECT l.id, l.title, c.slug, c.title, l.content, top.score FROM (
+            SELECT rowid AS id, -bm25(courses_lesson_fts, {SQLITE_WEIGHTS['courses_lesson']}) AS score
+            FROM courses_lesson_fts WHERE courses_lesson_fts MATCH %s ORDER BY score DESC, rowid LIMIT %s
+        ) top JOIN courses_lesson l ON l.id = top.id JOIN courses_course c ON c.id = l.course_id
+        ORDER BY top.score DESC, l.id
+    '''
+    return (courses, [query, limit]), (lessons, [query, limit])
+
+
+def _fallback(words, limit):
+    course_filter, lesson_filter = Q(), Q()
+    for word in words:
+        course_filter &= Q(title__icontains=word) | Q(category__icontains=word) | Q(description__icontains=word)
+        lesson_filter &= Q(title__icontains=word) | Q(content__icontains=word)
+    courses = [
+        (course.id, course.slug, course.title, course.category, course.description, 0)
+        for course in Course.objects.filter(course_filter).order_by('title')[:limit]
+    ]
+    lessons = [
+        (lesson.id, lesson.title, lesson.course.slug, lesson.course.title, lesson.content, 0)
+        for lesson in Lesson.objects.filter(lesson_filter).select_related('course').order_by('title')[:limit]
+    ]
+    return courses, lessons
+
+
+def search(text, limit=10):
+    """Return ranked {'courses': [...], 'lessons': [...]} matching every word of text as a prefix."""
+    words = terms(text)
+    if not words:
+        return {'courses': [], 'lessons': []}
+
+    if connection.vendor in ('postgresql', 'sqlite'):
+        statements = _postgres(words, limit) if connection.vendor == 'postgresql' else _sqlite(words, limit)
+        rows = []
+        with connection.cursor() as cursor:
+            for sql, params in statements:
+                cursor.execute(sql, params)
+                rows.append(cursor.fetchall())
+        courses, lessons = rows
+    else:
+        courses, lessons = _fallback(words, limit)
+
+    return {
+        'courses': [
+            {'id': id, 'slug': slug, 'title': title, 'category': category,
+             'snippet': make_snippet(description, words), 'rank': rank}
+            for id, slug, title, category, description, rank in courses
+        ],
+        'lessons': [
+            {'id': id, 'title': title, 'course_slug': course_slug, 'course_title': course_title,
+             'snippet': make_snippet(content, words), 'rank': rank}
+            for id, title, course_slug, course_title, content, rank in lessons
+        ],
+    }
+
+
+def filter_lessons(queryset, text):
+    """Narrow a Lesson queryset to the lessons matching text, using the index where there is one."""
+    words = terms(text)
+    if not words:
+        return queryset
+    if connection.vendor == 'postgresql':
+        ids = RawSQL(
+            "SELECT id FROM courses_lesson WHERE search_vector @@ to_tsquery('simple', %s)",
+            [' & '.join(f'{word}:*' for word in words)],
+        )
+    elif connection.vendor == 'sqlite':
+        ids = RawSQL(
+            'SELECT rowid FROM courses_lesson_fts WHERE courses_lesson_fts MATCH %s',
+            [' '.join(f'"{word}"*' for word in words)],
+        )
+    else:
+        for word in words:
+            queryset = queryset.filter(Q(title__icontains=word) | Q(content__icontains=word))
+        return queryset
+    return queryset.filter(pk__in=ids)
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from core.images import ImageVariantsField
 from .models import Course, Lesson
 
 class LessonSerializer(serializers.ModelSerializer):
@@ -9,36 +10,75 @@ class LessonSerializer(serializers.ModelSerializer):
         model = Lesson
         fields = '__all__'
 
+    def get_course_lesson_ids(self, obj):
+        # CourseDetailSerializer passes the already ordered ids of the course's
+        # lessons; a standalone lesson fetches them once for both neighbours.
+        lesson_ids = self.context.get('course_lesson_ids')
+        if lesson_ids is None:
+            if getattr(self, '_lesson_ids_course', None) != obj.course_id:
+                self._lesson_ids = list(Lesson.objects.filter(course_id=obj.course_id).values_list('id', flat=True))
+                self._lesson_ids_course = obj.course_id
+            lesson_ids = self._lesson_ids
+        return lesson_ids
+
     def get_next_lesson_id(self, obj):
-        next_lesson = Lesson.objects.filter(course=obj.course, order__gt=obj.order).order_by('order').first()
-        return next_lesson.id if next_lesson else None
+        lesson_ids = self.get_course_lesson_ids(obj)
+        position = lesson_ids.index(obj.id)
+        return lesson_ids[position + 1] if position + 1 < len(lesson_ids) else None
 
     def get_previous_lesson_id(self, obj):
-        prev_lesson = Lesson.objects.filter(course=obj.course, order__lt=obj.order).order_by('-order').first()
-        return prev_lesson.id if prev_lesson else None
+        lesson_ids = self.get_course_lesson_ids(obj)
+        position = lesson_ids.index(obj.id)
+        return lesson_ids[position - 1] if position > 0 else None
+
+class LessonOutlineSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Lesson
+        fields = ('id', 'title', 'order')
 
 class CourseSerializer(serializers.ModelSerializer):
-    lessons_count = serializers.IntegerField(source='lessons.count', read_only=True)
+    thumbnail_variants = ImageVariantsField('thumbnail')
+    lessons_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Course
-        fields = ('id', 'title', 'slug', 'description', 'thumbnail', 'created_at', 'lessons_count', 'category', 'difficulty', 'estimated_duration', 'video_url')
+        fields = ('id', 'title', 'slug', 'description', 'thumbnail', 'thumbnail_variants', 'created_at', 'lessons_count', 'category', 'difficulty', 'estimated_duration', 'video_url')
+
+    def get_lessons_count(self, obj):
+        # Annotated as lessons_total by the list views; single objects fall back to a COUNT
+        if hasattr(obj, 'lessons_total'):
+            return obj.lessons_total
+        return obj.lessons.count()
 
 class CourseDetailSerializer(serializers.ModelSerializer):
-    lessons = LessonSerializer(many=True, read_only=True)
+    thumbnail_variants = ImageVariantsField('thumbnail')
+    lessons = serializers.SerializerMethodField()
     exam_id = serializers.SerializerMethodField()
     total_xp = serializers.SerializerMethodField()
     user_status = serializers.SerializerMethodField()
 
     class Meta:
         model = Course
-        fields = ('id', 'title', 'slug', 'description', 'thumbnail', 'created_at', 'lessons', 'exam_id', 'category', 'difficulty', 'instructor_name', 'instructor_bio', 'estimated_duration', 'total_xp', 'user_status', 'video_url')
+        fields = ('id', 'title', 'slug', 'description', 'thumbnail', 'thumbnail_variants', 'created_at', 'lessons', 'exam_id', 'category', 'difficulty', 'instructor_name', 'instructor_bio', 'estimated_duration', 'total_xp', 'user_status', 'video_url')
+
+    def get_lessons(self, obj):
+        lessons = list(obj.lessons.all())
+        if self.context.get('outline'):
+            # Lesson bodies are loaded lazily through LessonDetailView
+            return LessonOutlineSerializer(lessons, many=True).data
+        context = {**self.context, 'course_lesson_ids': [lesson.id for lesson in lessons]}
+        return LessonSerializer(lessons, many=True, context=context).data
 
     def get_exam_id(self, obj):
         return obj.exam.id if hasattr(obj, 'exam') else None
 
+    # total_points and passed_attempt are loaded by CourseDetailView; fall
+    # back to a query for courses loaded without them.
+
     def get_total_xp(self, obj):
         if hasattr(obj, 'exam'):
+            if hasattr(obj.exam, 'total_points'):
+                return obj.exam.total_points
             from django.db.models import Sum
             return obj.exam.questions.aggregate(total=Sum('points'))['total'] or 0
         return 0
@@ -46,8 +86,11 @@ class CourseDetailSerializer(serializers.ModelSerializer):
     def get_user_status(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated and hasattr(obj, 'exam'):
-            from results.models import ExamAttempt
-            attempt = ExamAttempt.objects.filter(user=request.user, exam=obj.exam, is_passed=True).first()
+            if hasattr(obj, 'passed_attempt'):
+                attempt = obj.passed_attempt
+            else:
+                from results.models import ExamAttempt
+                attempt = ExamAttempt.objects.filter(user=request.user, exam=obj.exam, is_passed=True).first()
             if attempt:
                 return {'is_passed': True, 'attempt_id': attempt.id, 'score': attempt.score}
         return {'is_passed': False}
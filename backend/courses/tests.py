@@ -1,3 +1,139 @@
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
+from users.models import User
+from .models import CatalogVersion, Course, Lesson
+from . import search
 
-# Create your tests here.
+
+class CourseSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.course = Course.objects.create(
+            title='Database Internals', description='How indexes and query planners work.', category='Databases'
+        )
+        self.lesson = Lesson.objects.create(
+            course=self.course, title='B-trees', content='Every <b>index</b> page holds sorted keys.', order=1
+        )
+
+    def lesson_ids(self, query):
+        response = self.client.get('/api/courses/search/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [lesson['id'] for lesson in response.data['lessons']]
+
+    def test_prefix_match_and_snippet(self):
+        data = self.client.get('/api/courses/search/', {'q': 'plann data'}).data
+        self.assertEqual([course['slug'] for course in data['courses']], [self.course.slug])
+        self.assertIn('<mark>planners</mark>', data['courses'][0]['snippet'])
+
+        lesson = self.client.get('/api/courses/search/', {'q': 'ind'}).data['lessons'][0]
+        # Lesson text is escaped, only the highlight is markup
+        self.assertEqual(lesson['snippet'], 'Every &lt;b&gt;<mark>index</mark>&lt;/b&gt; page holds sorted keys.')
+        self.assertEqual(lesson['course_slug'], self.course.slug)
+
+    def test_index_follows_writes(self):
+        self.assertEqual(self.lesson_ids('sorted'), [self.lesson.pk])
+        Lesson.objects.filter(pk=self.lesson.pk).update(content='Hash buckets instead.')
+        self.assertEqual(self.lesson_ids('sorted'), [])
+        self.assertEqual(self.lesson_ids('bucket'), [self.lesson.pk])
+        self.lesson.delete()
+        self.assertEqual(self.lesson_ids('bucket'), [])
+
+    def test_filter_lessons(self):
+        other = Lesson.objects.create(course=self.course, title='Hashing', content='Buckets.', order=2)
+        self.assertEqual(list(search.filter_lessons(Lesson.objects.all(), 'bucket')), [other])
+
+    def test_blank_query(self):
+        data = self.client.get('/api/courses/search/', {'q': '  '}).data
+        self.assertEqual((data['courses'], data['lessons']), ([], []))
+
+
+class CourseDetailTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.course = Course.objects.create(title='Algebra', slug='algebra', description='-')
+        # Created out of order: neighbours follow Lesson.order, not ids
+        self.lessons = {
+            order: Lesson.objects.create(course=self.course, title=f'Lesson {order}', content=f'Body {order}', order=order)
+            for order in (2, 1, 3)
+        }
+        Lesson.objects.create(course=Course.objects.create(title='Other', slug='other', description='-'),
+                              title='Elsewhere', content='-', order=1)
+        self.first, self.middle, self.last = (self.lessons[order].pk for order in (1, 2, 3))
+
+    def test_outline(self):
+        response = self.client.get('/api/courses/algebra/', {'outline': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['lessons'], [
+            {'id': self.lessons[order].pk, 'title': f'Lesson {order}', 'order': order} for order in (1, 2, 3)
+        ])
+        # Outline and full payloads are cached apart
+        self.assertNotEqual(response['ETag'], self.client.get('/api/courses/algebra/')['ETag'])
+
+    def test_neighbours_in_the_full_payload(self):
+        # Catalog version and exam for the ETag, then the course and its lessons: no query per lesson
+        with self.assertNumQueries(4):
+            lessons = self.client.get('/api/courses/algebra/').data['lessons']
+        self.assertEqual([lesson['content'] for lesson in lessons], ['Body 1', 'Body 2', 'Body 3'])
+        self.assertEqual([(lesson['previous_lesson_id'], lesson['next_lesson_id']) for lesson in lessons], [
+            (None, self.middle), (self.first, self.last), (self.middle, None),
+        ])
+
+    def test_neighbours_of_a_single_lesson(self):
+        self.client.force_authenticate(User.objects.create_user('student'))
+        for pk, previous, following in ((self.first, None, self.middle), (self.last, self.middle, None)):
+            data = self.client.get(f'/api/courses/lessons/{pk}/').data
+            self.assertEqual((data['previous_lesson_id'], data['next_lesson_id']), (previous, following))
+        lone = Lesson.objects.get(title='Elsewhere')
+        data = self.client.get(f'/api/courses/lessons/{lone.pk}/').data
+        self.assertEqual((data['previous_lesson_id'], data['next_lesson_id']), (None, None))
+
+
+class CourseCatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+        self.admin = APIClient()
+        self.admin.force_authenticate(User.objects.create_superuser('root', 'root@example.com', 'secret'))
+        self.course = Course.objects.create(title='Algebra', slug='algebra', description='-', category='Math')
+        Course.objects.create(title='Poetry', slug='poetry', description='-', category='Arts')
+        for order in range(1, 4):
+            Lesson.objects.create(course=self.course, title=f'Lesson {order}', content='-', order=order)
+
+    def catalog(self, **params):
+        return {course['slug']: course['lessons_count'] for course in self.client.get('/api/courses/', params).data}
+
+    def test_lessons_total(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self.catalog(), {'algebra': 3, 'poetry': 0})
+        self.assertEqual(self.catalog(category='Math'), {'algebra': 3})
+
+    def test_admin_writes_invalidate_the_cached_list(self):
+        self.catalog()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.catalog(), {'algebra': 3, 'poetry': 0})
+        version = CatalogVersion.current()[0]
+
+        response = self.admin.post(f'/api/courses/admin/manage/{self.course.pk}/lessons/',
+                                   {'course': self.course.pk, 'title': 'Lesson 4', 'content': '-', 'order': 4})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.catalog(), {'algebra': 4, 'poetry': 0})
+        self.admin.patch(f'/api/courses/admin/manage/{self.course.pk}/', {'title': 'Linear algebra'})
+        self.assertEqual(self.client.get('/api/courses/').data[0]['title'], 'Linear algebra')
+        self.admin.delete(f"/api/courses/admin/manage/lessons/{response.data['id']}/")
+        self.assertEqual(self.catalog(), {'algebra': 3, 'poetry': 0})
+        self.admin.delete(f'/api/courses/admin/manage/{self.course.pk}/')
+        self.assertEqual(self.catalog(), {'poetry': 0})
+        self.assertEqual(CatalogVersion.current()[0], version + 4)
+
+    def test_missing_version_row(self):
+        CatalogVersion.objects.all().delete()
+        self.assertEqual(CatalogVersion.current(), (0, None))
+        response = self.client.get('/api/courses/')
+        self.assertEqual((response.status_code, len(response.data)), (200, 2))
+        # The first bump creates the row, which changes the version and so the cache key
+        CatalogVersion.bump()
+        self.assertEqual(CatalogVersion.current()[0], 1)
+        Course.objects.filter(slug='poetry').delete()
+        self.assertEqual(self.catalog(), {'algebra': 3})
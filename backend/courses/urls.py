@@ -1,12 +1,14 @@
 from django.urls import path
 from .views import (
     CourseListView, CourseDetailView, LessonDetailView, 
-    CourseCompletersView, AdminCourseListView, AdminCourseDetailView,
+    CourseCompletersView, CourseSearchView, AdminCourseListView, AdminCourseDetailView,
     AdminLessonListView, AdminLessonDetailView
 )
 
 urlpatterns = [
     path('', CourseListView.as_view(), name='course-list'),
+    # Must come before <slug:slug>/, which would match "search" too
+    path('search/', CourseSearchView.as_view(), name='course-search'),
     path('<slug:slug>/', CourseDetailView.as_view(), name='course-detail'),
     path('<slug:slug>/completers/', CourseCompletersView.as_view(), name='course-completers'),
     path('lessons/<int:pk>/', LessonDetailView.as_view(), name='lesson-detail'),
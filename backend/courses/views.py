@@ -1,11 +1,28 @@
-from rest_framework import generics, permissions
-from .models import Course, Lesson
+from django.core.cache import cache
+from django.db.models import Count, Prefetch, Subquery, Sum
+from rest_framework import generics, permissions, views
+from rest_framework.response import Response
+from core.async_views import AsyncListAPIView, AsyncRetrieveAPIView
+from core.conditional import AsyncConditionalGetMixin
+from core.fieldsets import SparseFieldsetMixin
+from . import search
+from .models import CatalogVersion, Course, Lesson
 from .serializers import CourseSerializer, CourseDetailSerializer, LessonSerializer
 
-class CourseListView(generics.ListAPIView):
+class CatalogVersionMixin:
+    async def get_catalog_version(self):
+        if not hasattr(self, '_catalog_version'):
+            self._catalog_version = await CatalogVersion.acurrent()
+        return self._catalog_version
+
+class CourseListView(CatalogVersionMixin, AsyncConditionalGetMixin, AsyncListAPIView):
     serializer_class = CourseSerializer
     permission_classes = (permissions.AllowAny,)
 
+    async def get_validators(self, request):
+        version, updated_at = await self.get_catalog_version()
+        return f'catalog-{version}', updated_at
+
     def get_queryset(self):
         queryset = Course.objects.all()
         category = self.request.query_params.get('category')
@@ -16,20 +33,99 @@ class CourseListView(generics.ListAPIView):
         if difficulty:
             queryset = queryset.filter(difficulty=difficulty)
             
-        return queryset
+        return queryset.annotate(lessons_total=Count('lessons'))
 
-class CourseDetailView(generics.RetrieveAPIView):
-    queryset = Course.objects.all()
+    async def list(self, request, *args, **kwargs):
+        # The catalog only changes through admin writes, which bump CatalogVersion
+        key = 'catalog:{}:{}://{}:{}:{}'.format(
+            (await self.get_catalog_version())[0],
+            request.scheme,
+            request.get_host(),
+            request.query_params.get('category', ''),
+            request.query_params.get('difficulty', ''),
+        )
+        data = await cache.aget(key)
+        if data is None:
+            courses = [course async for course in self.get_queryset()]
+            data = list(self.get_serializer(courses, many=True).data)
+            await cache.aset(key, data, 60 * 60)
+        return Response(data)
+
+class CourseDetailView(CatalogVersionMixin, AsyncConditionalGetMixin, AsyncRetrieveAPIView):
     serializer_class = CourseDetailSerializer
     lookup_field = 'slug'
     permission_classes = (permissions.AllowAny,)
 
+    async def get_validators(self, request):
+        # Course and lessons change with the catalog version, total_xp with the
+        # exam version and user_status with the viewer's passed attempt.
+        from exams.models import Exam
+        from results.models import ExamAttempt
+        slug = self.kwargs['slug']
+        version, updated_at = await self.get_catalog_version()
+        etag = f'course-{slug}-{version}-outline-{self.is_outline()}'
+        timestamps = [updated_at]
+
+        exam = await Exam.objects.filter(course__slug=slug).values_list('id', 'content_version', 'updated_at').afirst()
+        if exam:
+            exam_id, exam_version, exam_updated_at = exam
+            etag += f'-exam-{exam_version}-{exam_updated_at.timestamp()}'
+            timestamps.append(exam_updated_at)
+            if request.user.is_authenticated:
+                attempt = await ExamAttempt.objects.filter(
+                    user=request.user, exam_id=exam_id, is_passed=True
+                ).values_list('id', 'completed_at').afirst()
+                etag += f'-user-{request.user.pk}-{attempt[0] if attempt else 0}'
+                if attempt:
+                    timestamps.append(attempt[1])
+        timestamps = [timestamp for timestamp in timestamps if timestamp]
+        return etag, max(timestamps) if timestamps else None
+
+    def is_outline(self):
+        return self.request.query_params.get('outline') in ('1', 'true')
+
+    def get_queryset(self):
+        lessons = Lesson.objects.all()
+        if self.is_outline():
+            lessons = lessons.only('id', 'title', 'order', 'course_id')
+        return Course.objects.select_related('exam').prefetch_related(Prefetch('lessons', queryset=lessons))
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['outline'] = self.is_outline()
+        return context
+
+    async def aget_object(self):
+        course = await super().aget_object()
+        # Loaded here so CourseDetailSerializer doesn't query from the event loop
+        if hasattr(course, 'exam'):
+            from results.models import ExamAttempt
+            exam = course.exam
+            exam.total_points = (await exam.questions.aaggregate(total=Sum('points')))['total'] or 0
+            if self.request.user.is_authenticated:
+                course.passed_attempt = await ExamAttempt.objects.filter(
+                    user=self.request.user, exam=exam, is_passed=True
+                ).afirst()
+        return course
+
 class LessonDetailView(generics.RetrieveAPIView):
     queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
     permission_classes = (permissions.IsAuthenticated,)
 
-class CourseCompletersView(generics.ListAPIView):
+class CourseSearchView(views.APIView):
+    """Ranked full-text search over courses and lessons; every word matches as a prefix."""
+    permission_classes = (permissions.AllowAny,)
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            limit = 10
+        return Response({'query': query, **search.search(query, limit)})
+
+class CourseCompletersView(SparseFieldsetMixin, generics.ListAPIView):
     # Import locally to avoid circular dependencies if any, though likely fine at top if careful.
     # But usually views don't cause circular imports with serializers unless view imports serializer which imports view's app model...
     permission_classes = (permissions.AllowAny,)
@@ -39,22 +135,42 @@ class CourseCompletersView(generics.ListAPIView):
         return ExamAttemptSerializer
 
     def get_queryset(self):
+        from exams.models import Exam
         from results.models import ExamAttempt
         slug = self.kwargs['slug']
-        return ExamAttempt.objects.filter(exam__course__slug=slug, is_passed=True).order_by('-score', '-completed_at')[:20]
+        # Resolve the exam first so attempts are read in order from attempt_exam_score_idx
+        exam_id = Subquery(Exam.objects.filter(course__slug=slug).values('pk'))
+        return ExamAttempt.objects.filter(exam_id=exam_id, is_passed=True).for_certificates(
+            self.request.user, self.get_fieldset()
+        ).order_by('-score', '-completed_at')[:20]
 # Management Admin Views
-class AdminCourseListView(generics.ListCreateAPIView):
-    queryset = Course.objects.all()
+class CatalogWriteMixin:
+    """Bump CatalogVersion after every write so cached catalogs are rebuilt."""
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        CatalogVersion.bump()
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        CatalogVersion.bump()
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        CatalogVersion.bump()
+
+class AdminCourseListView(CatalogWriteMixin, generics.ListCreateAPIView):
+    queryset = Course.objects.annotate(lessons_total=Count('lessons'))
     serializer_class = CourseSerializer
     permission_classes = (permissions.IsAdminUser,)
 
-class AdminCourseDetailView(generics.RetrieveUpdateDestroyAPIView):
+class AdminCourseDetailView(CatalogWriteMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
     lookup_field = 'pk'
     permission_classes = (permissions.IsAdminUser,)
 
-class AdminLessonListView(generics.ListCreateAPIView):
+class AdminLessonListView(CatalogWriteMixin, generics.ListCreateAPIView):
     serializer_class = LessonSerializer
     permission_classes = (permissions.IsAdminUser,)
 
@@ -63,8 +179,9 @@ class AdminLessonListView(generics.ListCreateAPIView):
 
     def perform_create(self, serializer):
         serializer.save(course_id=self.kwargs['course_pk'])
+        CatalogVersion.bump()
 
-class AdminLessonDetailView(generics.RetrieveUpdateDestroyAPIView):
+class AdminLessonDetailView(CatalogWriteMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
     permission_classes = (permissions.IsAdminUser,)
@@ -11,6 +11,21 @@ python manage.py migrate --noinput
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
-# Start gunicorn
+# Drop metric snapshots left by workers of a previous run
+if [ -n "$METRICS_DIR" ]; then
+    rm -rf "$METRICS_DIR" && mkdir -p "$METRICS_DIR"
+fi
+
+# Submissions only queue their scores, ranks, leaderboards and image variants;
+# a worker applies them. Run one in this container unless jobs run eagerly or
+# RUN_WORKER=False says a separate worker service does (see docker-compose.yml).
+if [ "$JOBS_EAGER" != "True" ] && [ "${RUN_WORKER:-True}" = "True" ]; then
+    echo "Starting job worker..."
+    python manage.py run_worker &
+fi
+
+# Start gunicorn with uvicorn workers: the read endpoints are async views and
+# run on the event loop, sync views run in a thread per request. Set
+# WEB_CONCURRENCY for more worker processes.
 echo "Starting server..."
-exec gunicorn --bind 0.0.0.0:8000 core.wsgi:application
+exec gunicorn --bind 0.0.0.0:8000 --worker-class uvicorn_worker.UvicornWorker core.asgi:application
@@ -1,6 +1,34 @@
 from django.contrib import admin
 from .models import Exam, Question, Choice
 
+class ExamVersionAdminMixin:
+    """Bump the owning exam's content_version whenever questions or choices change in the admin."""
+    # Lookup path from Exam to the administered model, e.g. 'questions__choices'
+    exam_path = None
+
+    def get_exams(self, objects):
+        return list(Exam.objects.filter(**{f'{self.exam_path}__in': [obj.pk for obj in objects]}).distinct())
+
+    def bump_versions(self, objects):
+        for exam in self.get_exams(objects):
+            exam.bump_version()
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        self.bump_versions([form.instance])
+
+    def delete_model(self, request, obj):
+        exams = self.get_exams([obj])
+        super().delete_model(request, obj)
+        for exam in exams:
+            exam.bump_version()
+
+    def delete_queryset(self, request, queryset):
+        exams = self.get_exams(queryset)
+        super().delete_queryset(request, queryset)
+        for exam in exams:
+            exam.bump_version()
+
 class ChoiceInline(admin.TabularInline):
     model = Choice
     extra = 4
@@ -11,13 +39,22 @@ class QuestionInline(admin.TabularInline):
 
 @admin.register(Exam)
 class ExamAdmin(admin.ModelAdmin):
-    list_display = ('title', 'course', 'duration_minutes', 'passing_score', 'is_active')
+    list_display = ('title', 'course', 'duration_minutes', 'passing_score', 'sample_size', 'is_active')
     list_filter = ('is_active', 'course')
     search_fields = ('title',)
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # A new sample size redraws every seed, so attempts started before it must start again
+        if change and 'sample_size' in form.changed_data:
+            obj.bump_version()
+
 @admin.register(Question)
-class QuestionAdmin(admin.ModelAdmin):
+class QuestionAdmin(ExamVersionAdminMixin, admin.ModelAdmin):
     list_display = ('text', 'exam', 'points')
     inlines = [ChoiceInline]
+    exam_path = 'questions'
 
-admin.site.register(Choice)
+@admin.register(Choice)
+class ChoiceAdmin(ExamVersionAdminMixin, admin.ModelAdmin):
+    exam_path = 'questions__choices'
@@ -0,0 +1,62 @@
+import time
+
+from django.db import connection, transaction
+from django.core.management.base import BaseCommand
+from django.test.utils import CaptureQueriesContext
+from courses.models import Course
+from exams.serializers import AdminExamSerializer
+
+
+class Command(BaseCommand):
+    help = 'Measure AdminExamSerializer create/update for large exams. All data is rolled back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=300)
+        parser.add_argument('--choices', type=int, default=4)
+
+    def payload(self, course, questions, choices):
+        return {
+            'course': course.pk,
+            'title': 'Benchmark exam',
+            'description': '',
+            'duration_minutes': 60,
+            'passing_score': 60,
+            'questions': [
+                {
+                    'text': f'Question {i}',
+                    'code': '',
+                    'points': 10,
+                    'choices': [{'text': f'Choice {j}', 'is_correct': j == 0} for j in range(choices)],
+                }
+                for i in range(questions)
+            ],
+        }
+
+    def run(self, label, instance, data):
+        serializer = AdminExamSerializer(instance, data=data)
+        serializer.is_valid(raise_exception=True)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            exam = serializer.save()
+            elapsed = (time.perf_counter() - started) * 1000
+        self.stdout.write(f'{label:<28} {elapsed:>10.1f} ms {len(queries):>8} queries')
+        return exam
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            course = Course.objects.create(title='Benchmark course', slug='benchmark-course-exam-save', description='-')
+            exam = self.run('create', None, self.payload(course, options['questions'], options['choices']))
+
+            unchanged = AdminExamSerializer(exam).data
+            unchanged['course'] = course.pk
+            self.run('update (unchanged)', exam, unchanged)
+
+            edited = AdminExamSerializer(exam).data
+            edited['course'] = course.pk
+            for question in edited['questions'][::10]:
+                question['text'] += ' (edited)'
+                question['choices'][-1]['text'] += ' (edited)'
+            edited['questions'] = edited['questions'][:-10] + self.payload(course, 10, options['choices'])['questions']
+            self.run('update (10% edited, churn)', exam, edited)
+
+            transaction.set_rollback(True)
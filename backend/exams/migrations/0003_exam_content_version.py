@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0002_question_code'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='content_version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0003_exam_content_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
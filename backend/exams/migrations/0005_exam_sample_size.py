@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 15:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0004_exam_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='sample_size',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,6 +1,17 @@
+import random
+import secrets
+
+from django.conf import settings
 from django.db import models
+from django.db.models import F
+from django.utils import timezone
 from courses.models import Course
 
+# exam id -> (content_version, answer key); see Exam.answer_key
+_answer_keys = {}
+# exam id -> (content_version, sorted question ids); see Exam.question_bank
+_question_banks = {}
+
 class Exam(models.Model):
     course = models.OneToOneField(Course, on_delete=models.CASCADE, related_name='exam')
     title = models.CharField(max_length=200)
@@ -8,10 +19,111 @@ class Exam(models.Model):
     duration_minutes = models.IntegerField(default=30)
     passing_score = models.IntegerField(default=60)
     is_active = models.BooleanField(default=True)
+    # Questions drawn from the bank for each attempt; empty to ask all of them, in order
+    sample_size = models.PositiveIntegerField(null=True, blank=True)
+    # Bumped whenever questions or choices change so cached data can be dropped
+    content_version = models.PositiveIntegerField(default=1, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
 
+    def bump_version(self):
+        Exam.objects.filter(pk=self.pk).update(content_version=F('content_version') + 1, updated_at=timezone.now())
+        self.refresh_from_db(fields=['content_version', 'updated_at'])
+
+    def answer_key(self):
+        """Return {question_id: (points, correct choice ids)} for this exam.
+
+        The key is compiled once per content_version and kept in process, so
+        grading a submission needs no queries beyond loading the exam itself.
+        """
+        cached = _answer_keys.get(self.pk)
+        if cached and cached[0] == self.content_version:
+            return cached[1]
+
+        correct = {}
+        for question_id, choice_id in Choice.objects.filter(
+            question__exam=self, is_correct=True
+        ).values_list('question_id', 'id'):
+            correct.setdefault(question_id, set()).add(choice_id)
+        key = {
+            question_id: (points, frozenset(correct.get(question_id, ())))
+            for question_id, points in self.questions.values_list('id', 'points')
+        }
+        _answer_keys[self.pk] = (self.content_version, key)
+        return key
+
+    def question_bank(self):
+        """Return the ids of this exam's questions, sorted; kept in process like answer_key."""
+        cached = _question_banks.get(self.pk)
+        if cached and cached[0] == self.content_version:
+            return cached[1]
+
+        bank = tuple(sorted(self.answer_key()))
+        _question_banks[self.pk] = (self.content_version, bank)
+        return bank
+
+    def draw(self, seed):
+        """Return the ids of the questions an attempt seeded with seed asks, in order.
+
+        The same seed and content_version always draw the same questions, so an
+        attempt only has to store its seed. random.sample picks them from the
+        cached bank in time proportional to sample_size, not to the bank.
+        """
+        bank = self.question_bank()
+        return random.Random(seed).sample(bank, min(self.sample_size or len(bank), len(bank)))
+
+    def grade(self, answers, seed=None):
+        """Grade {question_id: choice_id} answers, returning (earned_points, total_points).
+
+        For sampled exams seed is the attempt's seed, and only the questions it
+        drew count.
+        """
+        key = self.answer_key()
+        earned_points = 0
+        total_points = 0
+        for question_id in key if seed is None else self.draw(seed):
+            points, correct_ids = key[question_id]
+            total_points += points
+            try:
+                selected_choice_id = int(answers.get(str(question_id)))
+            except (TypeError, ValueError):
+                continue
+            if selected_choice_id in correct_ids:
+                earned_points += points
+        return earned_points, total_points
+
+class ExamDraw(models.Model):
+    """The questions a user is answering in a sampled exam, from starting it until submitting it.
+
+    Starting the exam again returns the same draw instead of a new one, and the
+    submission is graded against this row, so a student can't keep drawing
+    until an easy set comes up.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='exam_draws')
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='draws')
+    seed = models.BigIntegerField()
+    # The seed only reproduces the draw for the content_version it was made from
+    content_version = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'exam'], name='unique_open_draw'),
+        ]
+
+    @classmethod
+    def start(cls, user, exam):
+        """Return the user's open draw of exam, drawing a new one if there is none or the exam changed."""
+        draw, created = cls.objects.get_or_create(
+            user=user, exam=exam, defaults={'seed': secrets.randbits(63), 'content_version': exam.content_version}
+        )
+        if draw.content_version != exam.content_version:
+            draw.seed, draw.content_version = secrets.randbits(63), exam.content_version
+            draw.save(update_fields=['seed', 'content_version'])
+        return draw
+
 class Question(models.Model):
     exam = models.ForeignKey(Exam, related_name='questions', on_delete=models.CASCADE)
     text = models.TextField()
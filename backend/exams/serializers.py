@@ -1,3 +1,4 @@
+from django.db import transaction
 from rest_framework import serializers
 from .models import Exam, Question, Choice
 
@@ -7,6 +8,9 @@ class ChoiceSerializer(serializers.ModelSerializer):
         fields = ('id', 'text')
 
 class AdminChoiceSerializer(serializers.ModelSerializer):
+    # Writable so the exam builder can send existing rows back unchanged
+    id = serializers.IntegerField(required=False)
+
     class Meta:
         model = Choice
         fields = ('id', 'text', 'is_correct')
@@ -19,6 +23,7 @@ class QuestionSerializer(serializers.ModelSerializer):
         fields = ('id', 'text', 'code', 'points', 'choices')
 
 class AdminQuestionSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)
     choices = AdminChoiceSerializer(many=True)
 
     class Meta:
@@ -26,29 +31,37 @@ class AdminQuestionSerializer(serializers.ModelSerializer):
         fields = ('id', 'text', 'code', 'points', 'choices')
 
 class ExamSerializer(serializers.ModelSerializer):
-    questions = QuestionSerializer(many=True, read_only=True)
+    questions = serializers.SerializerMethodField()
 
     class Meta:
         model = Exam
-        fields = ('id', 'title', 'description', 'duration_minutes', 'passing_score', 'questions')
+        fields = ('id', 'title', 'description', 'duration_minutes', 'passing_score', 'sample_size', 'questions')
+
+    def get_questions(self, exam):
+        if exam.sample_size:
+            # The bank can hold thousands of questions; each attempt fetches its own draw instead
+            return None
+        return QuestionSerializer(exam.questions.all(), many=True).data
 
 class AdminExamSerializer(serializers.ModelSerializer):
     questions = AdminQuestionSerializer(many=True)
 
     class Meta:
         model = Exam
-        fields = ('id', 'course', 'title', 'description', 'duration_minutes', 'passing_score', 'questions')
+        fields = ('id', 'course', 'title', 'description', 'duration_minutes', 'passing_score', 'sample_size', 'questions')
 
+    QUESTION_FIELDS = ('text', 'code', 'points')
+    CHOICE_FIELDS = ('text', 'is_correct')
+    BATCH_SIZE = 500
+
+    @transaction.atomic
     def create(self, validated_data):
         questions_data = validated_data.pop('questions')
         exam = Exam.objects.create(**validated_data)
-        for question_data in questions_data:
-            choices_data = question_data.pop('choices')
-            question = Question.objects.create(exam=exam, **question_data)
-            for choice_data in choices_data:
-                Choice.objects.create(question=question, **choice_data)
+        self.sync_questions(exam, questions_data)
         return exam
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         questions_data = validated_data.pop('questions', None)
         instance.title = validated_data.get('title', instance.title)
@@ -56,15 +69,78 @@ class AdminExamSerializer(serializers.ModelSerializer):
         instance.duration_minutes = validated_data.get('duration_minutes', instance.duration_minutes)
         instance.passing_score = validated_data.get('passing_score', instance.passing_score)
         instance.course = validated_data.get('course', instance.course)
+        # Changing it redraws every seed, so it changes the content like a question edit does
+        resampled = instance.sample_size != validated_data.get('sample_size', instance.sample_size)
+        instance.sample_size = validated_data.get('sample_size', instance.sample_size)
         instance.save()
 
-        if questions_data is not None:
-            # Simple approach: clear and recreate for "convenient" builder
-            instance.questions.all().delete()
-            for question_data in questions_data:
-                choices_data = question_data.pop('choices')
-                question = Question.objects.create(exam=instance, **question_data)
-                for choice_data in choices_data:
-                    Choice.objects.create(question=question, **choice_data)
+        if (questions_data is not None and self.sync_questions(instance, questions_data)) or resampled:
+            instance.bump_version()
         
         return instance
+
+    @staticmethod
+    def assign(obj, data, fields):
+        changed = False
+        for field in fields:
+            if field in data and getattr(obj, field) != data[field]:
+                setattr(obj, field, data[field])
+                changed = True
+        return changed
+
+    def sync_questions(self, exam, questions_data):
+        """Diff questions_data against the exam's rows and apply it with bulk statements.
+
+        Questions and choices sent back with their id keep their primary key
+        and are only written if a field changed; rows missing from the payload
+        are deleted. Returns True if anything was written.
+        """
+        existing_questions = {question.id: question for question in exam.questions.all()}
+        existing_choices = {choice.id: choice for choice in Choice.objects.filter(question__exam=exam)}
+
+        new_questions, changed_questions, kept_question_ids = [], [], set()
+        planned_choices = []
+        for question_data in questions_data:
+            question_data = dict(question_data)
+            choices_data = question_data.pop('choices', [])
+            question = existing_questions.get(question_data.pop('id', None))
+            if question is None or question.id in kept_question_ids:
+                question = Question(exam=exam, **question_data)
+                new_questions.append(question)
+            else:
+                kept_question_ids.add(question.id)
+                if self.assign(question, question_data, self.QUESTION_FIELDS):
+                    changed_questions.append(question)
+            planned_choices.append((question, choices_data))
+
+        stale_question_ids = existing_questions.keys() - kept_question_ids
+        if stale_question_ids:
+            Question.objects.filter(id__in=stale_question_ids).delete()
+        Question.objects.bulk_create(new_questions, batch_size=self.BATCH_SIZE)
+        Question.objects.bulk_update(changed_questions, self.QUESTION_FIELDS, batch_size=self.BATCH_SIZE)
+
+        new_choices, changed_choices, kept_choice_ids = [], [], set()
+        for question, choices_data in planned_choices:
+            for choice_data in choices_data:
+                choice_data = dict(choice_data)
+                choice = existing_choices.get(choice_data.pop('id', None))
+                if choice is None or choice.question_id != question.id or choice.id in kept_choice_ids:
+                    new_choices.append(Choice(question=question, **choice_data))
+                else:
+                    kept_choice_ids.add(choice.id)
+                    if self.assign(choice, choice_data, self.CHOICE_FIELDS):
+                        changed_choices.append(choice)
+
+        # Choices of deleted questions are already gone through the cascade
+        stale_choice_ids = {
+            choice.id for choice in existing_choices.values() if choice.question_id in kept_question_ids
+        } - kept_choice_ids
+        if stale_choice_ids:
+            Choice.objects.filter(id__in=stale_choice_ids).delete()
+        Choice.objects.bulk_create(new_choices, batch_size=self.BATCH_SIZE)
+        Choice.objects.bulk_update(changed_choices, self.CHOICE_FIELDS, batch_size=self.BATCH_SIZE)
+
+        return any((
+            stale_question_ids, new_questions, changed_questions,
+            stale_choice_ids, new_choices, changed_choices,
+        ))
@@ -1,3 +1,268 @@
-from django.test import TestCase
+import json
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from courses.models import Course
+from results.models import ExamAttempt
+from users.models import User
+from . import models
+from .models import Choice, Exam, ExamDraw, Question
+
+
+class ExamPayloadCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        course = Course.objects.create(title='Algebra', description='-')
+        self.exam = Exam.objects.create(course=course, title='Final')
+        for i in range(30):
+            question = Question.objects.create(exam=self.exam, text=f'Question {i}')
+            Choice.objects.bulk_create(Choice(question=question, text=f'Choice {j}', is_correct=j == 0) for j in range(4))
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('student', password='pass'))
+        self.url = f'/api/exams/{self.exam.pk}/'
+
+    def test_built_once_per_version(self):
+        # Version lookup, then exam, questions and choices for the one build
+        with self.assertNumQueries(4):
+            first = self.client.get(self.url)
+        with self.assertNumQueries(1):
+            second = self.client.get(self.url)
+        self.assertEqual(first.content, second.content)
+        payload = json.loads(second.content)
+        self.assertEqual(len(payload['questions']), 30)
+        self.assertEqual(set(payload['questions'][0]['choices'][0]), {'id', 'text'})
+        self.assertNotIn(b'is_correct', second.content)
+
+        self.exam.questions.first().delete()
+        self.exam.bump_version()
+        self.assertEqual(len(json.loads(self.client.get(self.url).content)['questions']), 29)
+
+        self.exam.title = 'Final exam'
+        self.exam.save()
+        self.assertEqual(json.loads(self.client.get(self.url).content)['title'], 'Final exam')
+
+    def test_conditional_and_missing(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get('/api/exams/0/').status_code, 404)
+        # The browsable API still renders the cached payload
+        self.assertEqual(self.client.get(self.url, HTTP_ACCEPT='text/html').status_code, 200)
+
+
+class QuestionBankTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        # Rolled back exams leave their pks, and version 1, to the next test's
+        models._answer_keys.clear()
+        models._question_banks.clear()
+        self.user = User.objects.create_user('student', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.exam = self.create_exam('Bank', questions=60, sample_size=10)
+
+    def create_exam(self, title, questions, sample_size):
+        exam = Exam.objects.create(course=Course.objects.create(title=title, slug=title.lower(), description='-'),
+                                   title=title, sample_size=sample_size)
+        Question.objects.bulk_create(Question(exam=exam, text=f'Question {i}') for i in range(questions))
+        Choice.objects.bulk_create(
+            Choice(question=question, text=f'Choice {j}', is_correct=j == 0)
+            for question in exam.questions.all() for j in range(4)
+        )
+        return exam
+
+    def draw(self, exam):
+        response = self.client.post(f'/api/exams/{exam.pk}/draw/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def submit(self, exam, answers):
+        return self.client.post(f'/api/exams/{exam.pk}/submit/', {'answers': answers}, format='json')
+
+    def correct_answers(self, questions):
+        correct = dict(Choice.objects.filter(is_correct=True).values_list('question_id', 'id'))
+        return {str(question['id']): correct[question['id']] for question in questions}
+
+    def test_draw(self):
+        payload = json.loads(self.client.get(f'/api/exams/{self.exam.pk}/').content)
+        self.assertEqual((payload['sample_size'], payload['questions']), (10, None))
+
+        first = self.draw(self.exam)
+        ids = [question['id'] for question in first['questions']]
+        self.assertEqual(len(set(ids)), 10)
+        self.assertEqual(set(first['questions'][0]['choices'][0]), {'id', 'text'})
+        # Starting again resumes the stored draw instead of drawing new questions
+        self.assertEqual(self.draw(self.exam), first)
+        # The stored seed alone reproduces the draw
+        self.assertEqual(self.exam.draw(ExamDraw.objects.get(user=self.user, exam=self.exam).seed), ids)
+
+        # Another user gets a draw of their own
+        self.client.force_authenticate(User.objects.create_user('other', password='pass'))
+        self.assertNotEqual([question['id'] for question in self.draw(self.exam)['questions']], ids)
+
+    def test_cost_independent_of_bank_size(self):
+        large = self.create_exam('Large', questions=600, sample_size=10)
+        for exam in (self.exam, large):
+            self.draw(exam)
+            # Exam, the open draw, drawn questions and their choices
+            with self.assertNumQueries(4):
+                self.draw(exam)
+
+    def test_submit_grades_the_stored_draw(self):
+        draw = self.draw(self.exam)
+        # Answers to questions outside the draw don't count
+        answers = self.correct_answers(Question.objects.values('id'))
+        response = self.submit(self.exam, answers)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['score'], 100)
+        attempt = ExamAttempt.objects.get()
+        self.assertEqual(self.exam.draw(attempt.seed), [question['id'] for question in draw['questions']])
+        self.assertEqual(self.exam.grade(answers, attempt.seed), (100, 100))
+        self.assertFalse(ExamDraw.objects.exists())
+
+        # A draw is submitted once, and only by the user it was drawn for
+        self.assertEqual(self.submit(self.exam, answers).status_code, 400)
+        self.client.force_authenticate(User.objects.create_user('other', password='pass'))
+        self.assertEqual(self.submit(self.exam, answers).status_code, 400)
+
+        # Editing the bank invalidates draws in progress; starting again draws from the new version
+        self.draw(self.exam)
+        self.exam.bump_version()
+        self.assertEqual(self.submit(self.exam, answers).status_code, 409)
+        self.draw(self.exam)
+        self.assertEqual(self.submit(self.exam, answers).status_code, 201)
+
+    def test_exam_without_sample_size(self):
+        exam = self.create_exam('Whole', questions=5, sample_size=None)
+        self.assertEqual(self.client.post(f'/api/exams/{exam.pk}/draw/').status_code, 400)
+        questions = json.loads(self.client.get(f'/api/exams/{exam.pk}/').content)['questions']
+        response = self.client.post(f'/api/exams/{exam.pk}/submit/', {'answers': self.correct_answers(questions)}, format='json')
+        self.assertEqual((response.status_code, response.data['score']), (201, 100))
+
+
+class AdminExamSyncTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('root', 'root@example.com', 'secret'))
+        self.course = Course.objects.create(title='Algebra', slug='algebra', description='-')
+        response = self.client.post('/api/exams/admin/', {
+            'course': self.course.pk, 'title': 'Final', 'description': '', 'duration_minutes': 30, 'passing_score': 60,
+            'questions': [
+                {'text': f'Question {i}', 'code': '', 'points': 10,
+                 'choices': [{'text': f'Choice {j}', 'is_correct': j == 0} for j in range(3)]}
+                for i in range(3)
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.exam = Exam.objects.get(pk=response.data['id'])
+        self.url = f'/api/exams/admin/{self.exam.pk}/'
+
+    def rows(self):
+        return (
+            dict(Question.objects.filter(exam=self.exam).values_list('id', 'text')),
+            dict(Choice.objects.filter(question__exam=self.exam).values_list('id', 'text')),
+        )
+
+    def put(self, data):
+        response = self.client.put(self.url, data, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.exam.refresh_from_db()
+
+    def test_unchanged_save_keeps_rows(self):
+        before = self.rows()
+        self.put(self.client.get(self.url).data)
+        self.assertEqual(self.rows(), before)
+        self.assertEqual(self.exam.content_version, 1)
+
+    def test_edits_deletions_and_new_rows_in_one_save(self):
+        questions, choices = self.rows()
+        data = self.client.get(self.url).data
+        first, second, third = data['questions']
+        first['text'] = 'Question 0 (edited)'
+        first['choices'][1]['text'] = 'Choice 1 (edited)'
+        first['choices'].append({'text': 'Choice 3', 'is_correct': False})
+        removed_choice = third['choices'].pop()
+        data['questions'] = [first, third, {'text': 'Question 3', 'code': '', 'points': 5,
+                                           'choices': [{'text': 'Yes', 'is_correct': True}]}]
+        self.put(data)
+
+        new_questions, new_choices = self.rows()
+        self.assertEqual(self.exam.content_version, 2)
+        # Kept rows keep their ids; only the edited ones change
+        self.assertEqual(new_questions[first['id']], 'Question 0 (edited)')
+        self.assertEqual(new_questions[third['id']], questions[third['id']])
+        self.assertNotIn(second['id'], new_questions)
+        self.assertEqual(len(new_questions), 3)
+        self.assertEqual(new_choices[first['choices'][1]['id']], 'Choice 1 (edited)')
+        for choice in third['choices']:
+            self.assertEqual(new_choices[choice['id']], choices[choice['id']])
+        self.assertNotIn(removed_choice['id'], new_choices)
+        self.assertFalse(any(choice['id'] in new_choices for choice in second['choices']))
+        self.assertEqual(set(new_choices.values()) - set(choices.values()), {'Choice 1 (edited)', 'Choice 3', 'Yes'})
+
+
+class AnswerKeyTests(TestCase):
+    def setUp(self):
+        # Rolled back exams leave their pks, and version 1, to the next test's
+        models._answer_keys.clear()
+        self.admin = User.objects.create_superuser('root', 'root@example.com', 'secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        course = Course.objects.create(title='Algebra', slug='algebra', description='-')
+        response = self.client.post('/api/exams/admin/', {
+            'course': course.pk, 'title': 'Final', 'description': '', 'duration_minutes': 30, 'passing_score': 60,
+            'questions': [
+                {'text': f'Question {i}', 'code': '', 'points': 10,
+                 'choices': [{'text': f'Choice {j}', 'is_correct': j == 0} for j in range(3)]}
+                for i in range(2)
+            ],
+        }, format='json')
+        self.exam = Exam.objects.get(pk=response.data['id'])
+        self.student = APIClient()
+        self.student.force_authenticate(User.objects.create_user('student', password='pass'))
+
+    def answers(self, index):
+        """Pick the index-th choice of every question."""
+        return {
+            str(question.pk): sorted(question.choices.values_list('pk', flat=True))[index]
+            for question in self.exam.questions.all()
+        }
+
+    def score(self, answers):
+        response = self.student.post(f'/api/exams/{self.exam.pk}/submit/', {'answers': answers}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['score']
+
+    def test_grading_uses_the_cached_key(self):
+        answers = self.answers(0)
+        self.assertEqual(self.score(answers), 100)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.score(answers), 100)
+        self.assertFalse([query['sql'] for query in queries if 'exams_choice' in query['sql']])
+
+    def test_builder_edit_regrades(self):
+        first, second = self.answers(0), self.answers(1)
+        self.assertEqual(self.score(first), 100)
+        data = self.client.get(f'/api/exams/admin/{self.exam.pk}/').data
+        for question in data['questions']:
+            for index, choice in enumerate(question['choices']):
+                choice['is_correct'] = index == 1
+        self.assertEqual(self.client.put(f'/api/exams/admin/{self.exam.pk}/', data, format='json').status_code, 200)
+        self.assertEqual((self.score(first), self.score(second)), (0, 100))
+
+    def test_django_admin_edit_regrades(self):
+        self.assertEqual(self.score(self.answers(0)), 100)
+        choice = Choice.objects.get(pk=self.answers(1)[str(self.exam.questions.first().pk)])
+        browser = Client()
+        browser.force_login(self.admin)
+        response = browser.post(f'/admin/exams/choice/{choice.pk}/change/', {
+            'question': choice.question_id, 'text': choice.text, 'is_correct': 'on',
+        })
+        self.assertEqual(response.status_code, 302)
+        # Either choice is right for that question now
+        self.assertEqual(self.score(self.answers(1)), 50)
+        self.assertEqual(self.score(self.answers(0)), 100)
@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import ExamDetailView, ExamSubmitView, AdminExamListView, AdminExamDetailView
+from .views import ExamDetailView, ExamDrawView, ExamSubmitView, AdminExamListView, AdminExamDetailView
 
 urlpatterns = [
     path('<int:pk>/', ExamDetailView.as_view(), name='exam-detail'),
+    path('<int:pk>/draw/', ExamDrawView.as_view(), name='exam-draw'),
     path('<int:pk>/submit/', ExamSubmitView.as_view(), name='exam-submit'),
     # Management
     path('admin/', AdminExamListView.as_view(), name='admin-exam-list'),
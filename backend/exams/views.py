@@ -1,18 +1,85 @@
+import json
+import random
+
+from django.db import IntegrityError
+from django.db.models import Prefetch, aprefetch_related_objects
+from django.http import Http404, HttpResponse
 from rest_framework import generics, permissions, status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.db import transaction
 from django.shortcuts import get_object_or_404
-from .models import Exam, Question, Choice
-from .serializers import ExamSerializer, AdminExamSerializer
+from core.async_views import AsyncRetrieveAPIView
+from core.cache import aget_or_build
+from core.conditional import AsyncConditionalGetMixin
+from .models import Exam, ExamDraw, Question, Choice
+from .serializers import ExamSerializer, AdminExamSerializer, QuestionSerializer
+from jobs.models import Job
 from results.models import ExamAttempt
 from results.serializers import ExamAttemptSerializer
 
-class ExamDetailView(generics.RetrieveAPIView):
+class ExamDetailView(AsyncConditionalGetMixin, AsyncRetrieveAPIView):
     queryset = Exam.objects.all()
     serializer_class = ExamSerializer
     permission_classes = (permissions.IsAuthenticated,)
 
-                                                                    
+    async def get_exam_version(self):
+        """(content_version, updated_at) of the exam, or None if it doesn't exist."""
+        if not hasattr(self, '_exam_version'):
+            self._exam_version = await Exam.objects.filter(pk=self.kwargs['pk']).values_list(
+                'content_version', 'updated_at'
+            ).afirst()
+        return self._exam_version
+
+    async def get_validators(self, request):
+        version = await self.get_exam_version()
+        if not version:
+            return None, None
+        content_version, updated_at = version
+        return f'exam-{self.kwargs["pk"]}-{content_version}-{updated_at.timestamp()}', updated_at
+
+    async def retrieve(self, request, *args, **kwargs):
+        # Everybody starting an exam gets the same payload: render it once per
+        # version, even when hundreds of students open it in the same second
+        version = await self.get_exam_version()
+        if not version:
+            raise Http404
+        content_version, updated_at = version
+        key = f'exam-payload:{self.kwargs["pk"]}:{content_version}:{updated_at.timestamp()}'
+        content = await aget_or_build(key, self.render_payload, 60 * 60)
+        if request.accepted_renderer.format == 'json':
+            return HttpResponse(content, content_type='application/json')
+        return Response(json.loads(content))
+
+    async def render_payload(self):
+        exam = await self.aget_object()
+        if not exam.sample_size:
+            await aprefetch_related_objects([exam], 'questions__choices')
+        return JSONRenderer().render(self.get_serializer(exam).data)
+
+class ExamDrawView(APIView):
+    """Start an attempt at a sampled exam, or resume it: return the questions of the user's open draw.
+
+    The draw (see ExamDraw) is stored with its seed the first time, and the
+    same questions come back until the attempt is submitted.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request, pk):
+        exam = get_object_or_404(Exam, pk=pk)
+        if not exam.sample_size:
+            return Response({'detail': 'This exam asks every question; fetch it whole.'}, status=status.HTTP_400_BAD_REQUEST)
+        seed = ExamDraw.start(request.user, exam).seed
+        question_ids = exam.draw(seed)
+        questions = Question.objects.filter(pk__in=question_ids).prefetch_related(
+            Prefetch('choices', queryset=Choice.objects.order_by('pk'))
+        ).in_bulk()
+        data = QuestionSerializer([questions[question_id] for question_id in question_ids], many=True).data
+        for question in data:
+            random.Random(f'{seed}:{question["id"]}').shuffle(question['choices'])
+        return Response({'questions': data})
+
 class AdminExamListView(generics.ListCreateAPIView):
     queryset = Exam.objects.all()
     serializer_class = AdminExamSerializer
@@ -31,43 +98,39 @@ class ExamSubmitView(APIView):
         answers = request.data.get('answers', {})  # Expected: {question_id: choice_id}
         time_taken = request.data.get('time_taken', 0)
 
-        total_points = 0
-        earned_points = 0
+        draw = seed = None
+        if exam.sample_size:
+            draw = ExamDraw.objects.filter(user=request.user, exam=exam).first()
+            if draw is None:
+                return Response({'detail': 'Start this exam before submitting it.'}, status=status.HTTP_400_BAD_REQUEST)
+            if draw.content_version != exam.content_version:
+                # The questions changed since the draw, so the seed no longer reproduces it
+                return Response({'detail': 'The exam changed after it was started; start it again.'}, status=status.HTTP_409_CONFLICT)
+            seed = draw.seed
 
-        for question in exam.questions.all():
-            total_points += question.points
-            selected_choice_id = answers.get(str(question.id))
-            if selected_choice_id:
-                try:
-                    choice = Choice.objects.get(id=selected_choice_id, question=question)
-                    if choice.is_correct:
-                        earned_points += question.points
-                except Choice.DoesNotExist:
-                    pass
+        earned_points, total_points = exam.grade(answers, seed)
 
         score_percentage = (earned_points / total_points * 100) if total_points > 0 else 0
         is_passed = score_percentage >= exam.passing_score
 
-        attempt = ExamAttempt.objects.create(
-            user=request.user,
-            exam=exam,
-            score=int(score_percentage),
-            earned_points=earned_points if is_passed else 0,
-            time_taken=time_taken,
-            is_passed=is_passed
-        )
-
-        # Update user total score if passed (simplified logic)
-        # Always update study time
-        request.user.study_time += (time_taken // 60)
-        
-        if is_passed:
-            request.user.total_score += earned_points
-            request.user.save()
-            # Update ranks for all users
-            from users.models import User
-            User.update_ranks()
-        else:
-            request.user.save()
+        try:
+            with transaction.atomic():
+                # The submission that closes the draw grades it; a concurrent one finds it gone
+                if draw is not None and not ExamDraw.objects.filter(pk=draw.pk, seed=seed).delete()[0]:
+                    return Response({'detail': 'This attempt was submitted already.'}, status=status.HTTP_409_CONFLICT)
+                attempt = ExamAttempt.objects.create(
+                    user=request.user,
+                    exam=exam,
+                    score=int(score_percentage),
+                    earned_points=earned_points if is_passed else 0,
+                    time_taken=time_taken,
+                    is_passed=is_passed,
+                    seed=seed,
+                )
+                # Score, study time, rank and leaderboard updates are applied by the job worker
+                Job.enqueue('attempt_completed', attempt_id=attempt.pk)
+        except IntegrityError:
+            # unique_attempt_seed: this draw was submitted already
+            return Response({'detail': 'This attempt was submitted already.'}, status=status.HTTP_409_CONFLICT)
 
         return Response(ExamAttemptSerializer(attempt).data, status=status.HTTP_201_CREATED)
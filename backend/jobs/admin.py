@@ -0,0 +1,8 @@
+from django.contrib import admin
+from .models import Job
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'created_at', 'attempts', 'failed_at')
+    list_filter = ('kind', 'failed_at')
+    readonly_fields = ('created_at',)
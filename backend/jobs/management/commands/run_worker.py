@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from jobs.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Process queued jobs from the database. Several workers may run side by side on PostgreSQL.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Maximum number of jobs picked up (and coalesced) per pass.')
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue and exit instead of polling forever.')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Worker started.')
+        try:
+            while True:
+                processed = Job.run_batch(limit=options['batch_size'])
+                if processed:
+                    self.stdout.write(f'Processed {processed} job(s).')
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write('Worker stopped.')
@@ -0,0 +1,88 @@
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+# kind -> handler(payloads); see register
+HANDLERS = {}
+
+
+def register(kind):
+    """Register a batch handler for a job kind.
+
+    The handler receives the payloads of every pending job of that kind
+    picked up in one worker pass, so bursts can be coalesced.
+    """
+    def decorator(handler):
+        HANDLERS[kind] = handler
+        return handler
+    return decorator
+
+
+class JobQuerySet(models.QuerySet):
+    def pending(self):
+        return self.filter(failed_at__isnull=True)
+
+
+class Job(models.Model):
+    """A unit of deferred work stored in the database and run by the run_worker command."""
+    MAX_ATTEMPTS = 5
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    failed_at = models.DateTimeField(null=True, blank=True)
+
+    objects = JobQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk}"
+
+    @classmethod
+    def enqueue(cls, kind, **payload):
+        job = cls.objects.create(kind=kind, payload=payload)
+        if getattr(settings, 'JOBS_EAGER', False):
+            # Development/test mode: run right after the surrounding transaction commits
+            transaction.on_commit(lambda: cls.run_batch(cls.objects.filter(pk=job.pk)))
+        return job
+
+    @classmethod
+    def run_batch(cls, queryset=None, limit=500):
+        """Run up to limit pending jobs, grouped by kind. Returns the number of jobs processed."""
+        queryset = cls.objects.pending() if queryset is None else queryset
+        with transaction.atomic():
+            jobs = list(queryset.select_for_update(skip_locked=True).order_by('id')[:limit])
+            if not jobs:
+                return 0
+            try:
+                with transaction.atomic():
+                    cls.dispatch(jobs)
+            except Exception:
+                # Isolate the failing job(s) by retrying one at a time
+                for job in jobs:
+                    try:
+                        with transaction.atomic():
+                            cls.dispatch([job])
+                    except Exception as exc:
+                        job.attempts += 1
+                        job.last_error = repr(exc)
+                        if job.attempts >= cls.MAX_ATTEMPTS:
+                            job.failed_at = timezone.now()
+                        job.save(update_fields=['attempts', 'last_error', 'failed_at'])
+                    else:
+                        job.delete()
+            else:
+                cls.objects.filter(pk__in=[job.pk for job in jobs]).delete()
+        return len(jobs)
+
+    @staticmethod
+    def dispatch(jobs):
+        by_kind = {}
+        for job in jobs:
+            by_kind.setdefault(job.kind, []).append(job.payload)
+        for kind, payloads in by_kind.items():
+            HANDLERS[kind](payloads)
@@ -0,0 +1,45 @@
+from django.test import TestCase
+from .models import HANDLERS, Job, register
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.batches = []
+        register('test_echo')(self.echo)
+        self.addCleanup(HANDLERS.pop, 'test_echo')
+
+    def echo(self, payloads):
+        self.batches.append([payload['n'] for payload in payloads])
+        if any(payload.get('fail') for payload in payloads):
+            raise ValueError('bad payload')
+
+    def test_pending_jobs_of_a_kind_run_as_one_batch(self):
+        for n in range(3):
+            Job.enqueue('test_echo', n=n)
+        self.assertEqual(Job.run_batch(), 3)
+        self.assertEqual(self.batches, [[0, 1, 2]])
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(Job.run_batch(), 0)
+
+    def test_failing_job_is_isolated_and_retried(self):
+        Job.enqueue('test_echo', n=0)
+        failing = Job.enqueue('test_echo', n=1, fail=True)
+        Job.enqueue('test_echo', n=2)
+        self.assertEqual(Job.run_batch(), 3)
+        # The batch fails, then each job runs on its own
+        self.assertEqual(self.batches, [[0, 1, 2], [0], [1], [2]])
+        failing.refresh_from_db()
+        self.assertEqual(list(Job.objects.all()), [failing])
+        self.assertEqual((failing.attempts, failing.failed_at), (1, None))
+        self.assertIn('bad payload', failing.last_error)
+
+    def test_failed_at_after_max_attempts(self):
+        failing = Job.enqueue('test_echo', n=0, fail=True)
+        for attempt in range(1, Job.MAX_ATTEMPTS + 1):
+            self.assertEqual(Job.run_batch(), 1)
+            failing.refresh_from_db()
+            self.assertEqual(failing.attempts, attempt)
+        self.assertIsNotNone(failing.failed_at)
+        # Failed jobs stay for inspection but are no longer picked up
+        self.assertFalse(Job.objects.pending().exists())
+        self.assertEqual(Job.run_batch(), 0)
@@ -3,7 +3,7 @@ from .models import ExamAttempt
 
 @admin.register(ExamAttempt)
 class ExamAttemptAdmin(admin.ModelAdmin):
-    list_display = ('user', 'exam', 'score', 'is_passed', 'completed_at')
+    list_display = ('user', 'exam', 'score', 'is_passed', 'likes_count', 'comments_count', 'completed_at')
     list_filter = ('is_passed', 'exam')
     search_fields = ('user__username', 'exam__title')
-    readonly_fields = ('completed_at',)
+    readonly_fields = ('completed_at', 'likes_count', 'comments_count')
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ResultsConfig(AppConfig):
     name = 'results'
+
+    def ready(self):
+        from . import jobs  # noqa: F401  registers the job handlers
@@ -0,0 +1,153 @@
+"""Server-rendered certificates.
+
+A certificate is drawn from a few fields of the attempt, its user, exam and
+course. The rendered file is stored as certificates/<attempt pk>-<hash of those
+fields>.<ext>, so it never has to be invalidated: renaming the user or the
+course changes the hash, and with it the URL. Once rendered, a file is served
+from disk without touching the database (see results.views.serve_certificate).
+Superseded files are deleted by the backfill_certificates command's --prune.
+"""
+import functools
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageDraw, ImageFont
+from .models import ExamAttempt
+
+# Part of every certificate's hash: bump it whenever the layout below changes
+TEMPLATE_VERSION = 1
+DIRECTORY = 'certificates'
+NAME_PATTERN = re.compile(r'(?P<pk>\d+)-(?P<digest>[0-9a-f]{20})\.(?P<ext>png|pdf)')
+# Files being written by store(); NAME_PATTERN never matches them, so they aren't served
+TEMP_PREFIX = '.rendering-'
+WIDTH, HEIGHT = 1600, 1131  # A4 landscape
+# Rendered in the PDF at the resolution that makes the page A4 sized
+PDF_RESOLUTION = WIDTH / 11.69
+
+INK = (30, 41, 59)
+MUTED = (100, 116, 139)
+ACCENT = (49, 46, 129)
+PAPER = (255, 251, 235)
+
+
+def attempts():
+    """Passed attempts with just the columns inputs() reads."""
+    return ExamAttempt.objects.filter(is_passed=True).select_related('user', 'exam__course').only(
+        'score', 'completed_at', 'user__username', 'user__first_name', 'user__last_name',
+        'exam__title', 'exam__course__title',
+    )
+
+
+def inputs(attempt):
+    """Everything a certificate shows. Needs attempt.user and attempt.exam.course loaded."""
+    return {
+        'template': TEMPLATE_VERSION,
+        'id': attempt.pk,
+        'name': attempt.candidate_name,
+        'title': attempt.exam.course.title or attempt.exam.title,
+        'score': attempt.score,
+        'date': timezone.localdate(attempt.completed_at).strftime('%d.%m.%Y'),
+    }
+
+
+def file_name(attempt, ext):
+    digest = hashlib.sha256(json.dumps(inputs(attempt), sort_keys=True).encode()).hexdigest()[:20]
+    return f'{DIRECTORY}/{attempt.pk}-{digest}.{ext}'
+
+
+def ensure(attempt, ext):
+    """Render the attempt's certificate unless it is already on disk. Returns its storage name."""
+    name = file_name(attempt, ext)
+    if not default_storage.exists(name):
+        store(name, render(inputs(attempt), ext))
+    return name
+
+
+def store(name, content):
+    """Write a file so that readers see either nothing or all of it.
+
+    The files are served as immutable, so a request must never find one half
+    written: it is written under a temporary name in the same directory and
+    renamed into place. Concurrent renders of one certificate write the same
+    bytes, so whichever rename lands last is as good as the first.
+    """
+    path = Path(default_storage.path(name))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=TEMP_PREFIX, delete=False) as temp:
+        try:
+            temp.write(content)
+        except BaseException:
+            os.unlink(temp.name)
+            raise
+    os.chmod(temp.name, 0o644)
+    os.replace(temp.name, path)
+
+
+@functools.lru_cache(maxsize=None)
+def font(size, bold=False, serif=False):
+    family = 'DejaVuSerif' if serif else 'DejaVuSans'
+    try:
+        return ImageFont.truetype(f"{family}{'-Bold' if bold else ''}.ttf", size)
+    except OSError:
+        # No DejaVu fonts installed (see the Dockerfile); Pillow's built-in font has no bold or serif face
+        return ImageFont.load_default(size)
+
+
+def centered(draw, y, text, text_font, fill, max_width=WIDTH - 240):
+    """Draw text centered horizontally at y, shrinking the font until it fits max_width."""
+    while draw.textlength(text, font=text_font) > max_width and text_font.size > 16:
+        text_font = text_font.font_variant(size=text_font.size - 2)
+    draw.text((WIDTH / 2, y), text, font=text_font, fill=fill, anchor='mt')
+
+
+def render(values, ext):
+    image = Image.new('RGB', (WIDTH, HEIGHT), PAPER)
+    draw = ImageDraw.Draw(image)
+
+    # Double frame with corner ornaments
+    draw.rectangle((24, 24, WIDTH - 25, HEIGHT - 25), outline=INK, width=6)
+    draw.rectangle((40, 40, WIDTH - 41, HEIGHT - 41), outline=INK, width=2)
+    for x, y, dx, dy in ((64, 64, 1, 1), (WIDTH - 65, 64, -1, 1), (64, HEIGHT - 65, 1, -1), (WIDTH - 65, HEIGHT - 65, -1, -1)):
+        draw.line((x, y, x + 80 * dx, y), fill=INK, width=6)
+        draw.line((x, y, x, y + 80 * dy), fill=INK, width=6)
+
+    centered(draw, 150, 'SERTIFIKAT', font(88, bold=True, serif=True), INK)
+    draw.line((WIDTH / 3, 270, WIDTH * 2 / 3, 270), fill=MUTED, width=2)
+    centered(draw, 295, 'MUVAFFAQIYATLI TAMOMLAGANLIK HAQIDA', font(28), MUTED)
+    centered(draw, 395, 'Ushbu sertifikat tasdiqlaydi:', font(28, serif=True), MUTED)
+    centered(draw, 455, values['name'], font(72, bold=True, serif=True), INK)
+    centered(draw, 580, "Moorfo platformasida quyidagi kursni muvaffaqiyatli o'zlashtirdi:", font(26), MUTED)
+    centered(draw, 640, values['title'], font(48, bold=True), ACCENT)
+
+    # Score and date side by side
+    for x, label, value in ((WIDTH / 2 - 220, "TO'PLANGAN NATIJA", f"{values['score']}%"),
+                            (WIDTH / 2 + 220, 'BERILGAN SANA', values['date'])):
+        draw.text((x, 770), label, font=font(18), fill=MUTED, anchor='mt')
+        draw.text((x, 805), value, font=font(40, bold=True), fill=INK, anchor='mt')
+    draw.line((WIDTH / 2, 765, WIDTH / 2, 855), fill=MUTED, width=2)
+
+    # Signatures and seal
+    for x, signature, role in ((340, 'Moorfo', 'PLATFORMA'), (WIDTH - 340, 'Bobojonov', "O'QITUVCHI IMZOSI")):
+        draw.text((x, 950), signature, font=font(36, serif=True), fill=INK, anchor='ms')
+        draw.line((x - 130, 965, x + 130, 965), fill=INK, width=2)
+        draw.text((x, 980), role, font=font(16, bold=True), fill=MUTED, anchor='mt')
+    draw.ellipse((WIDTH / 2 - 75, 885, WIDTH / 2 + 75, 1035), outline=INK, width=6)
+    draw.ellipse((WIDTH / 2 - 62, 898, WIDTH / 2 + 62, 1022), outline=MUTED, width=1)
+    draw.text((WIDTH / 2, 960), 'MOORFO', font=font(20, bold=True), fill=INK, anchor='mm')
+
+    centered(draw, HEIGHT - 80, f"ID: {values['id']:08d} • VERIFIED CERTIFICATE • MOORFO.UZ", font(16), MUTED)
+
+    buffer = io.BytesIO()
+    if ext == 'pdf':
+        image.save(buffer, 'PDF', resolution=PDF_RESOLUTION)
+    else:
+        # Not optimize=True: three times slower to encode for a 2% smaller file
+        image.save(buffer, 'PNG')
+    return buffer.getvalue()
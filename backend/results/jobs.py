@@ -0,0 +1,31 @@
+from jobs.models import register
+from users.models import User
+from .models import ExamAttempt
+
+# Above this many users moving in one batch a single set-based rebuild is
+# cheaper than shifting each user's slice.
+RANK_REBUILD_THRESHOLD = 50
+
+
+@register('attempt_completed')
+def apply_completed_attempts(payloads):
+    """Apply the bookkeeping of submitted attempts: user totals, ranks and rollups."""
+    attempts = list(ExamAttempt.objects.filter(pk__in=[payload['attempt_id'] for payload in payloads]))
+    ExamAttempt.record_stats(attempts)
+
+    totals = {}
+    for attempt in attempts:
+        points, minutes = totals.get(attempt.user_id, (0, 0))
+        totals[attempt.user_id] = (points + attempt.earned_points, minutes + attempt.time_taken // 60)
+
+    # One rank pass for the whole batch: either a single set-based rebuild, or
+    # each user's slice shifted right after their own score is written (shift_rank
+    # assumes every other user's rank is already consistent).
+    rebuild = sum(1 for points, minutes in totals.values() if points) > RANK_REBUILD_THRESHOLD
+    for user_id in sorted(totals):
+        points, minutes = totals[user_id]
+        new_score = User.add_progress(user_id, points, minutes)
+        if points and not rebuild:
+            User(pk=user_id, total_score=new_score).shift_rank(new_score - points)
+    if rebuild:
+        User.update_ranks()
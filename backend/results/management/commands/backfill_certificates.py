@@ -0,0 +1,70 @@
+import datetime
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from results import certificates
+
+# Temporary files older than this belong to renders that died before their rename
+STALE_TEMP_AGE = datetime.timedelta(hours=1)
+
+
+class Command(BaseCommand):
+    help = (
+        'Render the certificates of passed attempts that are missing on disk (see results.certificates), '
+        'and optionally delete certificate files that are no longer current.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formats', default='png,pdf',
+                            help='Comma separated formats to render; empty to render nothing.')
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--prune', action='store_true', help='Delete superseded certificate files afterwards.')
+
+    def handle(self, *args, **options):
+        formats = [ext for ext in options['formats'].split(',') if ext]
+        if formats:
+            started = time.perf_counter()
+            queryset = certificates.attempts().order_by('pk')
+            rendered, last_pk = 0, 0
+            while True:
+                batch = list(queryset.filter(pk__gt=last_pk)[:options['batch_size']])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                for attempt in batch:
+                    for ext in formats:
+                        if not default_storage.exists(certificates.file_name(attempt, ext)):
+                            certificates.ensure(attempt, ext)
+                            rendered += 1
+            self.stdout.write(f'Rendered {rendered} certificates in {time.perf_counter() - started:.1f}s')
+        if options['prune']:
+            self.prune(options['batch_size'])
+
+    def prune(self, batch_size):
+        storage = default_storage
+        directory = certificates.DIRECTORY
+        names = storage.listdir(directory)[1] if storage.exists(directory) else []
+        files = {}
+        removed = 0
+        for name in names:
+            match = certificates.NAME_PATTERN.fullmatch(name)
+            if match:
+                files.setdefault(int(match['pk']), []).append((f'{directory}/{name}', match['ext']))
+            elif name.startswith(certificates.TEMP_PREFIX):
+                if storage.get_modified_time(f'{directory}/{name}') < timezone.now() - STALE_TEMP_AGE:
+                    storage.delete(f'{directory}/{name}')
+                    removed += 1
+
+        pks = sorted(files)
+        for start in range(0, len(pks), batch_size):
+            chunk = pks[start:start + batch_size]
+            current = certificates.attempts().in_bulk(chunk)
+            for pk in chunk:
+                for path, ext in files[pk]:
+                    # Superseded by a renamed user or course, or the attempt is gone
+                    if pk not in current or certificates.file_name(current[pk], ext) != path:
+                        storage.delete(path)
+                        removed += 1
+        self.stdout.write(f'Deleted {removed} superseded certificate files.')
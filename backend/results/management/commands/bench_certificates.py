@@ -0,0 +1,69 @@
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from core.management.commands.bench_api import percentile
+from results.models import ExamAttempt
+from results.serializers import ExamAttemptSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare cold (first request renders the file) and warm (served from disk) certificate '
+        'requests with the JSON attempt-detail payload the browser renders them from today. '
+        'Renders into a temporary MEDIA_ROOT, so every run starts cold.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='synth', help='Prefix the dataset was generated with.')
+        parser.add_argument('--attempts', type=int, default=50, help='Certificates to render.')
+        parser.add_argument('--repeats', type=int, default=5, help='Warm requests per certificate.')
+
+    def handle(self, *args, **options):
+        attempts = list(
+            ExamAttempt.objects.filter(user__username__startswith=f"{options['prefix']}-", is_passed=True)
+            .select_related('user', 'exam__course').order_by('-id')[:options['attempts']]
+        )
+        if not attempts:
+            raise CommandError(f"No passed attempts with prefix \"{options['prefix']}\", run generate_data first.")
+
+        client = APIClient()
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            rows = [('attempt-detail JSON', self.measure(
+                client, [reverse('attempt-detail', kwargs={'pk': a.pk}) for a in attempts] * options['repeats'], 200,
+            ))]
+            for ext in ('png', 'pdf'):
+                files = [ExamAttemptSerializer(a).data['certificate_urls'][ext] for a in attempts]
+                links = [reverse('attempt-certificate', kwargs={'pk': a.pk, 'ext': ext}) for a in attempts]
+                rows += [
+                    (f'{ext} cold', self.measure(client, files, 200)),
+                    (f'{ext} warm', self.measure(client, files * options['repeats'], 200)),
+                    (f'{ext} stable link', self.measure(client, links * options['repeats'], 302)),
+                ]
+
+        self.stdout.write(f"{'request':<22} {'requests':>8} {'p50 ms':>8} {'p95 ms':>8} {'queries':>8} {'KB':>8}")
+        for label, (timings, queries, sizes) in rows:
+            self.stdout.write(
+                f'{label:<22} {len(timings):>8} {statistics.median(timings):>8.2f} {percentile(timings, 95):>8.2f} '
+                f'{sum(queries) / len(queries):>8.1f} {sum(sizes) / len(sizes) / 1024:>8.1f}'
+            )
+
+    def measure(self, client, urls, expected):
+        timings, queries, sizes = [], [], []
+        for url in urls:
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(url)
+                body = b''.join(response.streaming_content) if response.streaming else response.content
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != expected:
+                raise CommandError(f'{url} returned {response.status_code}, expected {expected}')
+            queries.append(len(captured))
+            sizes.append(len(body))
+        timings.sort()
+        return timings, queries, sizes
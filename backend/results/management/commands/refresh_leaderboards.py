@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from results.models import LeaderboardEntry
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the weekly/monthly leaderboards from daily scores, dropping days outside each window. Run daily.'
+
+    def handle(self, *args, **options):
+        for period in LeaderboardEntry.PERIOD_DAYS:
+            LeaderboardEntry.rebuild(period)
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {period} leaderboard.'))
@@ -0,0 +1,134 @@
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.test import APIClient
+from courses.models import Course
+from exams.models import Exam, Question, Choice
+from jobs.models import Job
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Fire concurrent exam submissions from many threads while job workers drain the queue, '
+        'then check that every user aggregate and rank is exact. Creates and deletes its own data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submissions', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--questions', type=int, default=10)
+
+    def setup(self, options):
+        tag = f'stress-{int(time.time())}'
+        course = Course.objects.create(title=tag, slug=tag, description='Stress test data')
+        exam = Exam.objects.create(course=course, title=tag, passing_score=50)
+        answer_sheets = []
+        for i in range(options['questions']):
+            question = Question.objects.create(exam=exam, text=f'Question {i}', points=100)
+            choices = Choice.objects.bulk_create([
+                Choice(question=question, text='right', is_correct=True),
+                Choice(question=question, text='wrong'),
+            ])
+            answer_sheets.append((question.pk, [choice.pk for choice in choices]))
+        User.objects.bulk_create(
+            User(username=f'{tag}-{i}', password='!', email=f'{tag}-{i}@example.com')
+            for i in range(options['users'])
+        )
+        users = list(User.objects.filter(username__startswith=f'{tag}-'))
+        User.update_ranks()
+        return course, exam, answer_sheets, users
+
+    def handle(self, *args, **options):
+        course, exam, answer_sheets, users = self.setup(options)
+        expected = {user.pk: [0, 0] for user in users}
+        expected_lock = threading.Lock()
+        errors = []
+        submitting = threading.Event()
+        submitting.set()
+
+        def submitter(count, seed):
+            rng = random.Random(seed)
+            client = APIClient()
+            try:
+                for _ in range(count):
+                    user = rng.choice(users)
+                    client.force_authenticate(user)
+                    answers = {str(question_id): rng.choice(choice_ids) for question_id, choice_ids in answer_sheets}
+                    time_taken = rng.randint(30, 1800)
+                    response = client.post(
+                        f'/api/exams/{exam.pk}/submit/', {'answers': answers, 'time_taken': time_taken}, format='json'
+                    )
+                    if response.status_code != 201:
+                        errors.append(f'submit returned {response.status_code}')
+                        continue
+                    with expected_lock:
+                        expected[user.pk][0] += response.data['earned_points']
+                        expected[user.pk][1] += time_taken // 60
+            except Exception as exc:
+                errors.append(repr(exc))
+            finally:
+                connection.close()
+
+        def worker():
+            try:
+                while submitting.is_set() or Job.objects.pending().exists():
+                    if not Job.run_batch():
+                        time.sleep(0.05)
+            except Exception as exc:
+                errors.append(repr(exc))
+            finally:
+                connection.close()
+
+        per_thread, remainder = divmod(options['submissions'], options['threads'])
+        submitters = [
+            threading.Thread(target=submitter, args=(per_thread + (i < remainder), i))
+            for i in range(options['threads'])
+        ]
+        workers = [threading.Thread(target=worker) for _ in range(options['workers'])]
+
+        try:
+            started = time.perf_counter()
+            for thread in submitters + workers:
+                thread.start()
+            for thread in submitters:
+                thread.join()
+            submitted = time.perf_counter()
+            submitting.clear()
+            for thread in workers:
+                thread.join()
+            drained = time.perf_counter()
+
+            self.stdout.write(
+                f"{options['submissions']} submissions in {submitted - started:.2f}s "
+                f"({options['submissions'] / (submitted - started):.0f}/s), "
+                f'queue drained after {drained - started:.2f}s'
+            )
+            if errors:
+                raise CommandError(f'{len(errors)} error(s), first: {errors[0]}')
+
+            mismatches = []
+            scores = {}
+            for user in User.objects.filter(pk__in=expected):
+                points, minutes = expected[user.pk]
+                scores[user.pk] = user.total_score
+                if (user.total_score, user.study_time, user.level) != (points, minutes, points // 1000 + 1):
+                    mismatches.append(f'{user.username}: {user.total_score}/{user.study_time}/{user.level}, expected {points}/{minutes}')
+            # Ranks of the stress users must match a fresh rebuild
+            ranks_before = dict(User.objects.with_rank().values_list('pk', 'rank'))
+            User.update_ranks()
+            ranks_after = dict(User.objects.with_rank().values_list('pk', 'rank'))
+            mismatches += [f'user {pk}: rank {ranks_before[pk]}, expected {ranks_after[pk]}'
+                           for pk in expected if ranks_before[pk] != ranks_after[pk]]
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} mismatch(es), first: {mismatches[0]}')
+            self.stdout.write(self.style.SUCCESS(f'All {len(expected)} user totals, levels and ranks are exact.'))
+        finally:
+            User.objects.filter(pk__in=expected).delete()
+            course.delete()
+            User.update_ranks()
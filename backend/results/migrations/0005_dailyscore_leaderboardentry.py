@@ -0,0 +1,68 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+import datetime
+
+
+def backfill(apps, schema_editor):
+    ExamAttempt = apps.get_model('results', 'ExamAttempt')
+    DailyScore = apps.get_model('results', 'DailyScore')
+    LeaderboardEntry = apps.get_model('results', 'LeaderboardEntry')
+
+    daily = (
+        ExamAttempt.objects.filter(earned_points__gt=0)
+        .annotate(day=TruncDate('completed_at'))
+        .values('user_id', 'day')
+        .annotate(points=Sum('earned_points'))
+        .order_by()
+    )
+    DailyScore.objects.bulk_create(DailyScore(**row) for row in daily)
+
+    today = timezone.localdate()
+    for period, days in (('weekly', 7), ('monthly', 30)):
+        start = today - datetime.timedelta(days=days - 1)
+        totals = DailyScore.objects.filter(day__gte=start).values('user_id').annotate(score=Sum('points')).order_by()
+        LeaderboardEntry.objects.bulk_create(LeaderboardEntry(period=period, **row) for row in totals)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('results', '0004_certificatecomment_certificatelike'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('points', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_scores', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='daily_score_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'day'), name='unique_daily_score')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('weekly', 'Weekly'), ('monthly', 'Monthly')], max_length=10)),
+                ('score', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period', '-score'], name='leaderboard_period_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('period', 'user'), name='unique_leaderboard_entry')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:20
+
+from django.db import migrations, models
+from django.db.models import Count, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill(apps, schema_editor):
+    # Rebuild every bucket from the attempt history so failed attempts and
+    # study time are counted too, not just the days that earned points.
+    ExamAttempt = apps.get_model('results', 'ExamAttempt')
+    DailyScore = apps.get_model('results', 'DailyScore')
+
+    daily = (
+        ExamAttempt.objects.annotate(day=TruncDate('completed_at'))
+        .values('user_id', 'day')
+        .annotate(
+            earned_points=Sum('earned_points'),
+            attempts=Count('id'),
+            study_minutes=Sum(ExpressionWrapper(F('time_taken') / 60, output_field=models.IntegerField())),
+        )
+        .order_by()
+    )
+    DailyScore.objects.all().delete()
+    DailyScore.objects.bulk_create((DailyScore(**row) for row in daily), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('results', '0005_dailyscore_leaderboardentry'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='dailyscore',
+            old_name='points',
+            new_name='earned_points',
+        ),
+        migrations.AddField(
+            model_name='dailyscore',
+            name='attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dailyscore',
+            name='study_minutes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0003_exam_content_version'),
+        ('results', '0006_dailyscore_rollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='certificatecomment',
+            index=models.Index(fields=['attempt', '-created_at', '-id'], name='comment_attempt_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='examattempt',
+            index=models.Index(fields=['user', '-completed_at', '-id'], name='attempt_user_completed_idx'),
+        ),
+    ]
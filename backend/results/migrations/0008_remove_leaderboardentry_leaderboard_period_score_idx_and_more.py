@@ -0,0 +1,28 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0004_exam_updated_at'),
+        ('results', '0007_certificatecomment_comment_attempt_created_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='leaderboardentry',
+            name='leaderboard_period_score_idx',
+        ),
+        migrations.AddIndex(
+            model_name='examattempt',
+            index=models.Index(fields=['exam', '-score', '-completed_at'], name='attempt_exam_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['period', '-score', 'user'], name='leaderboard_score_user_idx'),
+        ),
+    ]
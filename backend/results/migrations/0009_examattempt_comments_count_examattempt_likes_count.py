@@ -0,0 +1,41 @@
+# Generated by Django 6.0.2 on 2026-10-18 15:03
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill(apps, schema_editor):
+    ExamAttempt = apps.get_model('results', 'ExamAttempt')
+
+    def count(model_name):
+        model = apps.get_model('results', model_name)
+        return Coalesce(Subquery(
+            model.objects.filter(attempt=OuterRef('pk')).order_by()
+            .values('attempt').annotate(total=Count('*')).values('total')
+        ), 0)
+
+    ExamAttempt.objects.update(
+        likes_count=count('CertificateLike'), comments_count=count('CertificateComment'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('results', '0008_remove_leaderboardentry_leaderboard_period_score_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examattempt',
+            name='comments_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='examattempt',
+            name='likes_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0.2 on 2026-10-18 15:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0005_exam_sample_size'),
+        ('results', '0009_examattempt_comments_count_examattempt_likes_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examattempt',
+            name='seed',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='examattempt',
+            constraint=models.UniqueConstraint(fields=('exam', 'seed'), name='unique_attempt_seed'),
+        ),
+    ]
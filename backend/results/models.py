@@ -1,7 +1,65 @@
-from django.db import models
+import datetime
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, Exists, F, OuterRef, Prefetch, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
+from core.fieldsets import columns
 from exams.models import Exam
 
+
+def increment(model, lookup, **deltas):
+    """Add deltas to the row matching lookup, creating it if it doesn't exist yet."""
+    changes = {field: F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**lookup).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # Another request created the row between our update and insert
+        model.objects.filter(**lookup).update(**changes)
+
+class ExamAttemptQuerySet(models.QuerySet):
+    def for_certificates(self, user=None, fields=None):
+        """Load everything ExamAttemptSerializer reads in a fixed number of queries.
+
+        fields is the serializer's sparse fieldset, if any: comments and the
+        like state are only loaded when they are part of it.
+        """
+        from .serializers import CertificateCommentSerializer
+        queryset = self.select_related('exam__course', 'user')
+        if fields is None or 'comments' in fields:
+            comments = CertificateComment.objects.select_related('user')
+            queryset = queryset.prefetch_related(Prefetch(
+                'comments', queryset=comments.only('attempt', *columns(CertificateCommentSerializer()))
+            ))
+        if user is not None and user.is_authenticated and (fields is None or 'is_liked' in fields):
+            queryset = queryset.annotate(
+                liked=Exists(CertificateLike.objects.filter(attempt=OuterRef('pk'), user=user))
+            )
+        return queryset
+
+    def reconcile_counters(self):
+        """Recount the likes and comments of these attempts and fix the counters that drifted.
+
+        Returns the number of attempts fixed.
+        """
+        def count(model):
+            # A correlated count keeps GROUP BY out of the query
+            return Coalesce(Subquery(
+                model.objects.filter(attempt=OuterRef('pk')).order_by()
+                .values('attempt').annotate(total=Count('*')).values('total')
+            ), 0)
+
+        drifted = self.alias(actual_likes=count(CertificateLike), actual_comments=count(CertificateComment)).filter(
+            ~Q(likes_count=F('actual_likes')) | ~Q(comments_count=F('actual_comments'))
+        )
+        return self.model.objects.filter(pk__in=list(drifted.order_by().values_list('pk', flat=True))).update(
+            likes_count=count(CertificateLike), comments_count=count(CertificateComment),
+        )
+
 class ExamAttempt(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='attempts')
     exam = models.ForeignKey(Exam, on_delete=models.CASCADE)
@@ -10,12 +68,131 @@ class ExamAttempt(models.Model):
     time_taken = models.IntegerField()  # In seconds
     is_passed = models.BooleanField()
     completed_at = models.DateTimeField(auto_now_add=True)
+    # Seed of the questions a sampled exam drew for this attempt (see Exam.draw); null otherwise
+    seed = models.BigIntegerField(null=True, blank=True, editable=False)
+    # Maintained in the same transaction as every like and comment write; the
+    # reconcile_counters command repairs drift, e.g. from users deleted with their likes
+    likes_count = models.IntegerField(default=0)
+    comments_count = models.IntegerField(default=0)
+
+    objects = ExamAttemptQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.user.username} - {self.exam.title} - {self.score}"
 
+    @property
+    def candidate_name(self):
+        full_name = f"{self.user.first_name} {self.user.last_name}".strip()
+        return full_name if full_name else self.user.username
+
     class Meta:
         ordering = ['-completed_at']
+        indexes = [
+            models.Index(fields=['user', '-completed_at', '-id'], name='attempt_user_completed_idx'),
+            models.Index(fields=['exam', '-score', '-completed_at'], name='attempt_exam_score_idx'),
+        ]
+        constraints = [
+            # A draw is submitted once; attempts without a seed don't collide (NULLs are distinct)
+            models.UniqueConstraint(fields=['exam', 'seed'], name='unique_attempt_seed'),
+        ]
+
+    @classmethod
+    def record_stats(cls, attempts):
+        """Roll attempts into the per-user daily rollup and the period leaderboards.
+
+        Attempts are summed first, so a burst costs one write per user and day.
+        """
+        daily = {}
+        periods = {}
+        today = timezone.localdate()
+        for attempt in attempts:
+            day = timezone.localdate(attempt.completed_at)
+            totals = daily.setdefault((attempt.user_id, day), [0, 0, 0])
+            totals[0] += attempt.earned_points
+            totals[1] += 1
+            totals[2] += attempt.time_taken // 60
+            if not attempt.earned_points:
+                continue
+            for period, days in LeaderboardEntry.PERIOD_DAYS.items():
+                if day > today - datetime.timedelta(days=days):
+                    periods[(period, attempt.user_id)] = periods.get((period, attempt.user_id), 0) + attempt.earned_points
+
+        with transaction.atomic():
+            for (user_id, day), (earned_points, count, study_minutes) in daily.items():
+                increment(
+                    DailyScore, {'user_id': user_id, 'day': day},
+                    earned_points=earned_points, attempts=count, study_minutes=study_minutes,
+                )
+            for (period, user_id), score in periods.items():
+                increment(LeaderboardEntry, {'period': period, 'user_id': user_id}, score=score)
+
+class DailyScore(models.Model):
+    """Per-user, per-day rollup of exam activity, maintained on submit."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_scores')
+    day = models.DateField()
+    earned_points = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=0)
+    study_minutes = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='unique_daily_score'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='daily_score_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.day} - {self.earned_points}"
+
+class LeaderboardEntry(models.Model):
+    """Materialized rolling-period score of a user.
+
+    Incremented as attempts come in and rebuilt from DailyScore by the
+    refresh_leaderboards command, which ages out days that left the window.
+    """
+    PERIOD_DAYS = {
+        'weekly': 7,
+        'monthly': 30,
+    }
+    PERIOD_CHOICES = (
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+    )
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    score = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'user'], name='unique_leaderboard_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['period', '-score', 'user'], name='leaderboard_score_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.period} - {self.user_id} - {self.score}"
+
+    @classmethod
+    def top(cls, period, limit=50):
+        return cls.objects.filter(period=period, score__gt=0).select_related('user').order_by('-score', 'user_id')[:limit]
+
+    @classmethod
+    def rebuild(cls, period, today=None):
+        """Recompute one period from the daily buckets still inside its window."""
+        today = today or timezone.localdate()
+        start = today - datetime.timedelta(days=cls.PERIOD_DAYS[period] - 1)
+        totals = (
+            DailyScore.objects.filter(day__gte=start, earned_points__gt=0)
+            .values('user_id').annotate(total=Sum('earned_points'))
+        )
+        with transaction.atomic():
+            cls.objects.filter(period=period).delete()
+            cls.objects.bulk_create(
+                (cls(period=period, user_id=row['user_id'], score=row['total']) for row in list(totals)),
+                batch_size=1000,
+            )
 
 class CertificateComment(models.Model):
     attempt = models.ForeignKey(ExamAttempt, related_name='comments', on_delete=models.CASCADE)
@@ -23,6 +200,11 @@ class CertificateComment(models.Model):
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['attempt', '-created_at', '-id'], name='comment_attempt_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} on {self.attempt} - {self.text[:20]}"
 
@@ -1,35 +1,55 @@
 from rest_framework import serializers
-from users.serializers import UserSerializer
+from django.urls import reverse
+from core.fieldsets import FieldsetSerializerMixin
+from core.images import ImageVariantsField
+from users.serializers import AuthorSerializer
+from . import certificates
 from .models import ExamAttempt, CertificateComment, CertificateLike
 
-class CertificateCommentSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+class CertificateCommentSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
+    user = AuthorSerializer(read_only=True)
 
     class Meta:
         model = CertificateComment
         fields = ('id', 'user', 'text', 'created_at')
 
-class ExamAttemptSerializer(serializers.ModelSerializer):
+class ExamAttemptSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
     exam_title = serializers.ReadOnlyField(source='exam.title')
     course_title = serializers.ReadOnlyField(source='exam.course.title')
     candidate_name = serializers.SerializerMethodField()
     candidate_avatar = serializers.ImageField(source='user.avatar', read_only=True)
+    candidate_avatar_variants = ImageVariantsField('avatar', source='user')
     user_id = serializers.IntegerField(source='user.id', read_only=True)
     comments = CertificateCommentSerializer(many=True, read_only=True)
-    likes_count = serializers.IntegerField(source='likes.count', read_only=True)
     is_liked = serializers.SerializerMethodField()
+    certificate_urls = serializers.SerializerMethodField()
 
     class Meta:
         model = ExamAttempt
-        fields = ('id', 'user_id', 'exam', 'exam_title', 'course_title', 'candidate_name', 'candidate_avatar', 'score', 'earned_points', 'time_taken', 'is_passed', 'completed_at', 'comments', 'likes_count', 'is_liked')
-        read_only_fields = ('user', 'completed_at')
+        fields = ('id', 'user_id', 'exam', 'exam_title', 'course_title', 'candidate_name', 'candidate_avatar', 'candidate_avatar_variants', 'score', 'earned_points', 'time_taken', 'is_passed', 'completed_at', 'comments', 'likes_count', 'comments_count', 'is_liked', 'certificate_urls')
+        read_only_fields = ('user', 'completed_at', 'likes_count', 'comments_count')
 
     def get_candidate_name(self, obj):
-        full_name = f"{obj.user.first_name} {obj.user.last_name}".strip()
-        return full_name if full_name else obj.user.username
+        return obj.candidate_name
 
+    def get_certificate_urls(self, obj):
+        """Content-addressed certificate files, rendered on their first request."""
+        if not obj.is_passed:
+            return None
+        request = self.context.get('request')
+        urls = {}
+        for ext in ('png', 'pdf'):
+            name = certificates.file_name(obj, ext).removeprefix(f'{certificates.DIRECTORY}/')
+            url = reverse('certificate-file', kwargs={'name': name})
+            urls[ext] = request.build_absolute_uri(url) if request else url
+        return urls
+
+    # liked is annotated by ExamAttempt.objects.for_certificates();
+    # fall back to a query for attempts loaded without it.
     def get_is_liked(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            if hasattr(obj, 'liked'):
+                return obj.liked
             return obj.likes.filter(user=request.user).exists()
         return False
@@ -1,3 +1,340 @@
-from django.test import TestCase
+import datetime
+import os
+import tempfile
+from io import StringIO
 
-# Create your tests here.
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from jobs.models import Job
+from users.models import User
+from courses.models import Course
+from exams.models import Exam
+from . import certificates
+from .models import ExamAttempt, CertificateComment, CertificateLike, DailyScore, LeaderboardEntry
+
+
+class CertificateQueryBudgetTests(TestCase):
+    """Certificate endpoints must cost the same number of queries for 1 or many rows."""
+
+    def setUp(self):
+        self.viewer = User.objects.create_user('viewer', 'viewer@example.com', 'pass')
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def add_certificates(self, count):
+        for i in range(count):
+            course = Course.objects.create(title=f'Course {Course.objects.count()}', description='-')
+            exam = Exam.objects.create(course=course, title=f'Exam {i}')
+            attempt = ExamAttempt.objects.create(
+                user=self.owner, exam=exam, score=90, earned_points=100, time_taken=60, is_passed=True
+            )
+            CertificateComment.objects.create(attempt=attempt, user=self.viewer, text='Well done')
+            CertificateComment.objects.create(attempt=attempt, user=self.owner, text='Thanks')
+            CertificateLike.objects.create(attempt=attempt, user=self.viewer)
+        # Written directly, not through the views that maintain the counters
+        ExamAttempt.objects.reconcile_counters()
+        return attempt
+
+    def assert_flat(self, url_for, expected):
+        for count in (1, 5):
+            attempt = self.add_certificates(count)
+            with self.assertNumQueries(expected):
+                response = self.client.get(url_for(attempt))
+            self.assertEqual(response.status_code, 200)
+
+    def test_history(self):
+        self.client.force_authenticate(self.owner)
+        self.assert_flat(lambda attempt: '/api/results/history/', 2)
+
+    def test_attempt_detail(self):
+        self.assert_flat(lambda attempt: f'/api/results/attempts/{attempt.pk}/', 2)
+
+    def test_public_profile(self):
+        self.assert_flat(lambda attempt: f'/api/auth/profile/{self.owner.pk}/', 4)
+
+    def test_course_completers(self):
+        self.assert_flat(lambda attempt: f'/api/courses/{attempt.exam.course.slug}/completers/', 2)
+
+    def test_annotated_like_state(self):
+        attempt = self.add_certificates(1)
+        data = self.client.get(f'/api/results/attempts/{attempt.pk}/').data
+        self.assertEqual(data['likes_count'], 1)
+        self.assertTrue(data['is_liked'])
+        self.assertEqual(len(data['comments']), 2)
+
+
+
+class AttemptCompletedJobTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(f'student{i}') for i in range(3)]
+        self.exam = Exam.objects.create(course=Course.objects.create(title='Algebra', description='-'), title='Final')
+
+    def submit(self, user, earned_points, minutes):
+        attempt = ExamAttempt.objects.create(
+            user=user, exam=self.exam, score=80, earned_points=earned_points,
+            time_taken=minutes * 60, is_passed=bool(earned_points),
+        )
+        Job.enqueue('attempt_completed', attempt_id=attempt.pk)
+
+    def submit_burst(self):
+        # 5 attempts by one user, 2 by another, none by the third
+        for points in (100, 0, 250, 40, 1000):
+            self.submit(self.users[0], points, 10)
+        self.submit(self.users[1], 300, 5)
+        self.submit(self.users[1], 300, 5)
+
+    def assertApplied(self):
+        totals = {user.username: (user.total_score, user.study_time, user.level) for user in User.objects.all()}
+        self.assertEqual(totals, {'student0': (1390, 50, 2), 'student1': (600, 10, 1), 'student2': (0, 0, 1)})
+        ranks = dict(User.objects.with_rank().values_list('username', 'rank'))
+        self.assertEqual(ranks, {'student0': 1, 'student1': 2, 'student2': 3})
+        daily = DailyScore.objects.get(user=self.users[0])
+        self.assertEqual((daily.earned_points, daily.attempts, daily.study_minutes), (1390, 5, 50))
+        self.assertEqual(LeaderboardEntry.objects.get(period='weekly', user=self.users[1]).score, 600)
+
+    def test_burst_is_coalesced_per_user(self):
+        self.submit_burst()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(Job.run_batch(), 7)
+        self.assertApplied()
+        # One score update per user, however many attempts they submitted
+        score_updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "users_user"')]
+        self.assertEqual(len(score_updates), 2)
+
+    def test_large_burst_rebuilds_ranks_once(self):
+        self.submit_burst()
+        with mock.patch('results.jobs.RANK_REBUILD_THRESHOLD', 1), \
+                mock.patch.object(User, 'update_ranks', wraps=User.update_ranks) as update_ranks:
+            Job.run_batch()
+        update_ranks.assert_called_once_with()
+        self.assertApplied()
+
+
+class LeaderboardPeriodTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(f'student{i}') for i in range(4)]
+        self.exam = Exam.objects.create(course=Course.objects.create(title='Algebra', description='-'), title='Final')
+        self.today = timezone.localdate()
+
+    def attempt(self, user, earned_points, days_ago):
+        attempt = ExamAttempt.objects.create(
+            user=user, exam=self.exam, score=80, earned_points=earned_points, time_taken=600, is_passed=bool(earned_points),
+        )
+        ExamAttempt.objects.filter(pk=attempt.pk).update(completed_at=timezone.now() - datetime.timedelta(days=days_ago))
+        return ExamAttempt.objects.get(pk=attempt.pk)
+
+    def board(self, period):
+        return [(entry.user.username, entry.score) for entry in LeaderboardEntry.top(period)]
+
+    def test_record_stats_feeds_the_periods(self):
+        first, second = self.users[:2]
+        ExamAttempt.record_stats([
+            self.attempt(first, 100, 0), self.attempt(first, 0, 0), self.attempt(first, 50, 10),
+            self.attempt(first, 20, 40), self.attempt(second, 120, 6), self.attempt(second, 30, 7),
+        ])
+        self.assertEqual(self.board('weekly'), [('student1', 120), ('student0', 100)])
+        self.assertEqual(self.board('monthly'), [('student0', 150), ('student1', 150)])
+        today = DailyScore.objects.get(user=first, day=self.today)
+        self.assertEqual((today.earned_points, today.attempts, today.study_minutes), (100, 2, 20))
+        self.assertEqual(DailyScore.objects.filter(user=first).count(), 3)
+
+        # Increments add up with what is there
+        ExamAttempt.record_stats([self.attempt(second, 5, 0)])
+        self.assertEqual(LeaderboardEntry.objects.get(period='weekly', user=second).score, 125)
+
+    def test_rebuild_drops_days_that_left_the_window(self):
+        for user, points, days_ago in ((self.users[0], 100, 0), (self.users[0], 40, 6), (self.users[1], 70, 7),
+                                       (self.users[2], 90, 29), (self.users[3], 0, 1)):
+            DailyScore.objects.create(user=user, day=self.today - datetime.timedelta(days=days_ago), earned_points=points)
+        # A stale entry, e.g. incremented on a day that has since aged out
+        LeaderboardEntry.objects.create(period='weekly', user=self.users[2], score=500)
+
+        out = StringIO()
+        call_command('refresh_leaderboards', stdout=out)
+        self.assertIn('Rebuilt weekly leaderboard.', out.getvalue())
+        self.assertEqual(self.board('weekly'), [('student0', 140)])
+        self.assertEqual(self.board('monthly'), [('student0', 140), ('student2', 90), ('student1', 70)])
+
+        # A day later the oldest days drop out of each window
+        tomorrow = self.today + datetime.timedelta(days=1)
+        LeaderboardEntry.rebuild('weekly', today=tomorrow)
+        LeaderboardEntry.rebuild('monthly', today=tomorrow)
+        self.assertEqual(self.board('weekly'), [('student0', 100)])
+        self.assertEqual(self.board('monthly'), [('student0', 140), ('student1', 70)])
+        LeaderboardEntry.rebuild('weekly', today=self.today + datetime.timedelta(days=7))
+        self.assertEqual(self.board('weekly'), [])
+
+    def test_top_and_weekly_endpoint(self):
+        for user, score in zip(self.users, (30, 50, 50, 0)):
+            LeaderboardEntry.objects.create(period='weekly', user=user, score=score)
+        # Ties go to the lower user id; users without points aren't listed
+        self.assertEqual(self.board('weekly'), [('student1', 50), ('student2', 50), ('student0', 30)])
+        self.assertEqual(len(LeaderboardEntry.top('weekly', limit=2)), 2)
+        data = APIClient().get('/api/auth/leaderboard/', {'period': 'weekly'}).data
+        self.assertEqual([(row['username'], row['total_score']) for row in data],
+                         [('student1', 50), ('student2', 50), ('student0', 30)])
+
+
+class CertificateCounterTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'pass')
+        course = Course.objects.create(title='Algebra', description='-')
+        exam = Exam.objects.create(course=course, title='Final')
+        self.attempt = ExamAttempt.objects.create(
+            user=self.owner, exam=exam, score=90, earned_points=100, time_taken=60, is_passed=True
+        )
+        self.client = APIClient()
+
+    def toggle(self, user):
+        self.client.force_authenticate(user)
+        response = self.client.post(f'/api/results/attempts/{self.attempt.pk}/like/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_toggle_cost_does_not_grow_with_likes(self):
+        fans = [User.objects.create_user(f'fan{i}', password='pass') for i in range(20)]
+        for fan in fans[:-1]:
+            self.toggle(fan)
+        # Look up, delete or insert, bump, read back and touch the owner if due, plus savepoints
+        with self.assertNumQueries(10):
+            self.assertEqual(self.toggle(fans[-1]), {'liked': True, 'likes_count': 20})
+        with self.assertNumQueries(7):
+            self.assertEqual(self.toggle(fans[0]), {'liked': False, 'likes_count': 19})
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.likes_count, CertificateLike.objects.filter(attempt=self.attempt).count())
+
+    def test_owner_row_written_once_per_interval(self):
+        fans = [User.objects.create_user(f'fan{i}', password='pass') for i in range(3)]
+        User.objects.filter(pk=self.owner.pk).update(updated_at=timezone.now() - datetime.timedelta(hours=1))
+        self.toggle(fans[0])
+        touched = User.objects.get(pk=self.owner.pk).updated_at
+        self.assertGreater(touched, timezone.now() - datetime.timedelta(minutes=1))
+        for fan in fans:
+            self.toggle(fan)
+        self.client.post(f'/api/results/attempts/{self.attempt.pk}/comments/', {'text': 'Congrats'})
+        self.assertEqual(User.objects.get(pk=self.owner.pk).updated_at, touched)
+
+    def test_comments_are_counted(self):
+        self.client.force_authenticate(self.owner)
+        for text in ('Thanks', 'Thanks again'):
+            self.client.post(f'/api/results/attempts/{self.attempt.pk}/comments/', {'text': text})
+        data = self.client.get(f'/api/results/attempts/{self.attempt.pk}/').data
+        self.assertEqual(data['comments_count'], 2)
+
+    def test_reconcile_repairs_drift(self):
+        self.toggle(self.owner)
+        fan = User.objects.create_user('fan', password='pass')
+        self.toggle(fan)
+        # Deleting a user cascades to their likes without touching the counter
+        fan.delete()
+        ExamAttempt.objects.filter(pk=self.attempt.pk).update(comments_count=7)
+
+        output = StringIO()
+        call_command('reconcile_counters', stdout=output)
+        self.assertIn('Fixed the counters of 1 attempts', output.getvalue())
+        self.attempt.refresh_from_db()
+        self.assertEqual((self.attempt.likes_count, self.attempt.comments_count), (1, 0))
+
+class CertificateFileTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'pass', first_name='Ada')
+        self.course = Course.objects.create(title='Algebra', description='-')
+        exam = Exam.objects.create(course=self.course, title='Final')
+        self.attempt = ExamAttempt.objects.create(
+            user=self.owner, exam=exam, score=90, earned_points=100, time_taken=60, is_passed=True
+        )
+        self.client = APIClient()
+
+    def urls(self):
+        return self.client.get(f'/api/results/attempts/{self.attempt.pk}/').data['certificate_urls']
+
+    def test_rendered_once_then_served_from_disk(self):
+        for ext, content_type, magic in (('png', 'image/png', b'\x89PNG'), ('pdf', 'application/pdf', b'%PDF')):
+            url = self.urls()[ext]
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], content_type)
+            self.assertTrue(b''.join(response.streaming_content).startswith(magic))
+            with self.assertNumQueries(0):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('immutable', response['Cache-Control'])
+
+    def test_changed_inputs_get_a_new_file(self):
+        old = self.urls()['png']
+        self.client.get(old)
+        self.course.title = 'Linear algebra'
+        self.course.save()
+        new = self.urls()['png']
+        self.assertNotEqual(old, new)
+
+        # The old file is still there for anyone who cached its URL
+        self.assertEqual(self.client.get(old).status_code, 200)
+        # The stable link points at the current one
+        response = self.client.get(f'/api/results/attempts/{self.attempt.pk}/certificate.png')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(new.endswith(response['Location']))
+        self.assertTrue(default_storage.exists(f"{certificates.DIRECTORY}/{new.rsplit('/', 1)[1]}"))
+
+    def test_stale_or_unknown_names(self):
+        stale = self.urls()['png']
+        self.course.title = 'Linear algebra'
+        self.course.save()
+        response = self.client.get(stale)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(self.urls()['png'].endswith(response['Location']))
+
+        self.assertEqual(self.client.get('/media/certificates/../settings.py').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/results/attempts/{self.attempt.pk}/certificate.gif').status_code, 404)
+        self.attempt.is_passed = False
+        self.attempt.save()
+        self.assertIsNone(self.urls())
+        self.assertEqual(self.client.get(f'/api/results/attempts/{self.attempt.pk}/certificate.pdf').status_code, 404)
+
+    def test_files_appear_only_when_complete(self):
+        replace = certificates.os.replace
+
+        def checked_replace(src, dst):
+            # The final name must not exist until the whole file has been written
+            self.assertFalse(os.path.exists(dst))
+            self.assertTrue(open(src, 'rb').read().startswith(b'\x89PNG'))
+            replace(src, dst)
+
+        with mock.patch.object(certificates.os, 'replace', side_effect=checked_replace) as patched:
+            self.assertEqual(self.client.get(self.urls()['png']).status_code, 200)
+        patched.assert_called_once()
+        self.assertEqual(default_storage.listdir(certificates.DIRECTORY)[1], [self.urls()['png'].rsplit('/', 1)[1]])
+
+    def test_backfill_and_prune(self):
+        out = StringIO()
+        call_command('backfill_certificates', stdout=out)
+        self.assertIn('Rendered 2 certificates', out.getvalue())
+        old = {ext: url.rsplit('/', 1)[1] for ext, url in self.urls().items()}
+        self.course.title = 'Linear algebra'
+        self.course.save()
+        self.client.get(self.urls()['png'])
+        with default_storage.open(f'{certificates.DIRECTORY}/{certificates.TEMP_PREFIX}abc', 'wb') as file:
+            file.write(b'partial')
+        stale = os.path.join(settings.MEDIA_ROOT, certificates.DIRECTORY, f'{certificates.TEMP_PREFIX}abc')
+        os.utime(stale, (0, 0))
+
+        out = StringIO()
+        call_command('backfill_certificates', '--prune', formats='', stdout=out)
+        self.assertIn('Deleted 3 superseded', out.getvalue())
+        self.assertEqual(default_storage.listdir(certificates.DIRECTORY)[1], [self.urls()['png'].rsplit('/', 1)[1]])
+        self.assertNotIn(old['png'], default_storage.listdir(certificates.DIRECTORY)[1])
@@ -1,12 +1,13 @@
 from django.urls import path
 from .views import (
     UserExamAttemptListView, ExamAttemptDetailView, 
-    CertificateCommentListCreateView, CertificateLikeToggleView
+    CertificateCommentListCreateView, CertificateLikeToggleView, CertificateFileView
 )
 
 urlpatterns = [
     path('history/', UserExamAttemptListView.as_view(), name='exam-history'),
     path('attempts/<int:pk>/', ExamAttemptDetailView.as_view(), name='attempt-detail'),
+    path('attempts/<int:pk>/certificate.<str:ext>', CertificateFileView.as_view(), name='attempt-certificate'),
     path('attempts/<int:pk>/comments/', CertificateCommentListCreateView.as_view(), name='attempt-comments'),
     path('attempts/<int:pk>/like/', CertificateLikeToggleView.as_view(), name='attempt-like'),
 ]
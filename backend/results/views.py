@@ -1,38 +1,119 @@
+import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import Http404
+from django.shortcuts import get_object_or_404, redirect
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
 from rest_framework import generics, permissions, views, status
 from rest_framework.response import Response
+from core.images import CACHE_CONTROL
+from core.async_views import AsyncRetrieveAPIView
+from core.fieldsets import SparseFieldsetMixin
+from core.pagination import AttemptCursorPagination, CommentCursorPagination
+from users.models import User
+from . import certificates
 from .models import ExamAttempt, CertificateComment, CertificateLike
 from .serializers import ExamAttemptSerializer, CertificateCommentSerializer
 
-class UserExamAttemptListView(generics.ListAPIView):
+# Likes and comments touch the certificate owner's profile (for its ETag) at
+# most this often, instead of writing the owner's row on every one of them
+PROFILE_TOUCH_INTERVAL = datetime.timedelta(minutes=1)
+
+class UserExamAttemptListView(SparseFieldsetMixin, generics.ListAPIView):
     serializer_class = ExamAttemptSerializer
     permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = AttemptCursorPagination
 
     def get_queryset(self):
-        return ExamAttempt.objects.filter(user=self.request.user).order_by('-completed_at')
+        return ExamAttempt.objects.filter(user=self.request.user).for_certificates(
+            self.request.user, self.get_fieldset()
+        ).order_by('-completed_at', '-id')
 
-class ExamAttemptDetailView(generics.RetrieveAPIView):
-    queryset = ExamAttempt.objects.all()
+class ExamAttemptDetailView(SparseFieldsetMixin, AsyncRetrieveAPIView):
     serializer_class = ExamAttemptSerializer
     permission_classes = (permissions.AllowAny,) 
 
-class CertificateCommentListCreateView(generics.ListCreateAPIView):
+    def get_queryset(self):
+        return ExamAttempt.objects.for_certificates(self.request.user, self.get_fieldset())
+
+def certificate_attempt(pk):
+    return get_object_or_404(certificates.attempts(), pk=pk)
+
+def certificate_url(attempt, ext):
+    name = certificates.ensure(attempt, ext).removeprefix(f'{certificates.DIRECTORY}/')
+    return reverse('certificate-file', kwargs={'name': name})
+
+class CertificateFileView(views.APIView):
+    """Stable link to an attempt's certificate: one query, then a redirect to the rendered file."""
+    permission_classes = (permissions.AllowAny,)
+
+    def get(self, request, pk, ext):
+        if ext not in ('png', 'pdf'):
+            raise Http404
+        response = redirect(certificate_url(certificate_attempt(pk), ext))
+        # The target changes when a name or title on the certificate does
+        patch_cache_control(response, public=True, max_age=300)
+        return response
+
+def serve_certificate(request, name):
+    """Serve a rendered certificate straight from disk, rendering it first if it isn't there yet.
+
+    The name holds a hash of everything on the certificate, so the file can be
+    cached forever. A name that is no longer current redirects to the current one.
+    """
+    match = certificates.NAME_PATTERN.fullmatch(name)
+    if match is None:
+        raise Http404
+    if not default_storage.exists(f'{certificates.DIRECTORY}/{name}'):
+        url = certificate_url(certificate_attempt(match['pk']), match['ext'])
+        if not url.endswith(f'/{name}'):
+            return redirect(url)
+    response = serve(request, name, document_root=Path(settings.MEDIA_ROOT) / certificates.DIRECTORY)
+    response['Cache-Control'] = CACHE_CONTROL
+    return response
+
+class CertificateCommentListCreateView(SparseFieldsetMixin, generics.ListCreateAPIView):
     serializer_class = CertificateCommentSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    pagination_class = CommentCursorPagination
 
     def get_queryset(self):
-        return CertificateComment.objects.filter(attempt_id=self.kwargs['pk']).order_by('-created_at')
+        return self.narrow(CertificateComment.objects.filter(attempt_id=self.kwargs['pk']).select_related('user')).order_by('-created_at', '-id')
 
     def perform_create(self, serializer):
-        attempt = generics.get_object_or_404(ExamAttempt, pk=self.kwargs['pk'])
-        serializer.save(user=self.request.user, attempt=attempt)
+        attempt = generics.get_object_or_404(ExamAttempt.objects.only('user_id'), pk=self.kwargs['pk'])
+        with transaction.atomic():
+            serializer.save(user=self.request.user, attempt=attempt)
+            ExamAttempt.objects.filter(pk=attempt.pk).update(comments_count=F('comments_count') + 1)
+        User.touch(attempt.user_id, at_most_every=PROFILE_TOUCH_INTERVAL)
 
 class CertificateLikeToggleView(views.APIView):
     permission_classes = (permissions.IsAuthenticated,)
 
     def post(self, request, pk):
-        attempt = generics.get_object_or_404(ExamAttempt, pk=pk)
-        like, created = CertificateLike.objects.get_or_create(user=request.user, attempt=attempt)
-        if not created:
-            like.delete()
-            return Response({'liked': False, 'likes_count': attempt.likes.count()})
-        return Response({'liked': True, 'likes_count': attempt.likes.count()})
+        # Constant work however many likes the attempt has: no counting, and the
+        # like row is deleted or inserted without being loaded first
+        attempt = generics.get_object_or_404(ExamAttempt.objects.only('user_id'), pk=pk)
+        with transaction.atomic():
+            if CertificateLike.objects.filter(user=request.user, attempt=attempt).delete()[0]:
+                liked, delta = False, -1
+            else:
+                liked, delta = True, 1
+                try:
+                    with transaction.atomic():
+                        CertificateLike.objects.create(user=request.user, attempt=attempt)
+                except IntegrityError:
+                    # A concurrent toggle from the same user inserted it first
+                    delta = 0
+            attempts = ExamAttempt.objects.filter(pk=pk)
+            if delta:
+                attempts.update(likes_count=F('likes_count') + delta)
+            likes_count = attempts.values_list('likes_count', flat=True).get()
+        User.touch(attempt.user_id, at_most_every=PROFILE_TOUCH_INTERVAL)
+        return Response({'liked': liked, 'likes_count': likes_count})
@@ -8,5 +8,9 @@ class CustomUserAdmin(UserAdmin):
     fieldsets = UserAdmin.fieldsets + (
         ('Gaming Stats', {'fields': ('avatar', 'bio', 'total_score', 'rank', 'level')}),
     )
+    readonly_fields = ('rank',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_rank()
 
 admin.site.register(User, CustomUserAdmin)
@@ -0,0 +1,76 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from .models import AUTH_CACHED_FIELDS, AuthenticatedUser, User, auth_cache_key
+
+# Columns permission checks read, in model order as Model.from_db expects
+CACHED_FIELDS = [field.attname for field in User._meta.concrete_fields if field.attname in AUTH_CACHED_FIELDS]
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication without a user SELECT on every request.
+
+    The columns permission checks need are cached for AUTH_USER_CACHE_SECONDS
+    and dropped whenever they are written or the user is deleted (see User
+    and UserQuerySet); every other field is loaded lazily, in one query, only
+    if a view touches it. With AUTH_USER_CACHE_SECONDS = 0 those columns are
+    read on every request.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Needs the password hash, which is deliberately not cached
+            return super().get_user(validated_token)
+        key = auth_cache_key(self.get_user_id(validated_token))
+        values = cache.get(key) if settings.AUTH_USER_CACHE_SECONDS else None
+        if values is None:
+            values = self.load(validated_token).first()
+            if values is None:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            if settings.AUTH_USER_CACHE_SECONDS:
+                cache.set(key, values, settings.AUTH_USER_CACHE_SECONDS)
+        return self.build(values)
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views (see core.async_views.AsyncAPIView)."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            return await sync_to_async(super().get_user)(validated_token)
+        key = auth_cache_key(self.get_user_id(validated_token))
+        values = await cache.aget(key) if settings.AUTH_USER_CACHE_SECONDS else None
+        if values is None:
+            values = await self.load(validated_token).afirst()
+            if values is None:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            if settings.AUTH_USER_CACHE_SECONDS:
+                await cache.aset(key, values, settings.AUTH_USER_CACHE_SECONDS)
+        return self.build(values)
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as exc:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from exc
+
+    def load(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        return User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).values_list(*CACHED_FIELDS)
+
+    def build(self, values):
+        user = AuthenticatedUser.from_db(User.objects.db, CACHED_FIELDS, values)
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
@@ -1,6 +1,5 @@
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
-from django.db.models import Q
 
 User = get_user_model()
 
@@ -8,16 +7,19 @@ class EmailOrUsernameModelBackend(ModelBackend):
     def authenticate(self, request, username=None, password=None, **kwargs):
         if username is None:
             username = kwargs.get(User.USERNAME_FIELD)
-        
-        users = User.objects.filter(Q(username__iexact=username) | Q(email__iexact=username))
-        
-        if not users.exists():
+        if username is None or password is None:
+            return None
+
+        # One indexed lookup resolves at most one user, so exactly one
+        # password hash is computed per attempt, found or not.
+        user = User.for_login(username)
+
+        if user is None:
             # Run the default password hasher once to reduce the timing
             # difference between an existing and a nonexistent user (@S37).
             User().set_password(password)
             return None
 
-        for user in users:
-            if user.check_password(password) and self.user_can_authenticate(user):
-                return user
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
         return None
@@ -0,0 +1,117 @@
+import random
+import statistics
+import threading
+import time
+
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import MD5PasswordHasher, get_hasher, make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from users.models import User
+
+hashes = 0
+hashes_lock = threading.Lock()
+
+
+def counting(hasher_class):
+    """Subclass a password hasher so every hash computed during the run is counted."""
+    def encode(self, password, salt, *args, **kwargs):
+        global hashes
+        with hashes_lock:
+            hashes += 1
+        return hasher_class.encode(self, password, salt, *args, **kwargs)
+
+    return type(f'Counting{hasher_class.__name__}', (hasher_class,), {'encode': encode})
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure login throughput at exam start: many concurrent authenticate() calls mixing '
+        'usernames, emails in other letter case, wrong passwords and unknown users. Reports '
+        'queries and password hashes per attempt. Creates and deletes its own users.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--attempts', type=int, default=400)
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--fast-hasher', action='store_true',
+                            help='Hash with MD5 to measure the lookup cost alone.')
+
+    def handle(self, *args, **options):
+        base = MD5PasswordHasher if options['fast_hasher'] else get_hasher('default').__class__
+        hasher = counting(base)
+        # Registered under the command's module so make_password/check_password can load it
+        globals()[hasher.__name__] = hasher
+
+        with override_settings(PASSWORD_HASHERS=[f'{__name__}.{hasher.__name__}']):
+            tag = f'bench-login-{int(time.time())}'
+            password = make_password('secret')
+            User.objects.bulk_create(
+                (User(username=f'{tag}-{i}', email=f'{tag}-{i}@example.com', password=password)
+                 for i in range(options['users'])),
+                batch_size=1000,
+            )
+            try:
+                self.run(tag, options)
+            finally:
+                User.objects.filter(username__startswith=f'{tag}-').delete()
+
+    def run(self, tag, options):
+        global hashes
+        rng = random.Random(42)
+        logins = []
+        for _ in range(options['attempts']):
+            i = rng.randrange(options['users'])
+            logins.append(rng.choice([
+                (f'{tag}-{i}', 'secret', True),
+                (f'{tag}-{i}@EXAMPLE.com'.upper(), 'secret', True),
+                (f'{tag}-{i}', 'wrong', False),
+                (f'nobody-{i}', 'secret', False),
+            ]))
+
+        timings, queries, failures = [], [], []
+        lock = threading.Lock()
+        pending = iter(logins)
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        attempt = next(pending, None)
+                    if attempt is None:
+                        return
+                    login, password, should_pass = attempt
+                    with CaptureQueriesContext(connection) as captured:
+                        started = time.perf_counter()
+                        user = authenticate(username=login, password=password)
+                        elapsed = (time.perf_counter() - started) * 1000
+                    with lock:
+                        timings.append(elapsed)
+                        queries.append(len(captured))
+                        if (user is not None) != should_pass:
+                            failures.append(login)
+            finally:
+                connection.close()
+
+        hashes = 0
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        timings.sort()
+        self.stdout.write(
+            f"{len(timings)} logins against {options['users']} users with {options['threads']} threads: "
+            f'{len(timings) / wall:.1f}/s, p50 {statistics.median(timings):.1f} ms, '
+            f'p95 {timings[int(len(timings) * 0.95) - 1]:.1f} ms'
+        )
+        self.stdout.write(
+            f'{sum(queries) / len(queries):.2f} queries and {hashes / len(timings):.2f} password hashes per attempt'
+        )
+        if failures:
+            self.stderr.write(self.style.ERROR(f'{len(failures)} wrong results, first: {failures[0]}'))
@@ -0,0 +1,92 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+from courses.models import Course
+from exams.models import Choice, Exam, Question
+from jobs.models import Job
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure exam submission latency, and the job that applies its score and rank, as the user '
+        'table grows. Most users sit at score 0 like on the live site. All data is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000,1000000',
+                            help='Comma separated user table sizes to measure.')
+        parser.add_argument('--samples', type=int, default=200,
+                            help='Number of passing submissions per size.')
+        parser.add_argument('--zero-share', type=float, default=0.8,
+                            help='Share of users who never passed an exam (score 0).')
+
+    def score(self, rng, zero_share):
+        if rng.random() < zero_share:
+            return 0
+        # Long tail: a few users far ahead, most just past their first exams
+        return int(rng.expovariate(1 / 2000)) // 10 * 10
+
+    def exam(self):
+        course = Course.objects.create(title='Benchmark course', slug='benchmark-course-ranks', description='-')
+        exam = Exam.objects.create(course=course, title='Benchmark exam', passing_score=50)
+        answers = {}
+        for i in range(10):
+            question = Question.objects.create(exam=exam, text=f'Question {i}', points=10)
+            right, wrong = Choice.objects.bulk_create([
+                Choice(question=question, text='right', is_correct=True), Choice(question=question, text='wrong'),
+            ])
+            answers[str(question.pk)] = right.pk
+        return exam, answers
+
+    def percentiles(self, timings):
+        timings = sorted(timings)
+        return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+    @override_settings(JOBS_EAGER=False)
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        rng = random.Random(42)
+        client = APIClient()
+
+        self.stdout.write(
+            f"{'users':>10} {'at 0':>9} {'rebuild ms':>11} {'submit p50':>11} {'p95':>7} {'job p50':>8} {'p95':>7}"
+        )
+        for size in sizes:
+            with transaction.atomic():
+                User.objects.bulk_create(
+                    (User(username=f'bench_rank_{i}', password='!', total_score=self.score(rng, options['zero_share']))
+                     for i in range(size)),
+                    batch_size=5000,
+                )
+                started = time.perf_counter()
+                User.update_ranks()
+                rebuild_ms = (time.perf_counter() - started) * 1000
+                exam, answers = self.exam()
+
+                ids = list(User.objects.filter(username__startswith='bench_rank_').values_list('pk', flat=True))
+                submit_timings, job_timings = [], []
+                for pk in rng.sample(ids, min(options['samples'], len(ids))):
+                    client.force_authenticate(User.objects.get(pk=pk))
+                    started = time.perf_counter()
+                    response = client.post(f'/api/exams/{exam.pk}/submit/', {'answers': answers, 'time_taken': 60}, format='json')
+                    submit_timings.append((time.perf_counter() - started) * 1000)
+                    assert response.status_code == 201, response.status_code
+                    # The worker's share: totals, daily rollup, leaderboards and the rank shift
+                    started = time.perf_counter()
+                    Job.run_batch()
+                    job_timings.append((time.perf_counter() - started) * 1000)
+
+                at_zero = User.objects.filter(username__startswith='bench_rank_', total_score=0).count()
+                submit_p50, submit_p95 = self.percentiles(submit_timings)
+                job_p50, job_p95 = self.percentiles(job_timings)
+                self.stdout.write(
+                    f'{size:>10} {at_zero:>9} {rebuild_ms:>11.1f} {submit_p50:>11.2f} {submit_p95:>7.2f} '
+                    f'{job_p50:>8.2f} {job_p95:>7.2f}'
+                )
+                transaction.set_rollback(True)
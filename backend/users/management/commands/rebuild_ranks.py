@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Recompute every user rank from total_score in a single statement.'
+
+    def handle(self, *args, **options):
+        User.update_ranks()
+        self.stdout.write(self.style.SUCCESS('Ranks rebuilt.'))
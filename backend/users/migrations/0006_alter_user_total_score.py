@@ -0,0 +1,32 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:01
+
+from django.db import migrations, models
+
+
+def rebuild_ranks(apps, schema_editor):
+    # Ranks are now shared between tied users; rebuild them once so the
+    # incremental updates in User.shift_rank start from a consistent state.
+    User = apps.get_model('users', 'User')
+    qn = schema_editor.connection.ops.quote_name
+    table = qn(User._meta.db_table)
+    schema_editor.execute(
+        f'UPDATE {table} SET {qn("rank")} = ranked.position FROM ('
+        f'SELECT id, RANK() OVER (ORDER BY total_score DESC) AS position FROM {table}'
+        f') AS ranked WHERE {table}.id = ranked.id'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_alter_user_email_alter_user_first_name_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='total_score',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(rebuild_ranks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0006_alter_user_total_score'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='total_score',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['-total_score', 'id'], name='user_score_idx'),
+        ),
+    ]
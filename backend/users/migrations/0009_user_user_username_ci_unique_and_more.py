@@ -0,0 +1,43 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:36
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def check_duplicates(apps, schema_editor):
+    # Refuse to guess which account keeps a shared name; list them for an admin to fix
+    User = apps.get_model('users', 'User')
+    clashes = []
+    for field in ('username', 'email'):
+        duplicates = (
+            User.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+            .values(key=Lower(field)).annotate(count=Count('id')).filter(count__gt=1).values_list('key', flat=True)
+        )
+        clashes += [f'{field} {key!r}' for key in duplicates]
+    if clashes:
+        raise RuntimeError(
+            'These values are used by more than one user when case is ignored; make them unique first: '
+            + ', '.join(clashes)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0008_user_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('username'), name='user_username_ci_unique', violation_error_message='A user with that username already exists.'),
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), condition=models.Q(('email__gt', '')), name='user_email_ci_unique', violation_error_message='A user with that email already exists.'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:40
+
+import django.contrib.auth.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_user_user_username_ci_unique_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthenticatedUser',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('users.user',),
+            managers=[
+                ('objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+    ]
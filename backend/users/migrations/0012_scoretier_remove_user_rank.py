@@ -0,0 +1,44 @@
+# Generated by Django 6.0.2 on 2026-10-18 15:23
+
+import users.models
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    ScoreTier = apps.get_model('users', 'ScoreTier')
+    tiers, above = [], 0
+    for row in User.objects.order_by('-total_score').values('total_score').annotate(users=Count('id')):
+        tiers.append(ScoreTier(score=row['total_score'], users=row['users'], rank=above + 1))
+        above += row['users']
+    ScoreTier.objects.bulk_create(tiers, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_user_avatar_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreTier',
+            fields=[
+                ('score', models.IntegerField(primary_key=True, serialize=False)),
+                ('users', models.IntegerField(default=0)),
+                ('rank', models.IntegerField(default=1)),
+            ],
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', users.models.UserManager()),
+            ],
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='rank',
+        ),
+    ]
@@ -1,18 +1,124 @@
-from django.db import models
-from django.contrib.auth.models import AbstractUser
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Lower
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
+from rest_framework.exceptions import AuthenticationFailed
+from core import images
+
+# Columns CachedJWTAuthentication caches per user; writing any of them drops the entry
+AUTH_CACHED_FIELDS = {'id', 'username', 'is_active', 'is_staff', 'is_superuser', 'role'}
+
+def auth_cache_key(pk):
+    return f'auth-user:{pk}'
+
+# Rank is "1 + number of users with a strictly higher score", so tied users
+# share a rank. It is stored once per distinct score in ScoreTier rather than
+# on every user: a score change then only moves the tiers in between, however
+# many users (e.g. every new user at 0) share a score.
+
+# Above this many users changing score in one queryset update or delete, the
+# tiers are rebuilt in one pass instead of moving each user.
+TIER_MOVE_LIMIT = 100
+
+class ScoreTier(models.Model):
+    """The users with one total_score: how many there are and the rank they share."""
+    score = models.IntegerField(primary_key=True)
+    users = models.IntegerField(default=0)
+    rank = models.IntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.score} - {self.users} - {self.rank}"
+
+    @classmethod
+    def move(cls, old_score, new_score, count=1):
+        """Move count users from the old_score tier to the new_score one.
+
+        old_score is None for new users and new_score None for deleted ones.
+        Only the tiers between the two scores change; a tier left empty is
+        deleted.
+        """
+        if old_score == new_score:
+            return
+        with transaction.atomic():
+            if new_score is not None:
+                # Ranked before the move so the range update below applies to it too
+                above = cls.objects.filter(score__gt=new_score).order_by('score').first()
+                cls.objects.get_or_create(score=new_score, defaults={'rank': above.rank + above.users if above else 1})
+                cls.objects.filter(score=new_score).update(users=F('users') + count)
+            if old_score is not None:
+                cls.objects.filter(score=old_score).update(users=F('users') - count)
+                cls.objects.filter(score=old_score, users__lte=0).delete()
+
+            if old_score is None:
+                cls.objects.filter(score__lt=new_score).update(rank=F('rank') + count)
+            elif new_score is None:
+                cls.objects.filter(score__lt=old_score).update(rank=F('rank') - count)
+            elif new_score > old_score:
+                cls.objects.filter(score__gte=old_score, score__lt=new_score).update(rank=F('rank') + count)
+            else:
+                cls.objects.filter(score__gte=new_score, score__lt=old_score).update(rank=F('rank') - count)
+
+def rank_of(score):
+    """Expression for the rank of the total_score column named score, e.g. 'user__total_score'."""
+    return Coalesce(Subquery(ScoreTier.objects.filter(score=OuterRef(score)).values('rank')[:1]), 1)
+
+class UserQuerySet(models.QuerySet):
+    def with_rank(self):
+        """Annotate rank, so a list of users doesn't look up each rank on its own."""
+        return self.annotate(rank=rank_of('total_score'))
+
+    def update(self, **kwargs):
+        if 'total_score' not in kwargs and AUTH_CACHED_FIELDS.isdisjoint(kwargs):
+            return super().update(**kwargs)
+        with transaction.atomic():
+            before = dict(self.select_for_update().order_by().values_list('pk', 'total_score'))
+            updated = super().update(**kwargs)
+            if 'total_score' in kwargs:
+                if len(before) > TIER_MOVE_LIMIT:
+                    User.update_ranks()
+                else:
+                    after = User.objects.filter(pk__in=before).order_by().values_list('pk', 'total_score')
+                    moves = Counter((before[pk], score) for pk, score in after if score != before[pk])
+                    for (old_score, new_score), count in moves.items():
+                        ScoreTier.move(old_score, new_score, count)
+        cache.delete_many([auth_cache_key(pk) for pk in before])
+        return updated
+
+    def delete(self):
+        with transaction.atomic():
+            rows = list(self.order_by().values_list('pk', 'total_score'))
+            deleted = super().delete()
+            if len(rows) > TIER_MOVE_LIMIT:
+                User.update_ranks()
+            else:
+                for score, count in Counter(score for pk, score in rows).items():
+                    ScoreTier.move(score, None, count)
+        cache.delete_many([auth_cache_key(pk) for pk, score in rows])
+        return deleted
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
+    pass
 
 class User(AbstractUser):
     first_name = models.CharField(max_length=150, blank=True)
     last_name = models.CharField(max_length=150, blank=True)
     avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
+    # Resized copies of avatar, see core.images
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
     bio = models.TextField(max_length=500, blank=True)
     birth_date = models.DateField(null=True, blank=True)
     phone_number = models.CharField(max_length=20, blank=True)
     email = models.EmailField(blank=True, null=True)
     total_score = models.IntegerField(default=0)
-    rank = models.IntegerField(default=0)
     level = models.IntegerField(default=1)
     study_time = models.IntegerField(default=0)  # Total study time in minutes
+    # Changes whenever anything on the public profile changes (see touch)
+    updated_at = models.DateTimeField(auto_now=True)
 
     ROLE_CHOICES = (
         ('student', 'Student'),
@@ -21,20 +127,173 @@ class User(AbstractUser):
     )
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='student')
 
+    objects = UserManager()
+
     def save(self, *args, **kwargs):
         # Calculate level: 1 level per 1000 XP
         self.level = (self.total_score // 1000) + 1
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        writes_score = update_fields is None or 'total_score' in update_fields
+        with transaction.atomic():
+            stored = None  # No tier yet for a new user
+            if writes_score and not self._state.adding:
+                # Locked so the worker can't move the score between this read and the write
+                stored = User.objects.filter(pk=self.pk).select_for_update().order_by().values_list(
+                    'total_score', flat=True
+                ).first()
+            super().save(*args, **kwargs)
+            if writes_score and stored != self.total_score:
+                ScoreTier.move(stored, self.total_score)
+                self.__dict__.pop('_rank', None)
+        # Profile and staff edits must not be served from the authentication cache
+        cache.delete(auth_cache_key(self.pk))
+        images.queue_variants(self, 'avatar')
+
+    def delete(self, *args, **kwargs):
+        pk = self.pk
+        with transaction.atomic():
+            # The worker may have moved the score since this instance was loaded
+            score = User.objects.filter(pk=pk).values_list('total_score', flat=True).first()
+            result = super().delete(*args, **kwargs)
+            if score is not None:
+                ScoreTier.move(score, None)
+        cache.delete(auth_cache_key(pk))
+        return result
+
+    @property
+    def rank(self):
+        """1 + the number of users with a higher total_score, from the user's ScoreTier.
+
+        Lists annotate it up front with User.objects.with_rank().
+        """
+        try:
+            return self._rank
+        except AttributeError:
+            return ScoreTier.objects.filter(score=self.total_score).values_list('rank', flat=True).first() or 1
+
+    @rank.setter
+    def rank(self, value):
+        self._rank = value
 
     class Meta:
         ordering = ['-total_score']
+        indexes = [
+            models.Index(fields=['-total_score', 'id'], name='user_score_idx'),
+        ]
+        # Logins match username or email case-insensitively, so both must be
+        # unique that way too; see for_login.
+        constraints = [
+            models.UniqueConstraint(
+                Lower('username'), name='user_username_ci_unique',
+                violation_error_message='A user with that username already exists.',
+            ),
+            models.UniqueConstraint(
+                Lower('email'), condition=Q(email__gt=''), name='user_email_ci_unique',
+                violation_error_message='A user with that email already exists.',
+            ),
+        ]
 
     @classmethod
     def update_ranks(cls):
-        users = cls.objects.all().order_by('-total_score')
-        for i, user in enumerate(users):
-            user.rank = i + 1
-            user.save(update_fields=['rank'])
+        """Rebuild every ScoreTier from the user table, e.g. after bulk inserts or deletes."""
+        counts = cls.objects.order_by('-total_score').values('total_score').annotate(users=Count('id'))
+        tiers, above = [], 0
+        for row in counts:
+            tiers.append(ScoreTier(score=row['total_score'], users=row['users'], rank=above + 1))
+            above += row['users']
+        with transaction.atomic():
+            ScoreTier.objects.all().delete()
+            ScoreTier.objects.bulk_create(tiers, batch_size=5000)
+
+    @classmethod
+    def add_progress(cls, pk, points=0, minutes=0):
+        """Add exam points and study minutes in one UPDATE, deriving level in SQL.
+
+        Concurrent calls for the same user never lose an increment, and only
+        the aggregate columns are written. Returns the new total_score.
+        """
+        total_score = F('total_score') + points
+        with transaction.atomic():
+            # The plain QuerySet.update: the caller moves the score tiers, see shift_rank
+            models.QuerySet.update(
+                cls.objects.filter(pk=pk),
+                total_score=total_score,
+                study_time=F('study_time') + minutes,
+                level=total_score / 1000 + 1,
+                updated_at=timezone.now(),
+            )
+            return cls.objects.filter(pk=pk).values_list('total_score', flat=True).get()
+
+    @classmethod
+    def matching(cls, field, value):
+        """Users whose username or email equals value ignoring case, looked up through the unique index."""
+        queryset = cls.objects.alias(key=Lower(field)).filter(key=Lower(Value(value))).order_by()
+        if field == 'email':
+            # Repeat the partial index condition so the planner may use it
+            queryset = queryset.filter(email__gt='')
+        return queryset
+
+    @classmethod
+    def login_lookup(cls, login):
+        """Users whose username or email is login; the unique indexes allow at most two."""
+        return cls.objects.alias(username_key=Lower('username'), email_key=Lower('email')).filter(
+            Q(username_key=Lower(Value(login))) | Q(email_key=Lower(Value(login)), email__gt='')
+        ).order_by()
+
+    @classmethod
+    def for_login(cls, login):
+        """Return the user a login name refers to, or None, in one indexed query. A username match wins."""
+        candidates = list(cls.login_lookup(login)[:2])
+        return next((user for user in candidates if user.username.lower() == login.lower()),
+                    candidates[0] if candidates else None)
+
+    @classmethod
+    def image_variants_changed(cls, pks):
+        cls.objects.filter(pk__in=pks).update(updated_at=timezone.now())
+
+    @classmethod
+    def touch(cls, pk, at_most_every=None):
+        """Mark a user's public profile as changed, e.g. after a like on one of their certificates.
+
+        With at_most_every (a timedelta) a user touched more recently than that
+        is left alone, so a burst of likes doesn't write the same row each
+        time; the profile may then lag behind by up to that long.
+        """
+        now = timezone.now()
+        users = cls.objects.filter(pk=pk)
+        if at_most_every:
+            users = users.filter(updated_at__lt=now - at_most_every)
+        users.update(updated_at=now)
+
+    def shift_rank(self, old_score):
+        """Adjust ranks after this user's total_score moved from old_score.
+
+        Only the score tiers between the old and the new score are touched, so
+        the cost depends on the scores in that slice and not on the number of
+        users, tied or not.
+        """
+        ScoreTier.move(old_score, self.total_score)
+        self.__dict__.pop('_rank', None)
 
     def __str__(self):
         return self.username
+
+class AuthenticatedUser(User):
+    """The request user built by CachedJWTAuthentication from a few cached columns.
+
+    The first access to any other field loads all of them in one query,
+    instead of Django's default of one query per deferred field.
+    """
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            fields = list(deferred)
+        try:
+            super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        except User.DoesNotExist:
+            # Deleted after the request authenticated
+            cache.delete(auth_cache_key(self.pk))
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
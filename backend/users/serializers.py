@@ -1,13 +1,43 @@
 from rest_framework import serializers
+from core.fieldsets import FieldsetSerializerMixin
+from core.images import ImageVariantsField, variant_url
 from .models import User
 
-class UserSerializer(serializers.ModelSerializer):
+class UniqueLoginMixin:
+    """Reject usernames and emails another user already has in any letter case."""
+
+    def check_unique(self, field, value):
+        if value:
+            others = User.matching(field, value)
+            if self.instance is not None:
+                others = others.exclude(pk=self.instance.pk)
+            if others.exists():
+                raise serializers.ValidationError(f'A user with that {field} already exists.')
+        return value
+
+    def validate_username(self, value):
+        return self.check_unique('username', value)
+
+    def validate_email(self, value):
+        return self.check_unique('email', value)
+
+class UserSerializer(FieldsetSerializerMixin, UniqueLoginMixin, serializers.ModelSerializer):
+    avatar_variants = ImageVariantsField('avatar')
+
     class Meta:
         model = User
-        fields = ('id', 'username', 'first_name', 'last_name', 'birth_date', 'phone_number', 'email', 'avatar', 'bio', 'total_score', 'rank', 'level', 'date_joined', 'role', 'is_staff', 'is_superuser')
+        fields = ('id', 'username', 'first_name', 'last_name', 'birth_date', 'phone_number', 'email', 'avatar', 'avatar_variants', 'bio', 'total_score', 'rank', 'level', 'date_joined', 'role', 'is_staff', 'is_superuser')
         read_only_fields = ('total_score', 'rank', 'level', 'role', 'is_staff', 'is_superuser')
+        field_columns = {'avatar_variants': ('avatar', 'avatar_variants'), 'rank': ('total_score',)}
+
+    def update(self, instance, validated_data):
+        # Write only the edited columns so a concurrent score update is never overwritten
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
 
-class RegisterSerializer(serializers.ModelSerializer):
+class RegisterSerializer(UniqueLoginMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
 
     class Meta:
@@ -26,16 +56,49 @@ class RegisterSerializer(serializers.ModelSerializer):
         )
         return user
 
-class PublicUserSerializer(serializers.ModelSerializer):
+class AuthorSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
+    """Compact user for nested and listed users: no contact details, one avatar URL."""
+    avatar = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'avatar', 'level')
+        field_columns = {'avatar': ('avatar', 'avatar_variants')}
+
+    def get_avatar(self, obj):
+        # The 256 px variant covers every place an author is shown, on high-DPI screens too
+        url = variant_url(obj, 'avatar', 256, 'webp')
+        if url is None:
+            return None
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+class LeaderboardUserSerializer(AuthorSerializer):
+    class Meta(AuthorSerializer.Meta):
+        fields = (*AuthorSerializer.Meta.fields, 'total_score', 'rank')
+        field_columns = {**AuthorSerializer.Meta.field_columns, 'rank': ('total_score',)}
+
+class PublicUserSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
+    avatar_variants = ImageVariantsField('avatar')
     certificates = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ('id', 'username', 'avatar', 'bio', 'total_score', 'rank', 'level', 'date_joined', 'certificates')
+        fields = ('id', 'username', 'avatar', 'avatar_variants', 'bio', 'total_score', 'rank', 'level', 'date_joined', 'certificates')
+        # Loaded by PublicUserProfileView.aget_object
+        field_columns = {'avatar_variants': ('avatar', 'avatar_variants'), 'rank': ('total_score',), 'certificates': ()}
 
-    def get_certificates(self, obj):
+    @staticmethod
+    def certificate_queryset(user, viewer):
         from results.models import ExamAttempt
+        return ExamAttempt.objects.filter(user=user, is_passed=True).for_certificates(viewer).order_by('-completed_at')
+
+    def get_certificates(self, obj):
         # We need to import the serializer here to avoid circular imports
         from results.serializers import ExamAttemptSerializer
-        attempts = ExamAttempt.objects.filter(user=obj, is_passed=True).order_by('-completed_at')
+        # PublicUserProfileView loads the attempts up front as certificate_attempts
+        attempts = getattr(obj, 'certificate_attempts', None)
+        if attempts is None:
+            request = self.context.get('request')
+            attempts = self.certificate_queryset(obj, request.user if request else None)
         return ExamAttemptSerializer(attempts, many=True, context=self.context).data
@@ -1,3 +1,280 @@
-from django.test import TestCase
+import datetime
+import random
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import MD5PasswordHasher
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from results.models import DailyScore
+from . import models
+from .models import ScoreTier, User, auth_cache_key
+from .serializers import UserSerializer
+
+
+class CountingHasher(MD5PasswordHasher):
+    algorithm = 'counting_md5'
+    calls = 0
+
+    def encode(self, password, salt):
+        CountingHasher.calls += 1
+        return super().encode(password, salt)
+
+
+@override_settings(PASSWORD_HASHERS=['users.tests.CountingHasher'])
+class LoginLookupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('Alice', 'Alice@Example.com', 'secret')
+        User.objects.create_user('bob', 'bob@example.com', 'secret')
+        CountingHasher.calls = 0
+
+    def login(self, username, password='secret'):
+        CountingHasher.calls = 0
+        with self.assertNumQueries(1):
+            user = authenticate(username=username, password=password)
+        self.assertEqual(CountingHasher.calls, 1)
+        return user
+
+    def test_username_and_email_ignore_case(self):
+        for login in ('alice', 'ALICE', 'alice@example.com', 'ALICE@EXAMPLE.COM'):
+            self.assertEqual(self.login(login), self.user)
+
+    def test_failures_hash_once(self):
+        self.assertIsNone(self.login('alice', 'wrong'))
+        self.assertIsNone(self.login('nobody'))
+
+    def test_username_match_wins_over_email(self):
+        owner = User.objects.create_user('carol@example.com', None, 'secret')
+        User.objects.create_user('carol', 'Carol@example.com', 'secret')
+        self.assertEqual(self.login('CAROL@example.com'), owner)
+
+    def test_duplicates_in_other_case_are_rejected(self):
+        client = APIClient()
+        response = client.post('/api/auth/register/', {'username': 'ALICE', 'password': 'x'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('username', response.data)
+        response = client.post('/api/auth/register/', {'username': 'carol', 'email': 'alice@EXAMPLE.com', 'password': 'x'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.data)
+
+
+@override_settings(AUTH_USER_CACHE_SECONDS=30)
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('dana', 'dana@example.com', 'secret')
+        self.client = self.client_for(self.user)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        return client
+
+    def test_user_row_is_not_loaded_per_request(self):
+        with CaptureQueriesContext(connection) as first:
+            self.client.get('/api/results/history/')
+        with CaptureQueriesContext(connection) as second:
+            self.assertEqual(self.client.get('/api/results/history/').status_code, 200)
+        self.assertEqual(len(second), len(first) - 1)
+
+    def test_other_fields_load_in_one_query(self):
+        self.client.get('/api/auth/me/')
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/auth/me/').data
+        self.assertEqual((data['username'], data['email']), ('dana', 'dana@example.com'))
+
+    def test_profile_and_staff_changes_apply_at_once(self):
+        self.assertEqual(self.client.get('/api/auth/admin/users/').status_code, 403)
+        admin = APIClient()
+        admin.force_authenticate(User.objects.create_superuser('root', 'root@example.com', 'secret'))
+        admin.post(f'/api/auth/admin/users/{self.user.pk}/toggle-staff/')
+        self.assertEqual(self.client.get('/api/auth/admin/users/').status_code, 200)
+
+        self.client.patch('/api/auth/me/', {'username': 'dana2'})
+        self.assertEqual(self.client.get('/api/auth/me/').data['username'], 'dana2')
+
+    def test_queryset_writes_and_deletes_apply_at_once(self):
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.assertEqual(self.client.get('/api/auth/admin/users/').status_code, 200)
+        User.objects.filter(is_staff=True).update(is_staff=False)
+        self.assertEqual(self.client.get('/api/auth/admin/users/').status_code, 403)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get('/api/auth/me/').status_code, 401)
+
+        other = User.objects.create_user('eve')
+        client = self.client_for(other)
+        self.assertEqual(client.get('/api/auth/me/').status_code, 200)
+        User.objects.filter(pk=other.pk).delete()
+        self.assertEqual(client.get('/api/auth/me/').status_code, 401)
+
+    def test_user_deleted_after_authentication(self):
+        key = auth_cache_key(self.user.pk)
+        self.assertEqual(self.client.get('/api/auth/stats/').status_code, 200)
+        values = cache.get(key)
+        self.user.delete()
+        self.assertIsNone(cache.get(key))
+        # As if another worker cached the user just before the delete
+        cache.set(key, values)
+        self.assertEqual(self.client.get('/api/auth/stats/').status_code, 401)
+        cache.set(key, values)
+        self.assertEqual(self.client.get('/api/auth/me/').status_code, 401)
+
+    @override_settings(AUTH_USER_CACHE_SECONDS=0)
+    def test_no_cache_without_a_shared_backend(self):
+        self.assertEqual(self.client.get('/api/auth/me/').status_code, 200)
+        self.assertIsNone(cache.get(auth_cache_key(self.user.pk)))
+
+
+class ProgressTests(TestCase):
+    def test_increments_are_never_lost(self):
+        user = User.objects.create_user('erin')
+        # Copies loaded before the increments, like concurrent requests and workers hold them
+        stale = [User.objects.get(pk=user.pk) for _ in range(2)]
+        rng = random.Random(3)
+        expected_score = expected_minutes = 0
+        for i in range(40):
+            points, minutes = rng.choice([0, 10, 40, 250, 999]), rng.randrange(0, 30)
+            expected_score += points
+            expected_minutes += minutes
+            self.assertEqual(User.add_progress(user.pk, points, minutes), expected_score)
+            if i % 10 == 0:
+                # A profile edit from a stale copy only writes the edited column
+                serializer = UserSerializer(stale[i % 2], data={'bio': f'edit {i}'}, partial=True)
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+
+        user.refresh_from_db()
+        self.assertEqual((user.total_score, user.study_time), (expected_score, expected_minutes))
+        self.assertEqual(user.level, expected_score // 1000 + 1)
+        self.assertEqual(user.bio, 'edit 30')
+
+    def test_level_is_derived_in_the_update(self):
+        user = User.objects.create_user('frank')
+        User.add_progress(user.pk, 999)
+        self.assertEqual(User.objects.get(pk=user.pk).level, 1)
+        User.add_progress(user.pk, 1)
+        self.assertEqual(User.objects.get(pk=user.pk).level, 2)
+        User.add_progress(user.pk, 0, 15)
+        user.refresh_from_db()
+        self.assertEqual((user.total_score, user.level, user.study_time), (1000, 2, 15))
+
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ada', total_score=420, study_time=95)
+        other = User.objects.create_user('grace', total_score=900)
+        self.today = timezone.localdate()
+        for user, days_ago, points, attempts in ((self.user, 0, 100, 2), (self.user, 3, 20, 1),
+                                                 (self.user, 40, 300, 4), (other, 0, 900, 9)):
+            DailyScore.objects.create(user=user, day=self.today - datetime.timedelta(days=days_ago),
+                                      earned_points=points, attempts=attempts, study_minutes=attempts * 10)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_progression_from_the_rollup(self):
+        with self.assertNumQueries(3):
+            data = self.client.get('/api/auth/stats/').data
+        self.assertEqual((data['total_xp'], data['rank'], data['study_time']), (420, 2, 95))
+        # Every attempt ever, not just those in range
+        self.assertEqual(data['exams_taken'], 7)
+        self.assertEqual([day['score'] for day in data['progression']], [0, 0, 0, 20, 0, 0, 100])
+        self.assertEqual(data['progression'][-1], {
+            'name': self.today.strftime('%a'), 'date': self.today.isoformat(),
+            'score': 100, 'attempts': 2, 'study_minutes': 20,
+        })
+
+        # A longer range costs the same
+        with self.assertNumQueries(3):
+            progression = self.client.get('/api/auth/stats/', {'days': 366}).data['progression']
+        self.assertEqual(len(progression), 366)
+        self.assertEqual(sum(day['score'] for day in progression), 420)
+        self.assertEqual(len(self.client.get('/api/auth/stats/', {'days': 1}).data['progression']), 1)
+
+    def test_days_out_of_range(self):
+        for days in ('0', '367', '-5', 'week'):
+            response = self.client.get('/api/auth/stats/', {'days': days})
+            self.assertEqual(response.status_code, 400, days)
+
+
+class RankTests(TestCase):
+    def setUp(self):
+        self.rng = random.Random(7)
+        # Like the real table: most users never passed an exam and share rank at 0
+        self.users = [
+            User.objects.create_user(f'player{i}', total_score=0 if i % 4 else self.rng.randrange(0, 500, 10))
+            for i in range(60)
+        ]
+
+    def move(self, user, points):
+        new_score = User.add_progress(user.pk, points)
+        User(pk=user.pk, total_score=new_score).shift_rank(new_score - points)
+
+    def ranks(self):
+        return (
+            dict(User.objects.with_rank().values_list('pk', 'rank')),
+            # Every tier, so one left empty by a move shows up against the rebuild
+            list(ScoreTier.objects.order_by('score').values_list('score', 'users', 'rank')),
+        )
+
+    def assertMatchesRebuild(self):
+        shifted = self.ranks()
+        scores = dict(User.objects.values_list('pk', 'total_score'))
+        self.assertEqual(shifted[0], {
+            pk: 1 + sum(other > score for other in scores.values()) for pk, score in scores.items()
+        })
+        User.update_ranks()
+        self.assertEqual(shifted, self.ranks())
+
+    def test_shifts_match_rebuild(self):
+        self.assertMatchesRebuild()
+        for _ in range(100):
+            user = self.rng.choice(self.users)
+            self.move(user, self.rng.choice([10, 20, 50, 300, -10, -40]))
+        User.objects.create_user('newcomer')
+        User.objects.create_user('veteran', total_score=250)
+        self.users[1].delete()
+        self.assertMatchesRebuild()
+
+    def test_leaving_a_tie_does_not_touch_it(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.move(self.users[1], 10)
+        # The user's own score; the 44 users left at 0 aren't written
+        writes = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "users_user"')]
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(User.objects.with_rank().get(pk=self.users[2].pk).rank,
+                         1 + User.objects.filter(total_score__gt=0).count())
+        self.assertMatchesRebuild()
+
+    def test_saving_an_edited_score(self):
+        # The admin edits total_score through save()
+        user = self.users[1]
+        user.total_score = 500
+        user.save()
+        self.assertEqual(User.objects.with_rank().get(pk=user.pk).rank, 1 + User.objects.filter(total_score__gt=500).count())
+        self.assertMatchesRebuild()
+        user.total_score = 0
+        user.save(update_fields=['bio'])
+        user.refresh_from_db()
+        self.assertEqual(user.total_score, 500)
+        self.assertMatchesRebuild()
+
+    def test_queryset_updates_and_deletes(self):
+        # What the admin's bulk delete and other queryset writes go through
+        pks = [user.pk for user in self.users[:12]]
+        User.objects.filter(pk__in=pks[:6]).update(total_score=F('total_score') + 30)
+        self.assertMatchesRebuild()
+        User.objects.filter(pk__in=pks).delete()
+        self.assertMatchesRebuild()
+        with mock.patch.object(models, 'TIER_MOVE_LIMIT', 5):
+            User.objects.filter(total_score__lt=100).update(total_score=F('total_score') + 1000)
+            self.assertMatchesRebuild()
+            User.objects.filter(total_score__gte=1000).delete()
+            self.assertMatchesRebuild()
+        # A score nobody has any more leaves no tier behind
+        self.assertFalse(ScoreTier.objects.filter(users__lte=0).exists())
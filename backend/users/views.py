@@ -1,93 +1,96 @@
-from rest_framework import generics, permissions, status
+from django.shortcuts import get_object_or_404
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions, generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .models import User
-from .serializers import UserSerializer, RegisterSerializer, PublicUserSerializer
+from core.async_views import AsyncListAPIView, AsyncRetrieveAPIView
+from core.conditional import AsyncConditionalGetMixin
+from core.fieldsets import SparseFieldsetMixin
+from core.pagination import UserCursorPagination
+from .models import User, rank_of
+from .serializers import UserSerializer, RegisterSerializer, PublicUserSerializer, LeaderboardUserSerializer
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = (permissions.AllowAny,)
     serializer_class = RegisterSerializer
 
-class ProfileView(generics.RetrieveUpdateAPIView):
+class ProfileView(SparseFieldsetMixin, generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):
-        return self.request.user
+        # One query for the profile columns and the rank, rather than the
+        # request user's deferred load followed by a ScoreTier lookup
+        user = self.narrow(User.objects.with_rank()).filter(pk=self.request.user.pk).first()
+        if user is None:
+            # Deleted after the request authenticated
+            raise exceptions.AuthenticationFailed(_('User not found'), code='user_not_found')
+        return user
 
-class LeaderboardView(generics.ListAPIView):
-    serializer_class = UserSerializer
+class LeaderboardView(SparseFieldsetMixin, AsyncListAPIView):
+    serializer_class = LeaderboardUserSerializer
     permission_classes = (permissions.AllowAny,)
 
     def get_queryset(self):
-        period = self.request.query_params.get('period', 'all')
-        if period == 'all':
-            return User.objects.all().order_by('-total_score')[:50]
-        
-        # For weekly/monthly, we need to sum earned_points from ExamAttempt
-        from results.models import ExamAttempt
-        from django.db.models import Sum, Q
-        from django.utils import timezone
-        import datetime
+        return self.narrow(User.objects.with_rank()).order_by('-total_score', 'id')[:50]
 
-        start_date = None
-        if period == 'weekly':
-            start_date = timezone.now() - datetime.timedelta(days=7)
-        elif period == 'monthly':
-            start_date = timezone.now() - datetime.timedelta(days=30)
-        
-        if start_date:
-            # Get users who earned points in this period
-            # This is a bit tricky with standard DRF queryset if we want to return User objects with periodic score
-            # A simpler way is to annotate the period_score
-            return User.objects.annotate(
-                period_score=Sum('attempts__earned_points', filter=Q(attempts__completed_at__gte=start_date))
-            ).filter(period_score__gt=0).order_by('-period_score')[:50]
-
-        return User.objects.all().order_by('-total_score')[:50]
-
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
+    async def list(self, request, *args, **kwargs):
         period = request.query_params.get('period', 'all')
         
-        # If period is not 'all', we should use period_score for the response
-        if period != 'all' and period in ['weekly', 'monthly']:
-            data = []
-            for user in queryset:
-                user_data = UserSerializer(user).data
-                user_data['total_score'] = user.period_score # Override for the leaderboard display
-                data.append(user_data)
+        # Weekly/monthly boards are read from the materialized LeaderboardEntry table
+        from results.models import LeaderboardEntry
+        if period in LeaderboardEntry.PERIOD_DAYS:
+            entries = [
+                entry async for entry in
+                self.narrow(LeaderboardEntry.top(period), prefix='user__', also=['score']).annotate(rank=rank_of('user__total_score'))
+            ]
+            for entry in entries:
+                entry.user.rank = entry.rank
+            data = self.get_serializer([entry.user for entry in entries], many=True).data
+            for user_data, entry in zip(data, entries):
+                if 'total_score' in user_data:
+                    user_data['total_score'] = entry.score # Override for the leaderboard display
             return Response(data)
         
-        return super().list(request, *args, **kwargs)
+        return await super().list(request, *args, **kwargs)
 
 class DashboardStatsView(APIView):
     permission_classes = (permissions.IsAuthenticated,)
 
     def get(self, request):
         user = request.user
-        from results.models import ExamAttempt
+        from results.models import DailyScore
         from django.db.models import Sum
-        
-        exams_taken = ExamAttempt.objects.filter(user=user).count()
-        # XP progression (last 7 days)
         from django.utils import timezone
         import datetime
-        
+
+        # XP progression over the requested range (default: last 7 days), read
+        # from the per-day rollup with one (user, day) index range scan
+        try:
+            days = int(request.query_params.get('days', 7))
+        except ValueError:
+            days = 0
+        if not 1 <= days <= 366:
+            return Response({'detail': 'days must be a whole number from 1 to 366.'}, status=status.HTTP_400_BAD_REQUEST)
+        today = timezone.localdate()
+        start = today - datetime.timedelta(days=days - 1)
+        rollup = {
+            row.day: row
+            for row in DailyScore.objects.filter(user=user, day__gte=start, day__lte=today)
+        }
+        exams_taken = DailyScore.objects.filter(user=user).aggregate(total=Sum('attempts'))['total'] or 0
+
         progression = []
-        today = timezone.now().date()
-        for i in range(6, -1, -1):
-            day = today - datetime.timedelta(days=i)
-            # Sum earned_points for that day
-            day_score = ExamAttempt.objects.filter(
-                user=user, 
-                completed_at__date=day
-            ).aggregate(total=Sum('earned_points'))['total'] or 0
-            
+        for i in range(days):
+            day = start + datetime.timedelta(days=i)
+            row = rollup.get(day)
             progression.append({
                 'name': day.strftime('%a'),
-                'score': day_score
+                'date': day.isoformat(),
+                'score': row.earned_points if row else 0,
+                'attempts': row.attempts if row else 0,
+                'study_minutes': row.study_minutes if row else 0,
             })
 
         return Response({
@@ -98,16 +101,41 @@ class DashboardStatsView(APIView):
             'progression': progression
         })
 
-class PublicUserProfileView(generics.RetrieveAPIView):
-    queryset = User.objects.all()
+class PublicUserProfileView(SparseFieldsetMixin, AsyncConditionalGetMixin, AsyncRetrieveAPIView):
     serializer_class = PublicUserSerializer
     permission_classes = (permissions.IsAuthenticated,)
 
+    async def get_validators(self, request):
+        # updated_at moves on profile edits, score changes and likes or
+        # comments on the user's certificates; is_liked depends on the viewer.
+        # The rank moves with other users' scores without touching updated_at,
+        # so it is part of the ETag and updated_at can't be a Last-Modified.
+        version = await User.objects.with_rank().filter(pk=self.kwargs['pk']).values_list('updated_at', 'rank').afirst()
+        if not version:
+            return None, None
+        updated_at, rank = version
+        return f'user-{self.kwargs["pk"]}-{updated_at.timestamp()}-{rank}-viewer-{request.user.pk}', None
+
+    def get_queryset(self):
+        return self.narrow(User.objects.with_rank())
+
+    async def aget_object(self):
+        user = await super().aget_object()
+        if not self.wants('certificates'):
+            return user
+        user.certificate_attempts = [
+            attempt async for attempt in PublicUserSerializer.certificate_queryset(user, self.request.user)
+        ]
+        return user
+
 # Management Admin Views
-class AdminUserListView(generics.ListAPIView):
-    queryset = User.objects.all()
+class AdminUserListView(SparseFieldsetMixin, generics.ListAPIView):
     serializer_class = UserSerializer
     permission_classes = (permissions.IsAdminUser,)
+    pagination_class = UserCursorPagination
+
+    def get_queryset(self):
+        return self.narrow(User.objects.with_rank().order_by('-total_score', 'id'))
 
 class AdminToggleStaffView(APIView):
     permission_classes = (permissions.IsAdminUser,) # Only superusers or staff? Standard isAdminUser checks is_staff or is_superuser
@@ -118,5 +146,5 @@ class AdminToggleStaffView(APIView):
         
         user = get_object_or_404(User, pk=pk)
         user.is_staff = not user.is_staff
-        user.save()
+        user.save(update_fields=['is_staff', 'updated_at'])
         return Response(UserSerializer(user).data)
@@ -0,0 +1,21 @@
+import React from 'react';
+
+// Renders the smallest server-side variant covering `size` px (WebP, JPEG fallback),
+// or the original upload while variants are still being generated.
+const VariantImage = ({ src, variants, size, ...props }) => {
+    if (!variants) {
+        return <img src={src} loading="lazy" {...props} />;
+    }
+
+    const sizes = Object.keys(variants).map(Number).sort((a, b) => a - b);
+    const chosen = variants[sizes.find((s) => s >= size * (window.devicePixelRatio || 1)) ?? sizes[sizes.length - 1]];
+
+    return (
+        <picture>
+            <source srcSet={chosen.webp} type="image/webp" />
+            <img src={chosen.jpg} loading="lazy" {...props} />
+        </picture>
+    );
+};
+
+export default VariantImage;
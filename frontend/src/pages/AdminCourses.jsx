@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { motion, AnimatePresence } from 'framer-motion';
 import { BookOpen, Plus, Edit2, Trash2, Video, Search, ChevronRight, X, Save } from 'lucide-react';
 import API from '../api/axios';
+import VariantImage from '../components/VariantImage';
 
 const AdminCourses = () => {
     const [courses, setCourses] = useState([]);
@@ -80,7 +81,7 @@ const AdminCourses = () => {
                     >
                         <div className="relative aspect-video">
                             {course.thumbnail ? (
-                                <img src={course.thumbnail} alt={course.title} className="w-full h-full object-cover" />
+                                <VariantImage src={course.thumbnail} variants={course.thumbnail_variants} size={400} alt={course.title} className="w-full h-full object-cover" />
                             ) : (
                                 <div className="w-full h-full bg-slate-900 flex items-center justify-center text-slate-700">
                                     <BookOpen size={48} />
@@ -17,6 +17,7 @@ const AdminExamBuilder = () => {
         description: '',
         duration_minutes: 30,
         passing_score: 60,
+        sample_size: null,
         questions: [{ text: '', code: '', points: 10, choices: [{ text: '', is_correct: false }] }]
     });
 
@@ -121,7 +122,7 @@ const AdminExamBuilder = () => {
                         onClick={() => {
                             setEditingExam(null);
                             setFormData({
-                                title: '', course: '', description: '', duration_minutes: 30, passing_score: 60,
+                                title: '', course: '', description: '', duration_minutes: 30, passing_score: 60, sample_size: null,
                                 questions: [{ text: '', code: '', points: 10, choices: [{ text: '', is_correct: false }] }]
                             });
                             setShowBuilder(true);
@@ -216,6 +217,17 @@ const AdminExamBuilder = () => {
                                     {courses.map(c => <option key={c.id} value={c.id}>{c.title}</option>)}
                                 </select>
                             </div>
+                            <div className="space-y-2">
+                                <label className="text-xs font-bold text-slate-400 uppercase tracking-wider ml-1">Har urinishdagi savollar soni</label>
+                                <input
+                                    type="number"
+                                    min="1"
+                                    placeholder="Hammasi"
+                                    value={formData.sample_size ?? ''}
+                                    onChange={e => setFormData({ ...formData, sample_size: e.target.value ? Number(e.target.value) : null })}
+                                    className="w-full bg-slate-900 border border-slate-800 rounded-2xl py-4 px-6 focus:ring-2 focus:ring-indigo-500 outline-none"
+                                />
+                            </div>
                         </div>
 
                         {/* Questions Editor */}
@@ -2,6 +2,7 @@ import React, { useRef, useEffect, useState } from 'react';
 import { useParams, useNavigate, Link } from 'react-router-dom';
 import { Award, CheckCircle2, Download, Share2, ArrowLeft, Heart, MessageCircle, Send, User } from 'lucide-react';
 import API from '../api/axios';
+import VariantImage from '../components/VariantImage';
 import { motion, AnimatePresence } from 'framer-motion';
 
 const Certificate = () => {
@@ -88,9 +89,15 @@ const Certificate = () => {
                     <ArrowLeft size={20} className="mr-2" /> Ortga
                 </button>
                 <div className="flex gap-4">
-                    <button onClick={handlePrint} className="flex items-center px-4 py-2 bg-indigo-600 hover:bg-indigo-500 text-white rounded-lg font-bold transition-all shadow-lg shadow-indigo-600/20">
-                        <Download size={18} className="mr-2" /> Yuklab Olish (PDF)
-                    </button>
+                    {data.certificate_urls ? (
+                        <a href={data.certificate_urls.pdf} download className="flex items-center px-4 py-2 bg-indigo-600 hover:bg-indigo-500 text-white rounded-lg font-bold transition-all shadow-lg shadow-indigo-600/20">
+                            <Download size={18} className="mr-2" /> Yuklab Olish (PDF)
+                        </a>
+                    ) : (
+                        <button onClick={handlePrint} className="flex items-center px-4 py-2 bg-indigo-600 hover:bg-indigo-500 text-white rounded-lg font-bold transition-all shadow-lg shadow-indigo-600/20">
+                            <Download size={18} className="mr-2" /> Yuklab Olish (PDF)
+                        </button>
+                    )}
                 </div>
             </div>
 
@@ -285,7 +292,9 @@ const Certificate = () => {
                 <div className="space-y-6">
                     <div className="glass-card p-6 rounded-[2rem] border-slate-800/40 text-center">
                         <div className="w-24 h-24 mx-auto rounded-full p-1 border-2 border-indigo-500/30 mb-4">
-                            <img
+                            <VariantImage
+                                variants={data.candidate_avatar_variants}
+                                size={128}
                                 src={data.candidate_avatar || `https://api.dicebear.com/7.x/avataaars/svg?seed=${data.candidate_name}`}
                                 className="w-full h-full rounded-full object-cover bg-slate-900"
                                 alt=""
@@ -3,6 +3,7 @@ import { useParams, Link } from 'react-router-dom';
 import { motion } from 'framer-motion';
 import { BookOpen, Play, Clock, Award, CheckCircle2, ChevronRight, Lock, Code, Loader2 } from 'lucide-react';
 import API from '../api/axios';
+import VariantImage from '../components/VariantImage';
 
 const CourseDetail = () => {
     const { slug } = useParams();
@@ -13,7 +14,7 @@ const CourseDetail = () => {
     useEffect(() => {
         const fetchCourse = async () => {
             try {
-                const response = await API.get(`/courses/${slug}/`);
+                const response = await API.get(`/courses/${slug}/?outline=1`);
                 setCourse(response.data);
 
                 // Fetch completers
@@ -56,7 +57,9 @@ const CourseDetail = () => {
                         animate={{ opacity: 1, y: 0 }}
                         className="relative rounded-[2rem] sm:rounded-[2.5rem] overflow-hidden group h-64 sm:h-80 md:h-[400px] shadow-2xl"
                     >
-                        <img
+                        <VariantImage
+                            variants={course.thumbnail_variants}
+                            size={1024}
                             src={course.thumbnail || "https://images.unsplash.com/photo-1526374965328-7f61d4dc18c5?w=800&auto=format&fit=crop&q=60"}
                             className="w-full h-full object-cover"
                             alt=""
@@ -192,7 +195,9 @@ const CourseDetail = () => {
                                 className="glass-card p-6 rounded-[1.5rem] flex flex-col items-center text-center border-slate-800/40 hover:border-indigo-500/30 hover:bg-slate-800/40 transition-all group"
                             >
                                 <div className="w-16 h-16 rounded-full p-1 border-2 border-slate-700 group-hover:border-emerald-500 transition-colors mb-4 relative">
-                                    <img
+                                    <VariantImage
+                                        variants={c.candidate_avatar_variants}
+                                        size={48}
                                         src={c.candidate_avatar || `https://api.dicebear.com/7.x/avataaars/svg?seed=${c.candidate_name}`}
                                         className="w-full h-full rounded-full object-cover bg-slate-900"
                                         alt=""
@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { motion } from 'framer-motion';
 import { Play, Star, Users, Clock, Loader2 } from 'lucide-react';
 import API from '../api/axios';
+import VariantImage from '../components/VariantImage';
 
 import { Link } from 'react-router-dom';
 
@@ -14,7 +15,9 @@ const CourseCard = ({ course }) => (
             className="glass-card rounded-2xl overflow-hidden group h-full cursor-pointer flex flex-col"
         >
             <div className="relative h-48 overflow-hidden">
-                <img
+                <VariantImage
+                    variants={course.thumbnail_variants}
+                    size={400}
                     src={course.thumbnail || 'https://images.unsplash.com/photo-1526374965328-7f61d4dc18c5?w=800&auto=format&fit=crop&q=60'}
                     alt={course.title}
                     className="w-full h-full object-cover transition-transform duration-500 group-hover:scale-110"
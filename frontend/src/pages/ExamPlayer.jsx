@@ -19,7 +19,13 @@ const ExamPlayer = () => {
         const fetchExam = async () => {
             try {
                 const response = await API.get(`/exams/${id}/`);
-                setExam(response.data);
+                let questions = response.data.questions;
+                if (response.data.sample_size) {
+                    // Each attempt gets its own questions from the bank; reloading resumes them
+                    const drawn = await API.post(`/exams/${id}/draw/`);
+                    questions = drawn.data.questions;
+                }
+                setExam({ ...response.data, questions });
                 setTimeLeft(response.data.duration_minutes * 60);
             } catch (error) {
                 console.error('Error fetching exam:', error);
@@ -4,6 +4,7 @@ import { useAuth } from '../context/AuthContext';
 import { User, Mail, Award, Calendar, Camera, Edit3, Shield, Star, Loader2, Save, LayoutGrid, List } from 'lucide-react';
 import { Link } from 'react-router-dom';
 import API from '../api/axios';
+import VariantImage from '../components/VariantImage';
 
 const Profile = () => {
     const { user, refreshUser } = useAuth();
@@ -56,7 +57,9 @@ const Profile = () => {
                 <div className="px-6 md:px-12 -mt-12 md:-mt-20 flex flex-col md:flex-row items-center md:items-end gap-6 md:gap-10">
                     <div className="relative">
                         <div className="w-32 h-32 md:w-44 md:h-44 rounded-[2.5rem] md:rounded-[3rem] bg-slate-900 p-1.5 border-4 border-slate-950 shadow-2xl overflow-hidden rotate-3 md:group-hover:rotate-0 transition-transform duration-500">
-                            <img
+                            <VariantImage
+                                variants={user.avatar_variants}
+                                size={160}
                                 src={user.avatar || `https://api.dicebear.com/7.x/avataaars/svg?seed=${user.username}`}
                                 className="w-full h-full object-cover rounded-[2rem] md:rounded-[2.5rem]"
                                 alt=""
@@ -2,6 +2,7 @@ import React, { useEffect, useState } from 'react';
 import { useParams, Link } from 'react-router-dom';
 import { Shield, Star, Award, Calendar, Loader2 } from 'lucide-react';
 import API from '../api/axios';
+import VariantImage from '../components/VariantImage';
 
 const PublicProfile = () => {
     const { id } = useParams();
@@ -49,7 +50,9 @@ const PublicProfile = () => {
                 <div className="px-6 md:px-12 -mt-12 md:-mt-20 flex flex-col md:flex-row items-center md:items-end gap-6 md:gap-10">
                     <div className="relative">
                         <div className="w-32 h-32 md:w-44 md:h-44 rounded-[2rem] md:rounded-[2.5rem] bg-slate-950 p-1.5 border-4 border-slate-900 shadow-2xl overflow-hidden">
-                            <img
+                            <VariantImage
+                                variants={user.avatar_variants}
+                                size={160}
                                 src={user.avatar || `https://api.dicebear.com/7.x/avataaars/svg?seed=${user.username}`}
                                 className="w-full h-full object-cover rounded-[1.8rem] md:rounded-[2.3rem]"
                                 alt=""